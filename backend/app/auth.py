@@ -1,15 +1,18 @@
+import asyncio
 import os
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
 
-from .database import get_db
+from . import database
+from .cache import TTLCache
+from .hashing import HashingBusy, hash_pool, hash_secret, verify_and_update
+from .database import SessionLocal
 from . import models
 
 load_dotenv()
@@ -17,50 +20,224 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret")
 ALGORITHM  = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 480))
+STAFF_CACHE_TTL_SECONDS = float(os.getenv("STAFF_CACHE_TTL_SECONDS", 60))
+STAFF_CACHE_MAX_ENTRIES = int(os.getenv("STAFF_CACHE_MAX_ENTRIES", 1024))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
+@dataclass(frozen=True)
+class StaffPrincipal:
+    """Detached, immutable view of an authenticated staff member."""
+    id: str
+    username: str
+    role: str
+    token_version: int
+    created_at: datetime
+
+    @classmethod
+    def from_model(cls, staff: models.Staff) -> "StaffPrincipal":
+        return cls(
+            id=staff.id,
+            username=staff.username,
+            role=staff.role,
+            token_version=staff.token_version,
+            created_at=staff.created_at,
+        )
+
+
+# Keyed by (username, token_version). Per worker process; the TTL bounds how long
+# another worker may keep serving a principal after a staff record changes.
+staff_cache = TTLCache(maxsize=STAFF_CACHE_MAX_ENTRIES, ttl=STAFF_CACHE_TTL_SECONDS)
+
+
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return hash_secret(password)
 
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+    return verify_and_update(plain, hashed)[0]
+
+
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent logins, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+
+def check_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Verify on the hashing pool; returns (matches, upgraded hash or None).
+
+    Raises 503 when the hashing queue is full.
+    """
+    try:
+        return hash_pool.submit(verify_and_update, plain, hashed).result()
+    except HashingBusy:
+        raise _hashing_busy()
+
+
+async def check_password_async(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return await asyncio.wrap_future(hash_pool.submit(verify_and_update, plain, hashed))
+    except HashingBusy:
+        raise _hashing_busy()
+
+
+def rehash_password(staff: models.Staff, new_hash: str) -> None:
+    """Store a cost-upgraded hash without revoking the staff member's tokens."""
+    staff._transparent_rehash = True
+    staff.password_hash = new_hash
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    # python-jose loads its crypto backends on import; defer that to the first token
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_staff(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> models.Staff:
-    credentials_exception = HTTPException(
+def create_staff_token(staff: models.Staff) -> str:
+    return create_access_token({
+        "sub": staff.username,
+        "uid": staff.id,
+        "role": staff.role,
+        "ver": staff.token_version or 0,
+        "created": staff.created_at.isoformat() if staff.created_at else None,
+    })
+
+
+def _claimed_principal(payload: dict) -> Optional[StaffPrincipal]:
+    """The principal a token's claims describe, or None for tokens issued without them."""
+    try:
+        return StaffPrincipal(
+            id=payload["uid"],
+            username=payload["sub"],
+            role=payload["role"],
+            token_version=payload.get("ver", 0),
+            created_at=datetime.fromisoformat(payload["created"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _version_query(principal: StaffPrincipal):
+    # One integer by primary key instead of the staff row
+    staff = models.Staff.__table__
+    return select(staff.c.token_version).where(staff.c.id == principal.id, staff.c.username == principal.username)
+
+
+def _confirmed(claimed: StaffPrincipal, version: Optional[int]) -> Optional[StaffPrincipal]:
+    # Role and password changes bump token_version, so matching claims are still current
+    return claimed if version is not None and version == claimed.token_version else None
+
+
+def _load_principal(payload: dict, username: str, version: int) -> Optional[StaffPrincipal]:
+    db = SessionLocal()
+    try:
+        claimed = _claimed_principal(payload)
+        if claimed is not None:
+            return _confirmed(claimed, db.execute(_version_query(claimed)).scalar())
+        staff = db.query(models.Staff).filter(models.Staff.username == username).first()
+        if not staff or (staff.token_version or 0) != version:
+            return None
+        return StaffPrincipal.from_model(staff)
+    finally:
+        db.close()
+
+
+async def _load_principal_async(payload: dict, username: str, version: int) -> Optional[StaffPrincipal]:
+    async with database.AsyncSessionLocal() as db:
+        claimed = _claimed_principal(payload)
+        if claimed is not None:
+            return _confirmed(claimed, (await db.execute(_version_query(claimed))).scalar())
+        staff = (await db.execute(
+            select(models.Staff).where(models.Staff.username == username)
+        )).scalar_one_or_none()
+        if staff is None or (staff.token_version or 0) != version:
+            return None
+        return StaffPrincipal.from_model(staff)
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode_claims(token: str) -> dict:
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    if not payload.get("sub"):
+        raise _credentials_exception()
+    return payload
+
+
+def _cache_key(payload: dict) -> tuple:
+    # Tokens issued before versioning carry no "ver" claim and map to version 0
+    return payload["sub"], payload.get("ver", 0)
 
-    staff = db.query(models.Staff).filter(models.Staff.username == username).first()
-    if not staff:
-        raise credentials_exception
-    return staff
 
+def _check_principal(payload: dict, principal: Optional[StaffPrincipal]) -> StaffPrincipal:
+    if principal is None or payload.get("uid", principal.id) != principal.id:
+        raise _credentials_exception()
+    return principal
 
-def require_admin(current_staff: models.Staff = Depends(get_current_staff)) -> models.Staff:
+
+def get_current_staff(token: str = Depends(oauth2_scheme)) -> StaffPrincipal:
+    payload = _decode_claims(token)
+    key = _cache_key(payload)
+    principal = staff_cache.get(key)
+    if principal is None:
+        principal = _load_principal(payload, *key)
+        if principal is not None:
+            staff_cache.set(key, principal)
+    return _check_principal(payload, principal)
+
+
+async def get_current_staff_async(token: str = Depends(oauth2_scheme)) -> StaffPrincipal:
+    payload = _decode_claims(token)
+    key = _cache_key(payload)
+    principal = staff_cache.get(key)
+    if principal is None:
+        principal = await _load_principal_async(payload, *key)
+        if principal is not None:
+            staff_cache.set(key, principal)
+    return _check_principal(payload, principal)
+
+
+def require_admin(current_staff: StaffPrincipal = Depends(get_current_staff)) -> StaffPrincipal:
     if current_staff.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_staff
+
+
+async def require_admin_async(current_staff: StaffPrincipal = Depends(get_current_staff_async)) -> StaffPrincipal:
+    return require_admin(current_staff)
+
+
+@event.listens_for(models.Staff, "before_update")
+def _bump_token_version(mapper, connection, target):
+    # Credential or role changes revoke every token issued for the old record
+    attrs = inspect(target).attrs
+    rehash_only = target.__dict__.pop("_transparent_rehash", False)
+    password_changed = attrs.password_hash.history.has_changes() and not rehash_only
+    if password_changed or attrs.role.history.has_changes():
+        target.token_version = (target.token_version or 0) + 1
+
+
+@event.listens_for(models.Staff, "after_update")
+@event.listens_for(models.Staff, "after_delete")
+def _evict_staff_principal(mapper, connection, target):
+    usernames = {target.username, *inspect(target).attrs.username.history.deleted}
+    staff_cache.discard_where(lambda key: key[0] in usernames)
@@ -0,0 +1,293 @@
+"""Bulk point accrual for POS end-of-day uploads.
+
+Rows are processed in chunks, each in its own transaction: customers are
+resolved with one query per key type, deltas are aggregated per customer and
+applied with a single set-based UPDATE, and the ``PointTransaction`` rows are
+written with one multi-row INSERT. ``external_ref`` is unique, so re-sending a
+file (or a chunk of one) never credits the same line twice. Once the ledger
+is partitioned (``app.partitions``) the refs of archived months are only in
+``point_transaction_refs``, so the duplicate check looks there too.
+"""
+import csv
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import case, cast, column, insert, inspect, or_, select, table, union, update, values, String, Integer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import ledger, models, stats
+from .phones import phone_key
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_DESCRIPTION = "POS purchase"
+MAX_REPORTED_ERRORS = 1000
+# Times a chunk is redone after a concurrent upload committed some of its refs first
+MAX_CHUNK_ATTEMPTS = 3
+
+Row = Tuple[int, dict]  # (line number, raw fields)
+
+# Every ref ever credited, archived months included, once app.partitions has created it
+claimed_refs = table("point_transaction_refs", column("external_ref"))
+_claimed_refs_exist = False
+
+
+def read_csv(stream: IO[str]) -> Iterator[Row]:
+    for line_no, record in enumerate(csv.DictReader(stream), start=2):
+        yield line_no, record
+
+
+def read_ndjson(stream: IO[str]) -> Iterator[Row]:
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_no, record if isinstance(record, dict) else {"_invalid": True}
+
+
+def field_text(value) -> Optional[str]:
+    """A raw field as a row error reports it: strings and numbers as text, anything else as None."""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    return str(value)
+
+
+def _text(record: dict, field: str) -> str:
+    value = record.get(field)
+    if value is not None and field_text(value) is None:
+        # An NDJSON object or list would otherwise be stored as its repr
+        raise ValueError(f"{field} must be a string")
+    return str(value or "").strip()
+
+
+def _clean(record: dict) -> dict:
+    """Validate one raw record; raise ValueError with a row-level message."""
+    if record.get("_invalid"):
+        raise ValueError("Malformed JSON line")
+    customer_id = _text(record, "customer_id") or None
+    if customer_id:
+        try:
+            customer_id = str(uuid.UUID(customer_id))
+        except ValueError:
+            raise ValueError("customer_id is not a valid id")
+    phone_number = _text(record, "phone_number") or None
+    if not customer_id and not phone_number:
+        raise ValueError("phone_number or customer_id is required")
+    try:
+        amount = int(str(record.get("amount", "")).strip())
+    except ValueError:
+        raise ValueError("amount must be an integer")
+    if amount <= 0:
+        raise ValueError("Amount must be positive")
+    external_ref = _text(record, "external_ref")
+    if not external_ref:
+        raise ValueError("external_ref is required")
+    if len(external_ref) > 100:
+        raise ValueError("external_ref is longer than 100 characters")
+    return {
+        "customer_id": customer_id,
+        "phone_number": phone_number,
+        "amount": amount,
+        "description": _text(record, "description") or DEFAULT_DESCRIPTION,
+        "external_ref": external_ref,
+    }
+
+
+class BulkAccrualReport:
+    def __init__(self):
+        self.processed = 0
+        self.credited = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.points_credited = 0
+        self.errors: List[dict] = []
+
+    def error(self, line: int, external_ref: Optional[str], message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "external_ref": external_ref, "error": message})
+
+    def merge(self, other: "BulkAccrualReport") -> None:
+        self.processed += other.processed
+        self.credited += other.credited
+        self.duplicates += other.duplicates
+        self.failed += other.failed
+        self.points_credited += other.points_credited
+        self.errors.extend(other.errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "credited": self.credited,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "points_credited": self.points_credited,
+            "errors": sorted(self.errors, key=lambda e: e["line"]),
+        }
+
+
+def balance_delta_update(db: Session, deltas: Dict[str, int]):
+    """A single UPDATE adding ``deltas`` (customer id -> points) to the customers' balances."""
+    customers = models.Customer.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        # UPDATE customers SET total_points = total_points + d.delta FROM (VALUES ...) AS d (id, delta)
+        d = values(column("id", String), column("delta", Integer), name="d").data(sorted(deltas.items()))
+        stmt = (
+            update(customers)
+            .where(customers.c.id == cast(d.c.id, customers.c.id.type))
+            .values(total_points=customers.c.total_points + d.c.delta)
+        )
+    else:
+        stmt = (
+            update(customers)
+            .where(customers.c.id.in_(list(deltas)))
+            .values(total_points=customers.c.total_points + case(
+                *[(customers.c.id == cid, delta) for cid, delta in deltas.items()]
+            ))
+        )
+    return stmt
+
+
+def apply_balance_deltas(db: Session, deltas: Dict[str, int]) -> Dict[str, int]:
+    """Add ``deltas`` to the customers' balances and return the new balances."""
+    customers = models.Customer.__table__
+    stmt = balance_delta_update(db, deltas)
+    return dict(db.execute(stmt.returning(customers.c.id, customers.c.total_points)).all())
+
+
+def _has_claimed_refs(db: Session) -> bool:
+    # Partitioning is never undone, so only a missing table is checked again
+    global _claimed_refs_exist
+    if not _claimed_refs_exist:
+        _claimed_refs_exist = inspect(db.connection()).has_table(claimed_refs.name)
+    return _claimed_refs_exist
+
+
+def credited_refs(db: Session, refs: set) -> set:
+    """The ``refs`` some ledger entry already carries, including entries archived since."""
+    transactions = models.PointTransaction.__table__
+    stmt = select(transactions.c.external_ref).where(transactions.c.external_ref.in_(refs))
+    if _has_claimed_refs(db):
+        stmt = union(stmt, select(claimed_refs.c.external_ref).where(claimed_refs.c.external_ref.in_(refs)))
+    return set(db.execute(stmt).scalars())
+
+
+def _process_chunk(
+    db: Session, chunk: List[Row], staff_id: str, seen_refs: set
+) -> Tuple[BulkAccrualReport, set]:
+    report = BulkAccrualReport()
+    chunk_refs: set = set()
+    rows = []
+    for line_no, record in chunk:
+        report.processed += 1
+        try:
+            row = _clean(record)
+        except ValueError as exc:
+            report.error(line_no, field_text(record.get("external_ref")), str(exc))
+            continue
+        if row["external_ref"] in seen_refs or row["external_ref"] in chunk_refs:
+            report.duplicates += 1
+            continue
+        chunk_refs.add(row["external_ref"])
+        rows.append((line_no, row))
+    if not rows:
+        return report, chunk_refs
+
+    already = credited_refs(db, chunk_refs)
+    ids = {r["customer_id"] for _, r in rows if r["customer_id"]}
+    phones = {r["phone_number"] for _, r in rows if not r["customer_id"]}
+    known_ids = set()
+    by_phone = {}
+    if ids:
+        known_ids = {cid for (cid,) in db.query(models.Customer.id).filter(models.Customer.id.in_(ids))}
+    if phones:
+        # As typed, or in any other format of the same number
+        keys = {phone: phone_key(phone) for phone in phones}
+        for number, key, cid in db.query(
+            models.Customer.phone_number, models.Customer.phone_key, models.Customer.id
+        ).filter(or_(
+            models.Customer.phone_number.in_(phones),
+            models.Customer.phone_key.in_({key for key in keys.values() if key is not None}),
+        )):
+            by_phone[number] = cid
+            if key is not None:
+                by_phone.setdefault(key, cid)
+
+    deltas: Dict[str, int] = defaultdict(int)
+    tx_rows = []
+    for line_no, row in rows:
+        if row["external_ref"] in already:
+            report.duplicates += 1
+            continue
+        if row["customer_id"]:
+            customer_id = row["customer_id"] if row["customer_id"] in known_ids else None
+        else:
+            customer_id = by_phone.get(row["phone_number"]) or by_phone.get(keys[row["phone_number"]])
+        if not customer_id:
+            report.error(line_no, row["external_ref"], "Customer not found")
+            continue
+        deltas[customer_id] += row["amount"]
+        tx_rows.append({
+            "id": models.new_uuid(),
+            "customer_id": customer_id,
+            "staff_id": staff_id,
+            "type": "earn",
+            "amount": row["amount"],
+            "description": row["description"],
+            "external_ref": row["external_ref"],
+        })
+    if tx_rows:
+        balances = apply_balance_deltas(db, deltas)
+        now = datetime.utcnow()
+        for tx in tx_rows:
+            tx["created_at"] = now
+        ledger.running_balances(tx_rows, balances)
+        db.execute(insert(models.PointTransaction.__table__), tx_rows)
+        stats.apply_deltas(db, total_points_issued=sum(deltas.values()))
+        db.commit()
+        report.credited = len(tx_rows)
+        report.points_credited = sum(deltas.values())
+    return report, chunk_refs
+
+
+def accrue_points(
+    db: Session,
+    rows: Iterable[Row],
+    staff_id: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict:
+    """Credit every valid row of ``rows`` and return a per-row report."""
+    report = BulkAccrualReport()
+    seen_refs: set = set()
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            break
+        for _ in range(MAX_CHUNK_ATTEMPTS):
+            try:
+                part, refs = _process_chunk(db, chunk, staff_id, seen_refs)
+                break
+            except IntegrityError:
+                # A concurrent upload committed some of these refs first; redo the
+                # chunk so they are reported as duplicates instead of re-credited.
+                db.rollback()
+        else:
+            # Still racing: nothing of this chunk was credited, so the lines can be sent again
+            part, refs = BulkAccrualReport(), set()
+            for line_no, record in chunk:
+                part.processed += 1
+                part.error(
+                    line_no, field_text(record.get("external_ref")), "Conflicts with a concurrent upload; send it again"
+                )
+        report.merge(part)
+        seen_refs |= refs
+    return report.as_dict()
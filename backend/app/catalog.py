@@ -0,0 +1,155 @@
+"""Cached gift catalog for ``GET /gifts``.
+
+The catalog changes a few times a day but is polled by every redemption
+screen, so each worker keeps it pre-serialized as JSON bytes together with an
+ETag. Any transaction that creates, edits or deletes a gift, or changes its
+stock, bumps the ``gifts`` version in ``cache_versions`` before committing;
+ORM writes are picked up by a flush hook, Core writes call ``bump_version``.
+Workers compare their copy against that shared version at most every
+``GIFT_CATALOG_CHECK_SECONDS`` (immediately after their own catalog writes),
+so most reads touch neither the database nor the serializer.
+"""
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+GIFT_CATALOG_CHECK_SECONDS = float(os.getenv("GIFT_CATALOG_CHECK_SECONDS", 1))
+CACHE_VERSION_SHARDS = max(1, int(os.getenv("CACHE_VERSION_SHARDS", 8)))
+
+CATALOG = "gifts"
+
+_versions = models.CacheVersion.__table__
+_gift_list = TypeAdapter(List[schemas.GiftOut])
+
+
+def bump_version(db: Session, name: str = CATALOG) -> None:
+    """Bump ``name`` in the current transaction and refresh this worker's copy after commit."""
+    shard = random.randrange(CACHE_VERSION_SHARDS)
+    stmt = (
+        update(_versions)
+        .where(_versions.c.name == name, _versions.c.shard == shard)
+        .values(version=_versions.c.version + 1)
+    )
+    if db.connection().execute(stmt).rowcount == 0:
+        # Shards are normally created at startup by ensure_versions
+        db.connection().execute(insert(_versions).values(name=name, shard=shard, version=1))
+    db.info.setdefault("stale_caches", set()).add(name)
+
+
+def read_version(db: Session, name: str = CATALOG) -> int:
+    return db.execute(
+        select(func.coalesce(func.sum(_versions.c.version), 0)).where(_versions.c.name == name)
+    ).scalar()
+
+
+def ensure_versions(db: Session, name: str = CATALOG) -> None:
+    """Create the version shards on first start so bumps never have to insert."""
+    if db.execute(select(_versions.c.shard).where(_versions.c.name == name)).first() is not None:
+        return
+    try:
+        db.execute(insert(_versions), [
+            {"name": name, "shard": shard, "version": 0} for shard in range(CACHE_VERSION_SHARDS)
+        ])
+        db.commit()
+    except IntegrityError:
+        # Another worker created them first
+        db.rollback()
+
+
+class CatalogCache:
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self.version: Optional[int] = None
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.checked_at = 0.0
+        self.hits = 0
+        self.reloads = 0
+        self._lock = threading.Lock()
+
+    def fresh(self) -> Optional[Tuple[bytes, str]]:
+        """The cached body and ETag if they were validated recently enough, else None."""
+        with self._lock:
+            if self.body is not None and time.monotonic() - self.checked_at < self.check_interval:
+                self.hits += 1
+                return self.body, self.etag
+        return None
+
+    def refresh(self, db: Session) -> Tuple[bytes, str]:
+        """Check the shared version and reserialize the catalog if it moved."""
+        checked_at = time.monotonic()
+        # Read the version before the rows: the rows are then at least as new as it
+        version = read_version(db)
+        with self._lock:
+            if version == self.version and self.body is not None:
+                self.checked_at = checked_at
+                return self.body, self.etag
+        gifts = db.execute(select(models.Gift).order_by(models.Gift.created_at.desc())).scalars().all()
+        body = _gift_list.dump_json(_gift_list.validate_python(gifts, from_attributes=True))
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        with self._lock:
+            self.version, self.body, self.etag, self.checked_at = version, body, etag, checked_at
+            self.reloads += 1
+        return body, etag
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.checked_at = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "bytes": len(self.body or b""),
+                "hits": self.hits,
+                "reloads": self.reloads,
+                "check_interval_seconds": self.check_interval,
+            }
+
+
+gift_catalog = CatalogCache(GIFT_CATALOG_CHECK_SECONDS)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def catalog_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    # no-cache: browsers may keep the body but must revalidate it with If-None-Match
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_catalog(session: Session, flush_context) -> None:
+    if CATALOG in session.info.get("stale_caches", ()):
+        return  # already bumped in this transaction
+    if any(isinstance(obj, models.Gift) for obj in [*session.new, *session.deleted, *session.dirty]):
+        bump_version(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _refresh_local_caches(session: Session) -> None:
+    if CATALOG in session.info.pop("stale_caches", ()):
+        gift_catalog.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_bumps(session: Session) -> None:
+    session.info.pop("stale_caches", None)
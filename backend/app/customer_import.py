@@ -0,0 +1,298 @@
+"""Bulk customer import for onboarding a store's legacy member list.
+
+The file is read as a stream and processed in chunks, each in its own
+transaction. A chunk is normalized and validated in one pass, rows repeating a
+phone number seen earlier in the file (in any format, see ``app.phones``) are
+rejected, and the chunk's phone numbers are looked up in a single query, by
+normalized key or as typed. A row matching an existing customer takes that
+customer's stored number, so the whole chunk is written with one
+``INSERT ... ON CONFLICT (phone_number) DO UPDATE`` whose SET and WHERE
+merge the row according to the ``policy``:
+
+- ``skip``: leave existing customers untouched (``DO NOTHING``)
+- ``fill``: only set fields the existing customer is missing (email)
+- ``overwrite``: replace name and email with the file's values
+
+Balances are never imported or changed. A number registered by someone else
+between the lookup and the insert is merged like any existing customer; one
+registered in another format collides on ``phone_key`` instead, and the chunk
+is redone (up to ``MAX_CHUNK_ATTEMPTS`` times) so that the lookup finds it.
+
+``backfill_phone_keys`` gives customers registered before ``phone_key``
+existed theirs (``backfill_phone_keys.py``).
+"""
+import re
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, phones, stats
+from .bulk_points import MAX_CHUNK_ATTEMPTS, MAX_REPORTED_ERRORS, Row, field_text
+
+DEFAULT_CHUNK_SIZE = 5000
+MERGE_POLICIES = ("skip", "fill", "overwrite")
+
+PHONE_PATTERN = re.compile(r"\+?\d{6,15}")
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+customers = models.Customer.__table__
+
+OnReject = Callable[[int, dict, str], None]
+
+
+def _text(record: dict, field: str) -> str:
+    value = record.get(field)
+    if value is not None and field_text(value) is None:
+        raise ValueError(f"{field} must be a string")
+    return str(value or "").strip()
+
+
+def _clean(record: dict) -> dict:
+    """Normalize and validate one raw record; raise ValueError with a row-level message."""
+    if record.get("_invalid"):
+        raise ValueError("Malformed JSON line")
+    full_name = " ".join(_text(record, "full_name").split())
+    if not full_name:
+        raise ValueError("full_name is required")
+    if len(full_name) > 200:
+        raise ValueError("full_name is longer than 200 characters")
+    phone_number = phones.PHONE_SEPARATORS.sub("", _text(record, "phone_number"))
+    if not phone_number:
+        raise ValueError("phone_number is required")
+    if not PHONE_PATTERN.fullmatch(phone_number):
+        raise ValueError("phone_number must be 6 to 15 digits")
+    phone_key = phones.phone_key(phone_number)
+    if phone_key is None:
+        raise ValueError("phone_number is not a valid international number")
+    email = _text(record, "email").lower() or None
+    if email is not None and (len(email) > 200 or not EMAIL_PATTERN.fullmatch(email)):
+        raise ValueError("email is not a valid address")
+    return {"full_name": full_name, "phone_number": phone_number, "phone_key": phone_key, "email": email}
+
+
+class CustomerImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.errors: List[dict] = []
+
+    def reject(self, line: int, phone_number: Optional[str], message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "phone_number": phone_number, "error": message})
+
+    def merge(self, other: "CustomerImportReport") -> None:
+        self.processed += other.processed
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.rejected += other.rejected
+        self.errors.extend(other.errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "rejected": self.rejected,
+            "errors": sorted(self.errors, key=lambda e: e["line"]),
+        }
+
+
+def _upsert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(customers)
+    if dialect == "sqlite":
+        return sqlite.insert(customers)
+    raise RuntimeError(f"Customer import is not supported on {dialect}")
+
+
+def _on_conflict(stmt, policy: str):
+    """``stmt`` merging a row into the customer that has its phone number, per ``policy``."""
+    if policy == "skip":
+        return stmt.on_conflict_do_nothing(index_elements=[customers.c.phone_number])
+    new = stmt.excluded
+    if policy == "fill":
+        set_ = {"email": func.coalesce(customers.c.email, new.email)}
+        changed = and_(customers.c.email.is_(None), new.email.is_not(None))
+    else:
+        set_ = {"full_name": new.full_name, "email": func.coalesce(new.email, customers.c.email)}
+        changed = or_(
+            customers.c.full_name != new.full_name,
+            and_(new.email.is_not(None), customers.c.email.is_distinct_from(new.email)),
+        )
+    # Rows the WHERE leaves alone are not returned: they count as unchanged
+    return stmt.on_conflict_do_update(index_elements=[customers.c.phone_number], set_=set_, where=changed)
+
+
+Reject = Tuple[int, dict, str]
+
+
+def _process_chunk(
+    db: Session, chunk: List[Row], policy: str, seen_phones: Dict[str, int]
+) -> Tuple[CustomerImportReport, List[Reject]]:
+    report = CustomerImportReport()
+    rejects: List[Reject] = []
+
+    def reject(line_no: int, record: dict, phone_number: Optional[str], message: str) -> None:
+        report.reject(line_no, phone_number, message)
+        rejects.append((line_no, record, message))
+
+    rows = []
+    for line_no, record in chunk:
+        report.processed += 1
+        try:
+            row = _clean(record)
+        except ValueError as exc:
+            reject(line_no, record, field_text(record.get("phone_number")), str(exc))
+            continue
+        first = seen_phones.setdefault(row["phone_key"], line_no)
+        if first != line_no:
+            reject(line_no, record, row["phone_number"], f"Duplicate of line {first}")
+            continue
+        rows.append((line_no, record, row))
+    if not rows:
+        return report, rejects
+
+    found = db.execute(
+        select(customers.c.id, customers.c.phone_number, customers.c.phone_key)
+        .where(or_(
+            customers.c.phone_key.in_([row["phone_key"] for _, _, row in rows]),
+            # Customers registered before phone keys were backfilled
+            customers.c.phone_number.in_([row["phone_number"] for _, _, row in rows]),
+        ))
+    ).all()
+    by_key = {r.phone_key: r for r in found if r.phone_key is not None}
+    by_number = {r.phone_number: r for r in found}
+    now = datetime.utcnow()
+    values, ids = [], {}
+    for line_no, record, row in rows:
+        current = by_key.get(row["phone_key"]) or by_number.get(row["phone_number"])
+        if current is not None:
+            # Conflict on the number as the customer registered it
+            row = {**row, "phone_number": current.phone_number}
+            if row["phone_number"] in ids:
+                # Without a key the customer also matched another line by number; one upsert may not merge twice
+                reject(line_no, record, row["phone_number"], "Same customer as another line")
+                continue
+        new_id = models.new_uuid()
+        values.append({"id": new_id, **row, "total_points": 0, "created_at": now})
+        ids[row["phone_number"]] = new_id
+
+    if not values:
+        return report, rejects
+    written = db.execute(
+        _on_conflict(_upsert(db), policy).returning(customers.c.id, customers.c.phone_number), values
+    ).all()
+    # A new row keeps the id it was given; a merged one returns the existing customer's
+    report.inserted = sum(1 for r in written if ids[r.phone_number] == r.id)
+    report.updated = len(written) - report.inserted
+    report.unchanged = len(values) - len(written)
+    # Core statements bypass the ORM flush hook that counts customers
+    stats.apply_deltas(db, total_customers=report.inserted)
+    db.commit()
+    return report, rejects
+
+
+def import_customers(
+    db: Session,
+    rows: Iterable[Row],
+    policy: str = "skip",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    on_reject: Optional[OnReject] = None,
+) -> dict:
+    """Insert or merge every valid row of ``rows``; ``on_reject(line, record, error)`` sees each reject."""
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unknown merge policy {policy!r}")
+    report = CustomerImportReport()
+    seen_phones: Dict[str, int] = {}
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            break
+        for _ in range(MAX_CHUNK_ATTEMPTS):
+            try:
+                part, rejects = _process_chunk(db, chunk, policy, seen_phones)
+                break
+            except IntegrityError:
+                # Someone registered one of these numbers in another format meanwhile
+                db.rollback()
+        else:
+            part, rejects = CustomerImportReport(), []
+            for line_no, record in chunk:
+                part.processed += 1
+                part.reject(line_no, field_text(record.get("phone_number")), "Conflicts with a concurrent registration")
+                rejects.append((line_no, record, "Conflicts with a concurrent registration"))
+        report.merge(part)
+        if on_reject is not None:
+            for line_no, record, message in rejects:
+                on_reject(line_no, record, message)
+    return report.as_dict()
+
+
+def _fill_phone_keys(db: Session, rows: list, report: dict, on_conflict: Optional[Callable[[dict], None]]) -> None:
+    keyed: Dict[str, list] = {}
+    for row in rows:
+        key = phones.phone_key(row.phone_number)
+        if key is None:
+            report["invalid"] += 1
+        else:
+            keyed.setdefault(key, []).append(row)
+    taken = set(db.execute(select(customers.c.phone_key).where(customers.c.phone_key.in_(list(keyed)))).scalars())
+    updates, conflicts = [], []
+    for key, owners in keyed.items():
+        if key in taken or len(owners) > 1:
+            conflicts += [{"customer_id": row.id, "phone_number": row.phone_number, "phone_key": key} for row in owners]
+        else:
+            updates.append({"customer_id": owners[0].id, "phone_key": key})
+    if updates:
+        db.execute(update(customers).where(customers.c.id == bindparam("customer_id")), updates)
+    db.commit()
+    report["filled"] += len(updates)
+    report["conflicts"] += len(conflicts)
+    if on_conflict is not None:
+        for conflict in conflicts:
+            on_conflict(conflict)
+
+
+def backfill_phone_keys(
+    db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE, on_conflict: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """Set ``phone_key`` on customers registered before it existed, one chunk of ids per transaction.
+
+    Numbers that are not phone numbers keep no key. Neither does a number whose
+    key another customer has (the same phone registered twice in different
+    formats); ``on_conflict`` is called for each such customer, to merge by hand.
+    """
+    report = {"filled": 0, "invalid": 0, "conflicts": 0}
+    after = None
+    while True:
+        q = (
+            select(customers.c.id, customers.c.phone_number)
+            .where(customers.c.phone_key.is_(None))
+            .order_by(customers.c.id)
+            .limit(chunk_size)
+        )
+        if after is not None:
+            q = q.where(customers.c.id > after)
+        rows = db.execute(q).all()
+        if not rows:
+            return report
+        after = rows[-1].id
+        try:
+            _fill_phone_keys(db, rows, report, on_conflict)
+        except IntegrityError:
+            # A customer registered meanwhile took one of these keys; the second pass sees it
+            db.rollback()
+            _fill_phone_keys(db, rows, report, on_conflict)
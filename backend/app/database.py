@@ -1,14 +1,62 @@
+import logging
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from .profiling import instrument_queries
+from .pool_metrics import (
+    InstrumentedAsyncQueuePool, InstrumentedNullPool, InstrumentedQueuePool, instrument_engine,
+)
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Opt-in: serve the API from async routers on an AsyncEngine
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "false").lower() in ("1", "true", "yes")
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+# Pool sizing is per engine and per worker process: with gunicorn -w 4 the
+# database sees up to 4 * (DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW) connections.
+# DATABASE_POOL_MODE=null opens a connection per checkout, for use behind pgbouncer.
+DATABASE_POOL_MODE = os.getenv("DATABASE_POOL_MODE", "queue").lower()
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", 5))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", 10))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", 30))
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", -1))
+DATABASE_POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# Connections each worker opens at startup, capped at DATABASE_POOL_SIZE
+DATABASE_POOL_WARM = int(os.getenv("DATABASE_POOL_WARM", 2))
+
+
+def pool_options(url: str, is_async: bool = False) -> dict:
+    options = {"pool_pre_ping": DATABASE_POOL_PRE_PING}
+    if DATABASE_POOL_MODE == "null":
+        return {**options, "poolclass": InstrumentedNullPool}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory SQLite must keep its single-connection pool
+        return options
+    return {
+        **options,
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": DATABASE_POOL_SIZE,
+        "max_overflow": DATABASE_MAX_OVERFLOW,
+        "pool_timeout": DATABASE_POOL_TIMEOUT,
+        "pool_recycle": DATABASE_POOL_RECYCLE,
+    }
+
 
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
+instrument_engine(engine, "primary")
+instrument_queries(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -19,3 +67,66 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _warm_count(pool, connections: int) -> int:
+    # NullPool keeps nothing and in-memory SQLite has a single connection anyway
+    return min(connections, pool.size()) if isinstance(pool, QueuePool) else 0
+
+
+def warm_pool(engine, connections: int = DATABASE_POOL_WARM) -> int:
+    """Open up to ``connections`` pooled connections so the first requests skip the connect.
+
+    A database that is down at boot is logged, not raised: the worker still
+    starts and connects on demand once it is back.
+    """
+    opened = []
+    try:
+        for _ in range(_warm_count(engine.pool, connections)):
+            opened.append(engine.connect())
+    except DBAPIError as exc:
+        logger.warning("Pool warm-up stopped after %d connections: %s", len(opened), exc)
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+async def warm_async_pool(engine, connections: int = DATABASE_POOL_WARM) -> int:
+    opened = []
+    try:
+        for _ in range(_warm_count(engine.sync_engine.pool, connections)):
+            opened.append(await engine.connect())
+    except DBAPIError as exc:
+        logger.warning("Pool warm-up stopped after %d connections: %s", len(opened), exc)
+    finally:
+        for conn in opened:
+            await conn.close()
+    return len(opened)
+
+
+def async_database_url(url: str) -> str:
+    """Swap the sync DBAPI driver in ``url`` for its asyncio counterpart."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"DATABASE_ASYNC is not supported for {backend} databases")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal = None
+
+if DATABASE_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _async_url = os.getenv("DATABASE_ASYNC_URL") or async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **pool_options(_async_url, is_async=True))
+    instrument_engine(async_engine.sync_engine, "primary_async")
+    instrument_queries(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
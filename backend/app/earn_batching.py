@@ -0,0 +1,226 @@
+"""Group commit for add-points under heavy earn traffic.
+
+Opt-in with ``EARN_BATCH_WINDOW_MS``. The first earn to arrive in a worker opens
+a batch and waits up to that long (or until ``EARN_BATCH_MAX_SIZE`` earns have
+joined) for concurrent earns, then commits all of them in one transaction on
+its own request's session:
+
+- one UPDATE adds the summed deltas to every customer in the batch and returns
+  their rows (missing customers simply do not come back and get a 404);
+- one multi-row INSERT writes the ``PointTransaction`` rows, with
+  ``balance_after`` filled in as ``bulk_points`` does for an upload chunk;
+- the dashboard counters and any idempotency keys go in the same transaction.
+
+Each caller gets the balance right after its own ledger entry. If the batch
+fails as a whole (a duplicate idempotency key, a deadlock, a bad row), it is
+rolled back and every earn is retried on its own, so one bad request fails
+only itself.
+
+Batches live in one worker process: with gunicorn -w 4 up to four batches
+commit at a time. Deduct-points, redeem and the bulk upload are unchanged.
+"""
+import asyncio
+import os
+import threading
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import database, idempotency, ledger, models, schemas, stats
+from .bulk_points import balance_delta_update
+
+EARN_BATCH_WINDOW_MS = float(os.getenv("EARN_BATCH_WINDOW_MS", 0))
+EARN_BATCH_MAX_SIZE = int(os.getenv("EARN_BATCH_MAX_SIZE", 100))
+
+customers = models.Customer.__table__
+
+
+@dataclass
+class Earn:
+    customer_id: str
+    staff_id: str
+    amount: int
+    description: str
+    pending: Optional[idempotency.PendingKey] = None
+    result: Optional[schemas.CustomerOut] = None
+    error: Optional[Exception] = None
+
+    def outcome(self) -> schemas.CustomerOut:
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _canonical_id(customer_id: str) -> Optional[str]:
+    try:
+        return str(uuid.UUID(customer_id))
+    except ValueError:
+        return None
+
+
+def _apply(db: Session, earns: List[Earn]) -> None:
+    keyed = [(earn, _canonical_id(earn.customer_id)) for earn in earns]
+    deltas: Dict[str, int] = defaultdict(int)
+    for earn, customer_id in keyed:
+        if customer_id is not None:
+            # Customers of rejected amounts are updated by 0 only to learn whether they exist
+            deltas[customer_id] += max(earn.amount, 0)
+    found = {}
+    if deltas:
+        stmt = balance_delta_update(db, deltas).returning(*customers.c)
+        found = {row.id: row for row in db.execute(stmt)}
+
+    applied, tx_rows = [], []
+    for earn, customer_id in keyed:
+        if customer_id not in found:
+            earn.error = HTTPException(404, "Customer not found")
+        elif earn.amount <= 0:
+            earn.error = HTTPException(400, "Amount must be positive")
+        else:
+            applied.append(earn)
+            tx_rows.append({
+                "id": models.new_uuid(),
+                "customer_id": customer_id,
+                "staff_id": earn.staff_id,
+                "type": "earn",
+                "amount": earn.amount,
+                "description": earn.description,
+            })
+    if not applied:
+        db.rollback()
+        return
+
+    now = datetime.utcnow()
+    for tx in tx_rows:
+        tx["created_at"] = now
+    ledger.running_balances(tx_rows, {cid: row.total_points for cid, row in found.items()})
+    db.execute(insert(models.PointTransaction.__table__), tx_rows)
+    stats.apply_deltas(db, total_points_issued=sum(tx["amount"] for tx in tx_rows))
+    for earn, tx in zip(applied, tx_rows):
+        earn.result = schemas.CustomerOut.model_validate(
+            {**found[tx["customer_id"]]._mapping, "total_points": tx["balance_after"]}
+        )
+    if len(applied) == 1:
+        idempotency.commit(db, applied[0].pending, 200, applied[0].result)
+    else:
+        idempotency.record(db, [(earn.pending, 200, earn.result) for earn in applied if earn.pending])
+        db.commit()
+
+
+class BatchStats:
+    def __init__(self):
+        self.batches = 0
+        self.earns = 0
+        self.fallbacks = 0
+
+    def as_dict(self) -> dict:
+        return {"batches": self.batches, "earns": self.earns, "fallbacks": self.fallbacks}
+
+
+def settle(db: Session, earns: List[Earn], counters: BatchStats) -> None:
+    """Commit ``earns`` together, or one at a time if that fails; sets each one's result or error."""
+    counters.batches += 1
+    counters.earns += len(earns)
+    if len(earns) > 1:
+        try:
+            _apply(db, earns)
+            return
+        except Exception:
+            db.rollback()
+            counters.fallbacks += 1
+            for earn in earns:
+                earn.result = earn.error = None
+    for earn in earns:
+        try:
+            _apply(db, [earn])
+        except Exception as exc:
+            db.rollback()
+            earn.error = exc
+
+
+class _Batch:
+    def __init__(self, event_class):
+        self.earns: List[Earn] = []
+        self.full = event_class()
+        self.done = event_class()
+
+
+class EarnBatcher:
+    """Coalesces earns from the request threadpool; the first caller of each batch commits it."""
+
+    event_class = threading.Event
+
+    def __init__(self, window_ms: float, max_size: int):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self.stats = BatchStats()
+        self._batch: Optional[_Batch] = None
+        self._lock = threading.Lock()
+
+    def _join(self, earn: Earn):
+        """Add ``earn`` to the open batch (opening one if needed); return it and whether we lead it."""
+        with self._lock:
+            batch, leader = self._batch, self._batch is None
+            if leader:
+                batch = self._batch = _Batch(self.event_class)
+            batch.earns.append(earn)
+            if len(batch.earns) >= self.max_size:
+                self._batch = None
+                batch.full.set()
+        return batch, leader
+
+    def _close(self, batch: _Batch) -> None:
+        with self._lock:
+            if self._batch is batch:
+                self._batch = None
+
+    def submit(self, db: Session, earn: Earn) -> schemas.CustomerOut:
+        batch, leader = self._join(earn)
+        if not leader:
+            batch.done.wait()
+            return earn.outcome()
+        batch.full.wait(self.window)
+        self._close(batch)
+        try:
+            settle(db, batch.earns, self.stats)
+        finally:
+            batch.done.set()
+        return earn.outcome()
+
+
+class AsyncEarnBatcher(EarnBatcher):
+    """The same on the event loop, committing through ``AsyncSession.run_sync``."""
+
+    event_class = asyncio.Event
+
+    async def submit(self, db, earn: Earn) -> schemas.CustomerOut:
+        batch, leader = self._join(earn)
+        if not leader:
+            await batch.done.wait()
+            return earn.outcome()
+        try:
+            await asyncio.wait_for(batch.full.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        self._close(batch)
+        try:
+            await db.run_sync(settle, batch.earns, self.stats)
+        finally:
+            batch.done.set()
+        return earn.outcome()
+
+
+batcher = (
+    EarnBatcher(EARN_BATCH_WINDOW_MS, EARN_BATCH_MAX_SIZE)
+    if EARN_BATCH_WINDOW_MS > 0 and not database.DATABASE_ASYNC else None
+)
+async_batcher = (
+    AsyncEarnBatcher(EARN_BATCH_WINDOW_MS, EARN_BATCH_MAX_SIZE)
+    if EARN_BATCH_WINDOW_MS > 0 and database.DATABASE_ASYNC else None
+)
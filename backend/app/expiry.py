@@ -0,0 +1,265 @@
+"""Point expiry: points expire ``POINT_EXPIRY_MONTHS`` after they were earned, oldest first.
+
+Every positive entry is a lot and every negative entry (redemptions, deductions
+and earlier expiries) consumes the oldest lots first. Ordering a customer's
+lots by ``(created_at, id)`` and taking the running sum of their amounts with a
+window function, the unconsumed part of each lot is that running sum minus
+everything consumed so far, clamped to ``[0, amount]``. Whatever remains of
+lots earned before the cutoff expires.
+
+Customers are processed in chunks of consecutive ids, in parallel over
+disjoint id ranges. Each chunk is one transaction that locks the chunk's
+customers, computes their expiring points in one query, decrements the
+balances with one UPDATE and writes one ``expire`` entry per customer. The
+chunk also advances its range's watermark in ``point_expiry_runs``, so an
+interrupted run resumes where it stopped. A rerun is a no-op: earlier
+expiries count as consumption, and each entry's ``external_ref`` names the
+cutoff and customer, so it can only be written once.
+
+Once part of the ledger has been archived (``app.partitions``), each
+customer's balance in the snapshot taken at the archive horizon stands in for
+the archived entries as one opening lot, dated at that snapshot.
+
+Once a run for an earlier cutoff has finished, only customers with lots
+earned between the two cutoffs can have anything new to expire, and only
+they are visited.
+"""
+import calendar
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Callable, Optional
+
+from sqlalchemy import case, exists, func, insert, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import ledger, models
+from .bulk_points import apply_balance_deltas
+from .database import SessionLocal
+
+POINT_EXPIRY_MONTHS = int(os.getenv("POINT_EXPIRY_MONTHS", 12))
+
+customers = models.Customer.__table__
+transactions = models.PointTransaction.__table__
+runs = models.PointExpiryRun.__table__
+
+
+def expiry_cutoff(today: Optional[date] = None, months: int = POINT_EXPIRY_MONTHS) -> datetime:
+    """Midnight ``months`` before ``today``: points earned before it have expired."""
+    today = today or datetime.utcnow().date()
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    day = min(today.day, calendar.monthrange(year, month + 1)[1])
+    return datetime(year, month + 1, day)
+
+
+def external_ref(cutoff: datetime, customer_id: str) -> str:
+    return f"expiry:{cutoff:%Y-%m-%d}:{customer_id}"
+
+
+def _candidates(cutoff: datetime, since: Optional[datetime]):
+    """Customers that may have points to expire at ``cutoff`` (all of them when ``since`` is None)."""
+    if since is None:
+        return None
+    return exists().where(
+        transactions.c.customer_id == customers.c.id,
+        transactions.c.amount > 0,
+        transactions.c.created_at >= since,
+        transactions.c.created_at < cutoff,
+    ).correlate(customers)
+
+
+def _opening_lots(members, opening: datetime):
+    """The balance each of ``members`` carried into the unarchived ledger, from its snapshot at ``opening``."""
+    s = ledger.snapshots
+    snap = s.alias("opening")
+    latest = select(func.max(s.c.as_of)).where(s.c.customer_id == snap.c.customer_id, s.c.as_of <= opening)
+    return select(
+        snap.c.customer_id,
+        # Any id will do: the lot predates every entry still in the table
+        snap.c.customer_id.label("id"),
+        snap.c.balance.label("amount"),
+        snap.c.as_of.label("created_at"),
+    ).where(snap.c.customer_id.in_(members), snap.c.as_of == latest.scalar_subquery(), snap.c.balance > 0)
+
+
+def expiring_select(members, cutoff: datetime, opening: Optional[datetime] = None):
+    """``(id, total_points, points, lots)`` of the ``members`` customers with points earned before ``cutoff`` left.
+
+    ``opening`` is the snapshot time carrying the archived part of the ledger, if any.
+    """
+    t = transactions
+    source = select(t.c.customer_id, t.c.id, t.c.amount, t.c.created_at).where(t.c.customer_id.in_(members))
+    if opening is not None:
+        source = union_all(source, _opening_lots(members, opening))
+    lots = source.subquery("ledger")
+    customer = {"partition_by": lots.c.customer_id}
+    # One pass over the chunk's entries: running total earned per entry, total consumed per customer
+    entries = (
+        select(
+            lots.c.customer_id,
+            lots.c.amount,
+            lots.c.created_at,
+            func.sum(case((lots.c.amount > 0, lots.c.amount), else_=0)).over(
+                order_by=(lots.c.created_at, lots.c.id), **customer
+            ).label("earned_through"),
+            func.sum(case((lots.c.amount < 0, -lots.c.amount), else_=0)).over(**customer).label("consumed"),
+        )
+        .subquery("entries")
+    )
+    left = entries.c.earned_through - entries.c.consumed
+    remaining = case((left <= 0, 0), (left >= entries.c.amount, entries.c.amount), else_=left)
+    expiring = (
+        select(
+            entries.c.customer_id,
+            func.sum(remaining).label("points"),
+            func.count(case((left > 0, 1))).label("lots"),
+        )
+        .where(entries.c.amount > 0, entries.c.created_at < cutoff)
+        .group_by(entries.c.customer_id)
+        .having(func.sum(remaining) > 0)
+        .subquery("expiring")
+    )
+    return select(
+        customers.c.id, customers.c.total_points, expiring.c.points, expiring.c.lots,
+    ).join_from(customers, expiring, expiring.c.customer_id == customers.c.id)
+
+
+def _expire_chunk(
+    db: Session, members, cutoff: datetime, opening: Optional[datetime], staff_id: Optional[str], dry_run: bool
+) -> list:
+    """Expire the chunk's points (or only compute them when ``dry_run``); return one dict per customer."""
+    if not dry_run:
+        # Hold the balances still while their ledger is read; customers are always locked first
+        db.execute(select(customers.c.id).where(customers.c.id.in_(members)).with_for_update()).all()
+    expiring = []
+    for row in db.execute(expiring_select(members, cutoff, opening)):
+        # Never below zero, even for a customer whose balance drifted from the ledger
+        points = min(int(row.points), row.total_points)
+        if points > 0:
+            expiring.append({"customer_id": row.id, "points": points, "lots": row.lots})
+    if dry_run or not expiring:
+        return expiring
+
+    balances = apply_balance_deltas(db, {e["customer_id"]: -e["points"] for e in expiring})
+    now = datetime.utcnow()
+    db.execute(insert(transactions), [
+        {
+            "id": models.new_uuid(),
+            "customer_id": e["customer_id"],
+            "staff_id": staff_id,
+            "type": "expire",
+            "amount": -e["points"],
+            "description": f"Points earned before {cutoff:%Y-%m-%d} expired",
+            "external_ref": external_ref(cutoff, e["customer_id"]),
+            "balance_after": balances[e["customer_id"]],
+            "created_at": now,
+        }
+        for e in expiring
+    ])
+    return expiring
+
+
+def _last_finished_cutoff(db: Session, cutoff: datetime) -> Optional[datetime]:
+    unfinished = select(runs.c.cutoff).where(runs.c.finished_at.is_(None))
+    return db.execute(
+        select(func.max(runs.c.cutoff)).where(runs.c.cutoff < cutoff, runs.c.cutoff.not_in(unfinished))
+    ).scalar()
+
+
+def _start_run(db: Session, cutoff: datetime, parts: int) -> list:
+    """The run's per-range watermark rows, created on first use."""
+    existing = db.execute(select(runs).where(runs.c.cutoff == cutoff).order_by(runs.c.part)).all()
+    if existing:
+        return existing
+    try:
+        db.execute(insert(runs), [
+            {"cutoff": cutoff, "part": part, "parts": parts, "customers": 0, "points": 0} for part in range(parts)
+        ])
+        db.commit()
+    except IntegrityError:
+        # Another process started the same run first
+        db.rollback()
+    return db.execute(select(runs).where(runs.c.cutoff == cutoff).order_by(runs.c.part)).all()
+
+
+def expire_points(
+    cutoff: Optional[datetime] = None,
+    staff_id: Optional[str] = None,
+    workers: int = ledger.DEFAULT_WORKERS,
+    chunk_size: int = ledger.DEFAULT_CHUNK_SIZE,
+    dry_run: bool = False,
+    full: bool = False,
+    on_expire: Optional[Callable[[dict], None]] = None,
+    session_factory=SessionLocal,
+) -> dict:
+    """Expire every customer's points earned before ``cutoff`` (default: ``expiry_cutoff()``).
+
+    ``staff_id`` is recorded on the ``expire`` entries and is required unless
+    ``dry_run``. ``full`` visits every customer instead of only those with lots
+    earned since the last finished run. ``on_expire`` is called once per customer.
+    """
+    if not dry_run and staff_id is None:
+        raise ValueError("staff_id is required unless dry_run")
+    cutoff = cutoff or expiry_cutoff()
+    with session_factory() as db:
+        since = None if full else _last_finished_cutoff(db, cutoff)
+        archived = ledger.archived_until(db)
+        if since is not None and archived is not None and since < archived:
+            # The lots earned since then may be archived by now: visit every customer
+            since = None
+        if dry_run:
+            parts = [(part, None, None) for part in range(workers * 4)]
+        else:
+            parts = [
+                (row.part, row.last_customer_id, row.finished_at)
+                for row in _start_run(db, cutoff, workers * 4)
+            ]
+    opening = ledger.opening_as_of(archived) if archived else None
+    candidates = _candidates(cutoff, since)
+    bounds = ledger.id_ranges(len(parts))
+    report = {"cutoff": cutoff, "since": since, "dry_run": dry_run, "customers": 0, "points": 0, "lots": 0}
+    lock = threading.Lock()
+
+    def run(part: int, after: Optional[str]) -> None:
+        low, high = bounds[part]
+        watermark = (runs.c.cutoff == cutoff) & (runs.c.part == part)
+        db = session_factory()
+        try:
+            for first, last in ledger.customer_chunks(db, low, high, chunk_size, after=after, where=candidates):
+                members = select(customers.c.id).where(ledger.in_chunk(first, last))
+                if candidates is not None:
+                    members = members.where(candidates)
+                try:
+                    expired = _expire_chunk(db, members, cutoff, opening, staff_id, dry_run)
+                except IntegrityError:
+                    # A concurrent run expired some of these already; recomputing finds only the rest
+                    db.rollback()
+                    expired = _expire_chunk(db, members, cutoff, opening, staff_id, dry_run)
+                points = sum(e["points"] for e in expired)
+                if not dry_run:
+                    db.execute(update(runs).where(watermark).values(
+                        last_customer_id=last,
+                        customers=runs.c.customers + len(expired),
+                        points=runs.c.points + points,
+                    ))
+                db.commit()
+                with lock:
+                    report["customers"] += len(expired)
+                    report["points"] += points
+                    report["lots"] += sum(e["lots"] for e in expired)
+                    if on_expire is not None:
+                        for e in expired:
+                            on_expire(e)
+            if not dry_run:
+                db.execute(update(runs).where(watermark).values(finished_at=datetime.utcnow()))
+                db.commit()
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run, part, after) for part, after, finished in parts if finished is None]
+        for future in futures:
+            future.result()
+    return report
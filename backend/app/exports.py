@@ -0,0 +1,142 @@
+"""Streaming table extracts for finance.
+
+Rows are read through a server-side cursor (``stream_results``) in batches of
+``EXPORT_BATCH_SIZE`` and written out as they arrive, so memory stays flat
+however large the extract. Each export uses its own connection because the
+response body is produced after the request's session has been closed.
+
+CSV is streamed; Parquet (``write_parquet``, needs ``pyarrow``) is written to
+a file one row group per batch. Rows come out in storage order, not sorted.
+"""
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy import DateTime, Integer, select
+
+from . import models
+from .database import engine
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 10000))
+
+TRANSACTION_TYPES = ("earn", "redeem", "manual_adjust", "expire")
+
+
+def _customers():
+    t = models.Customer.__table__
+    return select(t.c.id, t.c.full_name, t.c.phone_number, t.c.email, t.c.total_points, t.c.created_at), t.c.created_at
+
+
+def _transactions():
+    t = models.PointTransaction.__table__
+    return select(
+        t.c.id, t.c.customer_id, t.c.staff_id, t.c.type, t.c.amount, t.c.balance_after,
+        t.c.description, t.c.external_ref, t.c.created_at,
+    ), t.c.created_at
+
+
+def _redemptions():
+    r, g = models.Redemption.__table__, models.Gift.__table__
+    return select(
+        r.c.id, r.c.customer_id, r.c.gift_id, g.c.name.label("gift_name"), r.c.staff_id,
+        r.c.points_used, r.c.created_at,
+    ).join_from(r, g, r.c.gift_id == g.c.id), r.c.created_at
+
+
+DATASETS = {
+    "customers": _customers,
+    "transactions": _transactions,
+    "redemptions": _redemptions,
+}
+
+
+def export_query(dataset: str, since: Optional[datetime] = None, until: Optional[datetime] = None, type: Optional[str] = None):
+    """The select for ``dataset`` restricted to ``since <= created_at < until`` (and ``type`` for transactions)."""
+    stmt, created_at = DATASETS[dataset]()
+    if since is not None:
+        stmt = stmt.where(created_at >= since)
+    if until is not None:
+        stmt = stmt.where(created_at < until)
+    if type is not None:
+        if dataset != "transactions":
+            raise ValueError("type filter only applies to transactions")
+        stmt = stmt.where(models.PointTransaction.__table__.c.type == type)
+    return stmt
+
+
+def iter_batches(stmt, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[tuple]:
+    """Yield ``(column names, rows)`` batches of ``stmt`` from a server-side cursor."""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+        columns = list(result.keys())
+        for rows in result.partitions():
+            yield columns, rows
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(
+    stmt, batch_size: int = EXPORT_BATCH_SIZE, on_batch: Optional[Callable[[int], None]] = None
+) -> Iterator[str]:
+    """Stream ``stmt`` as CSV text, one chunk per batch (the header comes first)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    total = 0
+    for columns, rows in iter_batches(stmt, batch_size):
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        total += len(rows)
+        if on_batch is not None:
+            on_batch(total)
+    if not header_written:
+        # Empty extract: still emit the header
+        yield ",".join(stmt.selected_columns.keys()) + "\r\n"
+
+
+def _arrow_schema(pa, stmt):
+    """Arrow schema from the selected columns' SQL types (inference would pick null for all-NULL batches)."""
+    fields = []
+    for column in stmt.selected_columns:
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.key, arrow_type))
+    return pa.schema(fields)
+
+
+def write_parquet(
+    stmt, path: str, batch_size: int = EXPORT_BATCH_SIZE, on_batch: Optional[Callable[[int], None]] = None
+) -> int:
+    """Write ``stmt`` to a Parquet file, one row group per batch; return the row count."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = _arrow_schema(pa, stmt)
+    total = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for columns, rows in iter_batches(stmt, batch_size):
+            data = {
+                name: [None if v is None else str(v) for v in col] if schema.field(name).type == pa.string() else list(col)
+                for name, col in zip(columns, zip(*rows))
+            }
+            writer.write_table(pa.table(data, schema=schema))
+            total += len(rows)
+            if on_batch is not None:
+                on_batch(total)
+    return total
@@ -0,0 +1,148 @@
+"""Password hashing on a bounded process pool.
+
+bcrypt is deliberately slow and CPU-bound, so running it on the request
+threadpool lets a burst of logins starve every other endpoint. Hash and verify
+calls are instead submitted to a small process pool (created lazily, so each
+gunicorn worker gets its own after fork). At most ``PASSWORD_HASH_MAX_PENDING``
+calls may be queued or running per worker; beyond that ``submit`` raises
+``HashingBusy`` and the caller should shed load. A pool broken by a dead
+process (OOM killer, crash) is replaced on the next call.
+``PASSWORD_HASH_WORKERS=0`` runs hashing inline instead.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS") or max(1, (os.cpu_count() or 2) // 2))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 16))
+
+_context: Optional["CryptContext"] = None
+
+
+def crypt_context() -> "CryptContext":
+    global _context
+    if _context is None:
+        # Imported here so worker boot does not pay for passlib and its bcrypt backend
+        from passlib.context import CryptContext
+
+        # Pinning min/max rounds to the configured cost makes needs_update() flag
+        # hashes created under any other cost, so they are upgraded on next login.
+        _context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=BCRYPT_ROUNDS,
+            bcrypt__min_rounds=BCRYPT_ROUNDS,
+            bcrypt__max_rounds=BCRYPT_ROUNDS,
+        )
+    return _context
+
+
+def hash_secret(plain: str) -> str:
+    return crypt_context().hash(plain)
+
+
+def verify_and_update(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Return whether ``plain`` matches and, if the hash is outdated, its replacement."""
+    return crypt_context().verify_and_update(plain, hashed)
+
+
+def _exit_with_parent(parent_pid: int) -> None:
+    """Pool initializer: stop once the worker that forked us is gone.
+
+    gunicorn workers can exit without shutting the executor down, which would
+    otherwise leave orphaned hash processes holding the inherited listen socket.
+    """
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class HashPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingBusy()
+            self.pending += 1
+            executor = self._pool()
+        if executor is None:
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+            self._done(future)
+            return future
+        try:
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                future = self._replace(executor).submit(fn, *args)
+        except BaseException:
+            # Never queued, so _done will not run for it
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        # Called with the lock held
+        if self.workers > 0 and self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_exit_with_parent, initargs=(os.getpid(),)
+            )
+        return self._executor
+
+    def _replace(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """A fresh pool in place of ``broken``, unless a concurrent call already replaced it."""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.restarts += 1
+            executor = self._pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+        return executor
+
+    def _done(self, _future: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+            }
+
+
+hash_pool = HashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,140 @@
+"""Idempotency keys for the point-mutating endpoints.
+
+Clients that may retry (flaky store Wi-Fi) send an ``Idempotency-Key`` header
+with add-points, deduct-points and redeem. The key and the response are written
+to ``idempotency_keys`` in the same transaction as the mutation, so they commit
+or roll back together:
+
+- a retry of a request that has committed finds the key with one primary-key
+  lookup and gets the stored response back (marked ``Idempotent-Replayed``)
+  without touching, let alone locking, the customer or gift rows;
+- a duplicate racing the original does the work, fails on the key's primary
+  key when inserting it (on Postgres after waiting for the original to
+  commit), rolls all of it back and replays the stored response instead.
+
+Either way exactly one of them mutates. Only successes are stored: a request
+that failed changed nothing and may be retried with the same key. Reusing a key
+for a different request is a 422. Keys are scoped to the staff member and
+purged in bulk once older than ``IDEMPOTENCY_KEY_TTL_HOURS``
+(``purge_idempotency_keys.py``).
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+PURGE_BATCH_SIZE = 5000
+MAX_KEY_LENGTH = 100
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+keys = models.IdempotencyKey.__table__
+
+
+class Replay(Exception):
+    """Answers the request with the stored response of the one that used its key first."""
+
+    def __init__(self, status_code: int, body: str):
+        self.status_code = status_code
+        self.body = body
+
+
+async def replay_response(request: Request, exc: Replay) -> Response:
+    return Response(exc.body, status_code=exc.status_code, media_type="application/json",
+                    headers={REPLAYED_HEADER: "true"})
+
+
+@dataclass
+class PendingKey:
+    staff_id: str
+    key: str
+    request_hash: str
+
+
+def _stored(db: Session, staff_id: str, key: str):
+    return db.execute(
+        select(keys.c.request_hash, keys.c.status_code, keys.c.response)
+        .where(keys.c.staff_id == staff_id, keys.c.key == key)
+    ).first()
+
+
+def _replay(stored, request_hash: str) -> None:
+    if stored.request_hash != request_hash:
+        raise HTTPException(422, "Idempotency-Key was already used for a different request")
+    raise Replay(stored.status_code, stored.response)
+
+
+def begin(db: Session, staff_id: str, key: Optional[str], path: str, payload: BaseModel) -> Optional[PendingKey]:
+    """Raise ``Replay`` if ``key`` has been used already; otherwise return what ``commit`` needs to record it."""
+    if key is None:
+        return None
+    request_hash = hashlib.sha256(f"{path}\n{payload.model_dump_json()}".encode()).hexdigest()
+    stored = _stored(db, staff_id, key)
+    if stored is not None:
+        _replay(stored, request_hash)
+    return PendingKey(staff_id, key, request_hash)
+
+
+def _key_row(pending: PendingKey, status_code: int, body: BaseModel) -> dict:
+    return {
+        "staff_id": pending.staff_id,
+        "key": pending.key,
+        "request_hash": pending.request_hash,
+        "status_code": status_code,
+        "response": body.model_dump_json(),
+        "created_at": datetime.utcnow(),
+    }
+
+
+def record(db: Session, entries: List[Tuple[PendingKey, int, BaseModel]]) -> None:
+    """Insert the keys of several requests committed as one transaction, without committing.
+
+    A key some other request already holds raises ``IntegrityError``; the caller
+    should roll back and ``commit`` its requests one at a time to replay it.
+    """
+    if entries:
+        db.execute(insert(keys), [_key_row(*entry) for entry in entries])
+
+
+def commit(db: Session, pending: Optional[PendingKey], status_code: int, body: BaseModel) -> None:
+    """Commit the request's changes together with its key and response (plain commit without a key)."""
+    if pending is None:
+        db.commit()
+        return
+    try:
+        db.execute(insert(keys).values(_key_row(pending, status_code, body)))
+        db.commit()
+    except IntegrityError:
+        # A concurrent duplicate committed first: drop our changes and answer with its response
+        db.rollback()
+        stored = _stored(db, pending.staff_id, pending.key)
+        if stored is None:
+            raise
+        _replay(stored, pending.request_hash)
+
+
+def purge_expired(
+    db: Session, ttl_hours: float = IDEMPOTENCY_KEY_TTL_HOURS, batch_size: int = PURGE_BATCH_SIZE
+) -> int:
+    """Delete keys older than ``ttl_hours`` in batches of ``batch_size``, one transaction each."""
+    cutoff = datetime.utcnow() - timedelta(hours=ttl_hours)
+    purged = 0
+    while True:
+        batch = db.execute(
+            select(keys.c.staff_id, keys.c.key).where(keys.c.created_at < cutoff).limit(batch_size)
+        ).all()
+        if not batch:
+            return purged
+        db.execute(delete(keys).where(tuple_(keys.c.staff_id, keys.c.key).in_([tuple(row) for row in batch])))
+        db.commit()
+        purged += len(batch)
@@ -0,0 +1,278 @@
+"""The points ledger: balances derived from ``point_transactions``.
+
+``point_transactions`` is append-only and every entry records ``balance_after``,
+the customer's ``total_points`` right after it, written under the same row
+lock that moved the balance. Ledger order is ``(created_at, id)``.
+
+Periodic ``balance_snapshots`` rows (``reconcile_ledger.py --snapshot``, e.g.
+from cron) fold history into one row per customer, so a balance "as of X" is
+the latest snapshot at or before X plus the entries between the two, read from
+the ``(customer_id, created_at)`` index instead of summing the full history.
+Snapshots are taken ``LEDGER_SNAPSHOT_LAG_SECONDS`` in the past so that no
+transaction still in flight can land behind one.
+
+Months archived by ``partition_transactions.py --archive`` are gone from
+``point_transactions``; a snapshot at ``opening_as_of`` of the archive horizon,
+taken before anything is detached, carries their balance forward.
+
+``verify_balances`` streams every customer's ``total_points`` against its
+ledger balance, in chunks over disjoint id ranges processed in parallel.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+LEDGER_SNAPSHOT_LAG_SECONDS = int(os.getenv("LEDGER_SNAPSHOT_LAG_SECONDS", 300))
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_WORKERS = 4
+MAX_REPORTED_DRIFTS = 1000
+
+customers = models.Customer.__table__
+transactions = models.PointTransaction.__table__
+snapshots = models.BalanceSnapshot.__table__
+archives = models.PointTransactionArchive.__table__
+
+
+def ledger_columns(as_of: Optional[datetime] = None):
+    """Per-customer ledger columns for a select from ``customers``.
+
+    Returns ``(snap, snap_join, balance, entries)``: the snapshot alias and the
+    condition to outer-join it on, the ledger balance as of ``as_of`` (or now),
+    and the number of entries after the snapshot that the balance includes.
+    """
+    snap = snapshots.alias("snap")
+    latest = select(func.max(snapshots.c.as_of)).where(snapshots.c.customer_id == customers.c.id)
+    tail = [
+        transactions.c.customer_id == customers.c.id,
+        transactions.c.created_at > func.coalesce(snap.c.as_of, datetime.min),
+    ]
+    if as_of is not None:
+        latest = latest.where(snapshots.c.as_of <= as_of)
+        tail.append(transactions.c.created_at <= as_of)
+    snap_join = and_(snap.c.customer_id == customers.c.id, snap.c.as_of == latest.scalar_subquery())
+    tail_sum = select(func.coalesce(func.sum(transactions.c.amount), 0)).where(*tail).scalar_subquery()
+    tail_count = select(func.count()).select_from(transactions).where(*tail).scalar_subquery()
+    return snap, snap_join, (func.coalesce(snap.c.balance, 0) + tail_sum), tail_count
+
+
+def archived_until(db: Session) -> Optional[datetime]:
+    """Every entry before this time has been archived (None if nothing has)."""
+    return db.execute(select(func.max(archives.c.range_to))).scalar()
+
+
+def opening_as_of(archived: datetime) -> datetime:
+    """When the snapshot carrying the ledger archived before ``archived`` is taken."""
+    # Just before the horizon: entries at the horizon itself stay in the table
+    return archived - timedelta(microseconds=1)
+
+
+def balance_as_of(db: Session, customer_id: str, as_of: Optional[datetime] = None) -> Optional[dict]:
+    """The customer's ledger balance at ``as_of`` (default now), or None if there is no such customer."""
+    snap, snap_join, balance, _ = ledger_columns(as_of)
+    row = db.execute(
+        select(balance.label("balance"), snap.c.as_of.label("snapshot_as_of"))
+        .select_from(customers.outerjoin(snap, snap_join))
+        .where(customers.c.id == customer_id)
+    ).first()
+    if row is None:
+        return None
+    return {
+        "customer_id": customer_id,
+        "as_of": as_of or datetime.utcnow(),
+        "balance": int(row.balance),
+        "snapshot_as_of": row.snapshot_as_of,
+    }
+
+
+def running_balances(rows: List[dict], new_balances: dict) -> None:
+    """Fill ``balance_after`` on ``rows`` (all created together) given each customer's final balance.
+
+    Rows sharing a ``created_at`` are ordered by id, so walk each customer's
+    rows in that order backwards from the balance the UPDATE returned.
+    """
+    for row in sorted(rows, key=lambda r: r["id"], reverse=True):
+        row["balance_after"] = new_balances[row["customer_id"]]
+        new_balances[row["customer_id"]] -= row["amount"]
+
+
+# ─── Batch jobs ─────────────────────────────────────────
+
+def id_ranges(parts: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Split the uuid space into ``parts`` contiguous ``[low, high)`` ranges.
+
+    Bounds are padded with ``f`` so they never consist of digits only: SQLite
+    gives the UUID column numeric affinity and would compare such a bound as a number.
+    """
+    bounds = [f"{k * (1 << 32) // parts:08x}-ffff-ffff-ffff-ffffffffffff" for k in range(1, parts)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def customer_chunks(
+    db: Session,
+    low: Optional[str],
+    high: Optional[str],
+    chunk_size: int,
+    after: Optional[str] = None,
+    where=None,
+) -> Iterator[Tuple[str, str]]:
+    """Yield ``(first_id, last_id)`` of consecutive chunks of customers in ``[low, high)``.
+
+    Starts after customer ``after`` if given; ``where`` restricts which customers count.
+    """
+    while True:
+        q = select(customers.c.id).order_by(customers.c.id).limit(chunk_size)
+        if where is not None:
+            q = q.where(where)
+        if low is not None:
+            q = q.where(customers.c.id >= literal(low, customers.c.id.type))
+        if high is not None:
+            q = q.where(customers.c.id < literal(high, customers.c.id.type))
+        if after is not None:
+            q = q.where(customers.c.id > literal(after, customers.c.id.type))
+        ids = db.execute(q).scalars().all()
+        if not ids:
+            return
+        yield ids[0], ids[-1]
+        after = ids[-1]
+
+
+def in_chunk(first: str, last: str, column=customers.c.id):
+    return column.between(literal(first, customers.c.id.type), literal(last, customers.c.id.type))
+
+
+def _run_partitioned(task: Callable, workers: int, chunk_size: int, session_factory) -> None:
+    def run(low, high):
+        db = session_factory()
+        try:
+            for first, last in customer_chunks(db, low, high, chunk_size):
+                task(db, first, last)
+                db.commit()
+        finally:
+            db.close()
+
+    # Several ranges per worker so one dense range does not leave the others idle
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(run, low, high) for low, high in id_ranges(workers * 4)]:
+            future.result()
+
+
+def verify_balances(
+    workers: int = DEFAULT_WORKERS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    on_drift: Optional[Callable[[dict], None]] = None,
+    session_factory=SessionLocal,
+) -> dict:
+    """Compare every customer's ``total_points`` with its ledger; ``on_drift`` is called as drift is found."""
+    snap, snap_join, balance, _ = ledger_columns()
+    last_balance_after = (
+        select(transactions.c.balance_after)
+        .where(transactions.c.customer_id == customers.c.id)
+        .order_by(transactions.c.created_at.desc(), transactions.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    report = {"customers": 0, "drifted": 0, "total_drift": 0, "drifts": []}
+    lock = threading.Lock()
+
+    def check(db: Session, first: str, last: str) -> None:
+        rows = db.execute(
+            select(
+                customers.c.id, customers.c.total_points,
+                balance.label("ledger_balance"), last_balance_after.label("last_balance_after"),
+            )
+            .select_from(customers.outerjoin(snap, snap_join))
+            .where(in_chunk(first, last))
+        ).all()
+        drifts = [
+            {
+                "customer_id": row.id,
+                "total_points": row.total_points,
+                "ledger_balance": int(row.ledger_balance),
+                "last_balance_after": row.last_balance_after,
+                "drift": row.total_points - int(row.ledger_balance),
+            }
+            for row in rows
+            if row.total_points != row.ledger_balance
+            or (row.last_balance_after is not None and row.last_balance_after != row.total_points)
+        ]
+        with lock:
+            report["customers"] += len(rows)
+            report["drifted"] += len(drifts)
+            for drift in drifts:
+                report["total_drift"] += drift["drift"]
+                if len(report["drifts"]) < MAX_REPORTED_DRIFTS:
+                    report["drifts"].append(drift)
+                if on_drift is not None:
+                    on_drift(drift)
+
+    _run_partitioned(check, workers, chunk_size, session_factory)
+    return report
+
+
+def snapshot_balances(
+    as_of: Optional[datetime] = None,
+    workers: int = DEFAULT_WORKERS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    session_factory=SessionLocal,
+) -> dict:
+    """Write a snapshot at ``as_of`` for every customer with ledger entries since their last one."""
+    as_of = as_of or datetime.utcnow() - timedelta(seconds=LEDGER_SNAPSHOT_LAG_SECONDS)
+    snap, snap_join, balance, entries = ledger_columns(as_of)
+    written = 0
+    lock = threading.Lock()
+
+    def take(db: Session, first: str, last: str) -> None:
+        nonlocal written
+        source = (
+            select(customers.c.id, literal(as_of, snapshots.c.as_of.type), balance)
+            .select_from(customers.outerjoin(snap, snap_join))
+            .where(in_chunk(first, last), entries > 0)
+        )
+        result = db.execute(insert(snapshots).from_select(["customer_id", "as_of", "balance"], source))
+        with lock:
+            written += result.rowcount
+
+    _run_partitioned(take, workers, chunk_size, session_factory)
+    return {"as_of": as_of, "snapshots": written}
+
+
+def backfill_balance_after(
+    workers: int = DEFAULT_WORKERS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    session_factory=SessionLocal,
+) -> dict:
+    """Fill ``balance_after`` on entries predating the ledger with the running sum of amounts."""
+    filled = 0
+    lock = threading.Lock()
+
+    def fill(db: Session, first: str, last: str) -> None:
+        nonlocal filled
+        running = (
+            select(
+                transactions.c.id,
+                func.sum(transactions.c.amount).over(
+                    partition_by=transactions.c.customer_id,
+                    order_by=(transactions.c.created_at, transactions.c.id),
+                ).label("running"),
+            )
+            .where(transactions.c.customer_id.in_(select(customers.c.id).where(in_chunk(first, last))))
+            .subquery()
+        )
+        result = db.execute(
+            update(transactions)
+            .where(transactions.c.id == running.c.id, transactions.c.balance_after.is_(None))
+            .values(balance_after=running.c.running)
+        )
+        with lock:
+            filled += result.rowcount
+
+    _run_partitioned(fill, workers, chunk_size, session_factory)
+    return {"filled": filled}
@@ -1,18 +1,41 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from .database import engine, Base
-from .routers import auth, customers, gifts, redemptions, dashboard
+from .database import engine, async_engine, warm_async_pool, warm_pool, DATABASE_ASYNC
+from . import idempotency, schema
+from .replicas import PRIMARY_PIN_HEADER, ReadYourWritesMiddleware, replica_pool
+from .pagination import NEXT_CURSOR_HEADER
+from .pool_metrics import RouteContextMiddleware
+from .profiling import RequestMetricsMiddleware
+from .routers import admin, audit, customer_import, exports, metrics, points
+
+if DATABASE_ASYNC:
+    from .routers.aio import auth, customers, gifts, redemptions, dashboard
+else:
+    from .routers import auth, customers, gifts, redemptions, dashboard
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing above touches the database, so the app can be imported once in the
+    # gunicorn master (preload_app) and every worker connects only after fork.
+    if schema.DATABASE_AUTO_MIGRATE:
+        schema.migrate()
+    warm_pool(engine)
+    if DATABASE_ASYNC:
+        await warm_async_pool(async_engine)
+    yield
 
-# Create tables (used in dev; in production use Alembic)
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="LoyaltyHub API",
     description="Internal Staff Loyalty Management System",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 import os
@@ -25,13 +48,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, PRIMARY_PIN_HEADER],
 )
 
+app.add_exception_handler(idempotency.Replay, idempotency.replay_response)
+
+if replica_pool.replicas:
+    app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(RouteContextMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+
 app.include_router(auth.router)
 app.include_router(customers.router)
 app.include_router(gifts.router)
 app.include_router(redemptions.router)
 app.include_router(dashboard.router)
+app.include_router(points.router)
+app.include_router(customer_import.router)
+app.include_router(admin.router)
+app.include_router(audit.router)
+app.include_router(metrics.router)
+app.include_router(exports.router)
 
 
 @app.get("/health")
@@ -1,9 +1,10 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, Enum
+from sqlalchemy import BigInteger, Column, Date, String, Integer, Text, DateTime, ForeignKey, Enum, Index, event, func, inspect
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from .database import Base
+from .phones import phone_key
 
 
 def new_uuid():
@@ -17,6 +18,7 @@ class Staff(Base):
     username      = Column(String(100), unique=True, nullable=False, index=True)
     password_hash = Column(String(255), nullable=False)
     role          = Column(Enum("admin", "staff", name="staff_role"), default="staff")
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     created_at    = Column(DateTime, default=datetime.utcnow)
 
     transactions  = relationship("PointTransaction", back_populates="staff")
@@ -29,6 +31,8 @@ class Customer(Base):
     id            = Column(UUID(as_uuid=False), primary_key=True, default=new_uuid)
     full_name     = Column(String(200), nullable=False)
     phone_number  = Column(String(30), unique=True, nullable=False, index=True)
+    # phone_number in E.164, for lookups that ignore formatting; see app.phones
+    phone_key     = Column(String(16), unique=True, nullable=True, index=True)
     email         = Column(String(200), nullable=True)
     total_points  = Column(Integer, default=0, nullable=False)
     created_at    = Column(DateTime, default=datetime.utcnow)
@@ -36,6 +40,40 @@ class Customer(Base):
     transactions  = relationship("PointTransaction", back_populates="customer", cascade="all, delete-orphan")
     redemptions   = relationship("Redemption", back_populates="customer", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination order for GET /customers
+        Index("ix_customers_created_at_id", "created_at", "id"),
+        # Substring search on Postgres (pg_trgm)
+        Index(
+            "ix_customers_full_name_trgm", "full_name",
+            postgresql_using="gin", postgresql_ops={"full_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_customers_phone_number_trgm", "phone_number",
+            postgresql_using="gin", postgresql_ops={"phone_number": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        # Normalized prefix search fallback elsewhere (SQLite in tests)
+        Index("ix_customers_full_name_lower", func.lower(full_name)).ddl_if(dialect="sqlite"),
+    )
+
+
+@event.listens_for(Customer, "before_insert")
+def _set_phone_key(mapper, connection, target):
+    target.phone_key = phone_key(target.phone_number)
+
+
+@event.listens_for(Customer, "before_update")
+def _update_phone_key(mapper, connection, target):
+    # Only on a new number: a balance update must not trip over an unbackfilled key
+    if inspect(target).attrs.phone_number.history.has_changes():
+        target.phone_key = phone_key(target.phone_number)
+
+
+@event.listens_for(Customer.__table__, "before_create")
+def _create_trgm_extension(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
 
 class PointTransaction(Base):
     __tablename__ = "point_transactions"
@@ -43,14 +81,85 @@ class PointTransaction(Base):
     id          = Column(UUID(as_uuid=False), primary_key=True, default=new_uuid)
     customer_id = Column(UUID(as_uuid=False), ForeignKey("customers.id", ondelete="CASCADE"), nullable=False)
     staff_id    = Column(UUID(as_uuid=False), ForeignKey("staff.id"), nullable=False)
-    type        = Column(Enum("earn", "redeem", "manual_adjust", name="transaction_type"), nullable=False)
+    type        = Column(Enum("earn", "redeem", "manual_adjust", "expire", name="transaction_type"), nullable=False)
     amount      = Column(Integer, nullable=False)
     description = Column(Text, nullable=False)
+    # Caller-supplied id (e.g. POS receipt line) making bulk uploads idempotent
+    external_ref = Column(String(100), unique=True, nullable=True)
+    # Customer.total_points right after this entry (NULL on rows predating the ledger)
+    balance_after = Column(Integer, nullable=True)
     created_at  = Column(DateTime, default=datetime.utcnow)
 
     customer    = relationship("Customer", back_populates="transactions")
     staff       = relationship("Staff", back_populates="transactions")
 
+    __table_args__ = (
+        # Per-customer history, newest first (GET /customers/{id}/transactions)
+        Index("ix_point_transactions_customer_created", customer_id, created_at.desc(), id.desc()),
+        # Incremental rollups read only the entries after their watermark
+        Index("ix_point_transactions_created_at", created_at),
+        # Staff activity and audit search (GET /staff/{id}/activity, /admin/audit)
+        Index("ix_point_transactions_staff_created", staff_id, created_at.desc(), id.desc()),
+    )
+
+
+@event.listens_for(PointTransaction, "before_update")
+def _ledger_is_append_only(mapper, connection, target):
+    raise ValueError("Point transactions are append-only; record a correcting entry instead")
+
+
+class BalanceSnapshot(Base):
+    """A customer's ledger balance as of ``as_of``; see ``app.ledger``."""
+    __tablename__ = "balance_snapshots"
+
+    customer_id = Column(UUID(as_uuid=False), ForeignKey("customers.id", ondelete="CASCADE"), primary_key=True)
+    as_of       = Column(DateTime, primary_key=True)
+    balance     = Column(Integer, nullable=False)
+
+
+class PointExpiryRun(Base):
+    """Watermark of one expiry pass over one customer id range; see ``app.expiry``."""
+    __tablename__ = "point_expiry_runs"
+
+    cutoff           = Column(DateTime, primary_key=True)
+    part             = Column(Integer, primary_key=True)
+    parts            = Column(Integer, nullable=False)
+    last_customer_id = Column(UUID(as_uuid=False), nullable=True)
+    customers        = Column(Integer, default=0, nullable=False)
+    points           = Column(BigInteger, default=0, nullable=False)
+    finished_at      = Column(DateTime, nullable=True)
+
+
+class PointTransactionArchive(Base):
+    """One month of ledger entries detached and dumped to a file; see ``app.partitions``."""
+    __tablename__ = "point_transaction_archives"
+
+    partition   = Column(String(63), primary_key=True)
+    range_from  = Column(DateTime, nullable=False)
+    range_to    = Column(DateTime, nullable=False)
+    rows        = Column(BigInteger, nullable=False)
+    # The month's earned points, still counted in the dashboard's total_points_issued
+    points_issued = Column(BigInteger, default=0, server_default="0", nullable=False)
+    path        = Column(Text, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class IdempotencyKey(Base):
+    """The stored response of a point-mutating request, replayed to its retries; see ``app.idempotency``."""
+    __tablename__ = "idempotency_keys"
+
+    staff_id     = Column(UUID(as_uuid=False), primary_key=True)
+    key          = Column(String(100), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code  = Column(Integer, nullable=False)
+    response     = Column(Text, nullable=False)
+    created_at   = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # TTL purge
+        Index("ix_idempotency_keys_created_at", created_at),
+    )
+
 
 class Gift(Base):
     __tablename__ = "gifts"
@@ -78,3 +187,87 @@ class Redemption(Base):
     customer    = relationship("Customer", back_populates="redemptions")
     gift        = relationship("Gift", back_populates="redemptions")
     staff       = relationship("Staff", back_populates="redemptions")
+
+    __table_args__ = (
+        Index("ix_redemptions_customer_created", customer_id, created_at.desc(), id.desc()),
+        Index("ix_redemptions_gift_created", gift_id, created_at.desc(), id.desc()),
+        Index("ix_redemptions_staff_created", staff_id, created_at.desc(), id.desc()),
+        # Redemption log order (GET /redemptions) and incremental rollups
+        Index("ix_redemptions_created_at_id", created_at, id),
+    )
+
+
+class DashboardCounter(Base):
+    """Running dashboard totals, spread over a few shard rows to avoid a hot row.
+
+    The dashboard reads the sum of all shards; see ``app.stats``.
+    """
+    __tablename__ = "dashboard_counters"
+
+    shard               = Column(Integer, primary_key=True, autoincrement=False)
+    total_customers     = Column(BigInteger, default=0, nullable=False)
+    total_points_issued = Column(BigInteger, default=0, nullable=False)
+    total_redemptions   = Column(BigInteger, default=0, nullable=False)
+    active_gifts        = Column(BigInteger, default=0, nullable=False)
+
+
+class CacheVersion(Base):
+    """Shared version counters that tell every worker when an in-process cache is stale.
+
+    Each bump increments one random shard, so the sum over a name's shards only
+    ever grows and writers do not queue on a single row; see ``app.catalog``.
+    """
+    __tablename__ = "cache_versions"
+
+    name    = Column(String(50), primary_key=True)
+    shard   = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(BigInteger, default=0, nullable=False)
+
+
+
+# ─── Dashboard rollups (see ``app.rollups``) ────────────
+# Derived data without foreign keys: refreshing them never locks the rows they count.
+
+class PointsDailyRollup(Base):
+    """Ledger entries per UTC day, staff member and transaction type."""
+    __tablename__ = "points_daily_rollups"
+
+    day      = Column(Date, primary_key=True)
+    staff_id = Column(UUID(as_uuid=False), primary_key=True)
+    type     = Column(String(20), primary_key=True)
+    entries  = Column(BigInteger, default=0, nullable=False)
+    points   = Column(BigInteger, default=0, nullable=False)
+
+
+class RedemptionDailyRollup(Base):
+    """Redemptions per UTC day and gift."""
+    __tablename__ = "redemption_daily_rollups"
+
+    day         = Column(Date, primary_key=True)
+    gift_id     = Column(UUID(as_uuid=False), primary_key=True)
+    redemptions = Column(BigInteger, default=0, nullable=False)
+    points_used = Column(BigInteger, default=0, nullable=False)
+
+
+class CustomerDailyRollup(Base):
+    """Points each customer earned and redeemed per UTC day (leaderboards)."""
+    __tablename__ = "customer_daily_rollups"
+
+    day         = Column(Date, primary_key=True)
+    customer_id = Column(UUID(as_uuid=False), primary_key=True)
+    earned      = Column(BigInteger, default=0, nullable=False)
+    redeemed    = Column(BigInteger, default=0, nullable=False)
+
+    __table_args__ = (
+        # Dropping a deleted customer's rows
+        Index("ix_customer_daily_rollups_customer", customer_id),
+    )
+
+
+class RollupWatermark(Base):
+    """Rows created before ``through`` have been folded into the rollups."""
+    __tablename__ = "rollup_watermarks"
+
+    name       = Column(String(50), primary_key=True)
+    through    = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=True)
@@ -0,0 +1,64 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+
+
+def keyset_criterion(created_col, id_col, cursor: Optional[str]):
+    """Filter selecting rows strictly after ``cursor`` in newest-first order, or None."""
+    if not cursor:
+        return None
+    created_at, row_id = decode_cursor(cursor)
+    # Bind with the columns' types so e.g. Postgres compares uuid to uuid
+    bound = tuple_(created_at, row_id, types=[created_col.type, id_col.type])
+    return tuple_(created_col, id_col) < bound
+
+
+def apply_keyset(query, created_col, id_col, cursor: Optional[str], limit: int):
+    """Restrict ``query`` (ORM Query or Select) to the page after ``cursor``.
+
+    Rows are ordered by ``(created_at, id)`` descending so that the query is
+    served by a composite index and stays O(limit) however deep the client
+    pages. One extra row is fetched to detect whether another page exists.
+    """
+    criterion = keyset_criterion(created_col, id_col, cursor)
+    if criterion is not None:
+        query = query.filter(criterion)
+    return query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def split_page(rows: list, limit: int):
+    """Trim the look-ahead row from ``rows`` and build the next cursor."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+def keyset_page(query, created_col, id_col, cursor: Optional[str], limit: int):
+    """Return one page ordered newest first plus the cursor for the next page."""
+    rows = apply_keyset(query, created_col, id_col, cursor, limit).all()
+    return split_page(rows, limit)
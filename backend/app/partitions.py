@@ -0,0 +1,282 @@
+"""Monthly range partitions of ``point_transactions`` on ``created_at`` (PostgreSQL only).
+
+Opt-in with ``POINT_TRANSACTIONS_PARTITIONED``. The table keeps its name, its
+columns and its indexes, so the ORM model and every query are unchanged;
+PostgreSQL routes inserts to the month's partition and prunes the partitions
+a ``created_at`` filter rules out (rollup folds, exports, audit date ranges).
+Per-customer reads without a date filter merge the partitions' own
+``(customer_id, created_at, id)`` indexes.
+
+A partitioned table's unique keys must include the partition key, so the
+primary key becomes ``(id, created_at)`` and the global uniqueness of
+``external_ref`` moves to ``point_transaction_refs``: a row trigger claims
+each ref there, and a duplicate still fails the insert with an
+IntegrityError. Refs of archived entries stay claimed.
+
+Partitions are named ``point_transactions_pYYYYMM``. ``ensure_partitions``
+(``schema.migrate`` on deploy, ``partition_transactions.py`` from cron) creates
+this month's and the next ``PARTITION_MONTHS_AHEAD`` months'; rows for a month
+without a partition land in ``point_transactions_default`` and are moved
+into their month when it is created.
+
+``archive`` detaches the months older than a horizon and dumps each to a
+gzipped CSV file. Balances are untouched: ``total_points`` never depended on
+old entries, and a balance snapshot taken at the horizon first carries the
+archived ledger forward for ``app.ledger`` and ``app.expiry``. Rollups keep
+the archived days, but ``refresh_rollups.py --rebuild`` would only see what
+is left. Each archive record keeps the month's earned points, which
+``stats.compute_stats`` adds back, so reconciling the dashboard counters does
+not lose them. Entries are never backdated, so nothing lands behind a snapshot.
+"""
+import csv
+import gzip
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import Column, Index, insert, MetaData, PrimaryKeyConstraint, String, Table, text, UniqueConstraint
+from sqlalchemy.orm import Session
+
+from . import expiry, ledger, models
+from .database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+POINT_TRANSACTIONS_PARTITIONED = os.getenv("POINT_TRANSACTIONS_PARTITIONED", "false").lower() in ("1", "true", "yes")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+POINT_TRANSACTIONS_RETENTION_MONTHS = int(os.getenv("POINT_TRANSACTIONS_RETENTION_MONTHS", 24))
+POINT_TRANSACTIONS_ARCHIVE_DIR = os.getenv("POINT_TRANSACTIONS_ARCHIVE_DIR", "archive")
+
+transactions = models.PointTransaction.__table__
+archives = models.PointTransactionArchive.__table__
+
+PARENT = transactions.name
+DEFAULT = f"{PARENT}_default"
+LEGACY = f"{PARENT}_unpartitioned"
+PARTITION_NAME = re.compile(rf"^{PARENT}_p(\d{{4}})(\d{{2}})$")
+
+
+def enabled() -> bool:
+    return POINT_TRANSACTIONS_PARTITIONED and engine.dialect.name == "postgresql"
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    year, index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return datetime(year, index + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def partitioned_tables() -> Tuple[Table, Table]:
+    """The partitioned ``point_transactions`` (model columns and indexes, keyed on ``(id, created_at)``) and its refs table."""
+    metadata = MetaData()
+    # Only there to resolve the foreign keys; never created from here
+    models.Customer.__table__.to_metadata(metadata)
+    models.Staff.__table__.to_metadata(metadata)
+    table = transactions.to_metadata(metadata)
+    for constraint in [c for c in table.constraints if isinstance(c, UniqueConstraint)]:
+        table.constraints.discard(constraint)
+    table.c.created_at.primary_key = True
+    table.c.created_at.nullable = False
+    table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.created_at))
+    # Bulk uploads look refs up before inserting
+    Index("ix_point_transactions_external_ref", table.c.external_ref)
+    table.dialect_options["postgresql"]["partition_by"] = "RANGE (created_at)"
+    refs = Table(
+        "point_transaction_refs", metadata,
+        Column("external_ref", String(100), primary_key=True),
+    )
+    return table, refs
+
+
+CLAIM_REF = f"""
+CREATE OR REPLACE FUNCTION point_transactions_claim_ref() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO point_transaction_refs (external_ref) VALUES (NEW.external_ref);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER point_transactions_claim_ref AFTER INSERT ON {PARENT}
+    FOR EACH ROW WHEN (NEW.external_ref IS NOT NULL) EXECUTE FUNCTION point_transactions_claim_ref();
+"""
+
+
+def table_kind(db: Session) -> Optional[str]:
+    """``"partitioned"``, ``"plain"`` or None when ``point_transactions`` does not exist yet."""
+    kind = db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": PARENT}).scalar()
+    return None if kind is None else "partitioned" if kind == "p" else "plain"
+
+
+def partitions(db: Session) -> List[Tuple[str, datetime, datetime]]:
+    """``(name, from, to)`` of the monthly partitions, oldest first."""
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name)"
+    ), {"name": PARENT}).scalars()
+    months = sorted(
+        datetime(int(m.group(1)), int(m.group(2)), 1) for m in map(PARTITION_NAME.match, names) if m
+    )
+    return [(partition_name(month), month, add_months(month, 1)) for month in months]
+
+
+def _create_partition(db: Session, month: datetime) -> str:
+    name, low, high = partition_name(month), month, add_months(month, 1)
+    bounds = f"FROM ('{low:%Y-%m-%d}') TO ('{high:%Y-%m-%d}')"
+    in_range = f"created_at >= '{low:%Y-%m-%d}' AND created_at < '{high:%Y-%m-%d}'"
+    if db.execute(text(f"SELECT 1 FROM {DEFAULT} WHERE {in_range} LIMIT 1")).first() is None:
+        db.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES {bounds}"))
+        return name
+    # The month's rows are in the default partition, which must not overlap the new one: move them first
+    db.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT} WHERE {in_range} RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+    ))
+    db.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    return name
+
+
+def ensure_partitions(db: Session, months_ahead: int = PARTITION_MONTHS_AHEAD, now: Optional[datetime] = None) -> List[str]:
+    """Create the missing partitions from this month through ``months_ahead`` months on, and for
+    every month with rows in the default partition; commit and return their names."""
+    this_month = month_start(now or datetime.utcnow())
+    months = {add_months(this_month, n) for n in range(months_ahead + 1)}
+    months |= {
+        month_start(moment)
+        for moment in db.execute(text(f"SELECT DISTINCT date_trunc('month', created_at) FROM {DEFAULT}")).scalars()
+    }
+    existing = {name for name, _, _ in partitions(db)}
+    created = [_create_partition(db, month) for month in sorted(months) if partition_name(month) not in existing]
+    db.commit()
+    return created
+
+
+def _create_table(db: Session, first_month: datetime, months_ahead: int) -> None:
+    table, refs = partitioned_tables()
+    bind = db.connection()
+    table.create(bind, checkfirst=True)
+    refs.create(bind, checkfirst=True)
+    db.execute(text(f"CREATE TABLE {DEFAULT} PARTITION OF {PARENT} DEFAULT"))
+    month, last = first_month, add_months(month_start(datetime.utcnow()), months_ahead)
+    while month <= last:
+        _create_partition(db, month)
+        month = add_months(month, 1)
+
+
+def setup(db: Session, months_ahead: int = PARTITION_MONTHS_AHEAD) -> None:
+    """Create the table partitioned if it does not exist yet, then the coming months' partitions."""
+    kind = table_kind(db)
+    if kind == "plain":
+        logger.warning("%s is not partitioned; convert it with partition_transactions.py --enable", PARENT)
+        return
+    if kind is None:
+        _create_table(db, month_start(datetime.utcnow()), months_ahead)
+        db.execute(text(CLAIM_REF))
+    ensure_partitions(db, months_ahead)
+
+
+def convert(db: Session, months_ahead: int = PARTITION_MONTHS_AHEAD) -> int:
+    """Rebuild an existing plain ``point_transactions`` as a partitioned table in one transaction; return the rows moved.
+
+    Writes to the ledger wait for the whole copy, so run it in a quiet window.
+    """
+    if table_kind(db) != "plain":
+        raise RuntimeError(f"{PARENT} is missing or already partitioned")
+    db.execute(text(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE"))
+    undated = db.execute(text(f"SELECT count(*) FROM {PARENT} WHERE created_at IS NULL")).scalar()
+    if undated:
+        raise RuntimeError(f"{undated} ledger entries have no created_at; they cannot be placed in a partition")
+    first = db.execute(text(f"SELECT min(created_at) FROM {PARENT}")).scalar()
+
+    db.execute(text(f"ALTER TABLE {PARENT} RENAME TO {LEGACY}"))
+    # The keys and indexes keep their names through the rename; free them for the new table
+    for (name,) in db.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:name) AND contype IN ('p', 'u')"
+    ), {"name": LEGACY}).all():
+        db.execute(text(f'ALTER TABLE {LEGACY} DROP CONSTRAINT "{name}"'))
+    for (name,) in db.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :name"), {"name": LEGACY}).all():
+        db.execute(text(f'DROP INDEX "{name}"'))
+
+    _create_table(db, month_start(first or datetime.utcnow()), months_ahead)
+    columns = ", ".join(c.name for c in transactions.c)
+    moved = db.execute(text(f"INSERT INTO {PARENT} ({columns}) SELECT {columns} FROM {LEGACY}")).rowcount
+    db.execute(text(
+        f"INSERT INTO point_transaction_refs (external_ref) SELECT external_ref FROM {LEGACY} WHERE external_ref IS NOT NULL"
+    ))
+    db.execute(text(CLAIM_REF))
+    db.execute(text(f"DROP TABLE {LEGACY}"))
+    db.commit()
+    return moved
+
+
+def _dump(db: Session, name: str, path: str) -> int:
+    """Write the partition to ``path`` as gzipped CSV with a header; return the records read back from it."""
+    cursor = db.connection().connection.cursor()
+    try:
+        with gzip.open(path, "wb") as out:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", out)
+    finally:
+        cursor.close()
+    with gzip.open(path, "rt", newline="") as dumped:
+        return sum(1 for _ in csv.reader(dumped)) - 1
+
+
+def archive(
+    before: datetime,
+    out_dir: str = POINT_TRANSACTIONS_ARCHIVE_DIR,
+    keep_tables: bool = False,
+    on_archive: Optional[Callable[[dict], None]] = None,
+    session_factory=SessionLocal,
+) -> dict:
+    """Detach every monthly partition ending on or before ``before`` and dump it to ``out_dir``, oldest first.
+
+    Each month is snapshotted, then dumped, detached and dropped (only
+    detached with ``keep_tables``) in one transaction that blocks its writes.
+    ``before`` may not be later than the expiry cutoff, so that no archived
+    point can still expire.
+    """
+    cutoff = expiry.expiry_cutoff()
+    if before > cutoff:
+        raise ValueError(f"Cannot archive past the expiry cutoff ({cutoff:%Y-%m-%d}): those points may still expire")
+    os.makedirs(out_dir, exist_ok=True)
+    report = {"before": before, "partitions": 0, "rows": 0}
+    with session_factory() as db:
+        if table_kind(db) != "partitioned":
+            raise RuntimeError(f"{PARENT} is not partitioned")
+        stray = db.execute(
+            text(f"SELECT count(*) FROM {DEFAULT} WHERE created_at < :before"), {"before": before}
+        ).scalar()
+        if stray:
+            raise RuntimeError(f"{stray} entries before {before:%Y-%m-%d} are in {DEFAULT}; run --ensure first")
+        due = [p for p in partitions(db) if p[2] <= before]
+
+    for name, low, high in due:
+        ledger.snapshot_balances(ledger.opening_as_of(high), session_factory=session_factory)
+        path = os.path.join(out_dir, f"{name}.csv.gz")
+        with session_factory() as db:
+            db.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+            rows = db.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+            issued = db.execute(text(f"SELECT coalesce(sum(amount), 0) FROM {name} WHERE type = 'earn'")).scalar()
+            written = _dump(db, name, path + ".partial")
+            if written != rows:
+                raise RuntimeError(f"{name}: dumped {written} of {rows} rows")
+            os.replace(path + ".partial", path)
+            db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            if not keep_tables:
+                db.execute(text(f"DROP TABLE {name}"))
+            record = {"partition": name, "range_from": low, "range_to": high, "rows": rows,
+                      "points_issued": issued, "path": path}
+            db.execute(insert(archives), record)
+            db.commit()
+        report["partitions"] += 1
+        report["rows"] += rows
+        if on_archive is not None:
+            on_archive(record)
+    return report
@@ -0,0 +1,46 @@
+"""Normalized phone keys for looking customers up at the counter.
+
+``customers.phone_key`` holds the phone number in E.164 (``+84901234567``), so
+"+84 90 123 4567", "0901234567" and "84901234567" all find the same customer.
+Numbers without a ``+`` or ``00`` prefix are national: a leading trunk ``0`` is
+replaced by ``PHONE_DEFAULT_COUNTRY_CODE``, which is also prepended to bare
+digits that do not already start with it. Anything else (letters, too few or
+too many digits) has no key.
+
+The key is set by a mapper hook on every ORM insert and update of a
+``Customer``; Core writes (the customer import) set it themselves, and
+``backfill_phone_keys.py`` fills it on older rows. ``phone_cache`` maps keys
+to customer ids for ``GET /customers/by-phone/{phone}``, per worker.
+"""
+import os
+import re
+from typing import Optional
+
+from .cache import TTLCache
+
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "84")
+PHONE_CACHE_MAX_ENTRIES = int(os.getenv("PHONE_CACHE_MAX_ENTRIES", 10000))
+PHONE_CACHE_TTL_SECONDS = float(os.getenv("PHONE_CACHE_TTL_SECONDS", 300))
+
+PHONE_SEPARATORS = re.compile(r"[\s\-().]")
+E164_DIGITS = re.compile(r"[1-9][0-9]{6,14}")
+
+# Keyed by phone_key. Hits are checked against the customer row they lead to,
+# so an entry another worker made stale only costs a second query.
+phone_cache = TTLCache(maxsize=PHONE_CACHE_MAX_ENTRIES, ttl=PHONE_CACHE_TTL_SECONDS)
+
+
+def phone_key(phone_number: Optional[str]) -> Optional[str]:
+    """``phone_number`` in E.164, or None if it does not look like a phone number."""
+    digits = PHONE_SEPARATORS.sub("", phone_number or "")
+    if digits.startswith("+"):
+        digits = digits[1:]
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = PHONE_DEFAULT_COUNTRY_CODE + digits[1:]
+    elif not digits.startswith(PHONE_DEFAULT_COUNTRY_CODE):
+        digits = PHONE_DEFAULT_COUNTRY_CODE + digits
+    if not E164_DIGITS.fullmatch(digits):
+        return None
+    return "+" + digits
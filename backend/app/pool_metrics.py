@@ -0,0 +1,166 @@
+"""Connection pool instrumentation.
+
+Pools built from the classes below time how long callers wait for a
+connection; ``instrument_engine`` adds checkout/checkin listeners that track
+how long each request route holds a connection. ``RouteContextMiddleware``
+makes the current route visible to those listeners, including from the
+threadpool that runs sync handlers.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from .metrics import Histogram, render_histogram, render_metric
+
+_current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+
+_lock = threading.Lock()
+_pools: Dict[str, "PoolStats"] = {}
+
+
+class PoolStats:
+    def __init__(self, name: str, pool):
+        self.name = name
+        self.pool = pool
+        self.wait = Histogram()
+        self.timeouts = 0
+        self.checkouts = 0
+        self.route_hold: Dict[str, Histogram] = {}
+
+
+class _TimedCheckoutMixin:
+    """Records time spent waiting for a connection (queueing or connecting)."""
+
+    stats: Optional[PoolStats] = None
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.stats is not None:
+                self.stats.timeouts += 1
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.wait.observe(time.perf_counter() - t0)
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckoutMixin, NullPool):
+    pass
+
+
+def _current_route() -> str:
+    scope = _current_scope.get()
+    if scope is None:
+        return "<background>"
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", "<unknown>")
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Start collecting pool metrics for ``engine`` (a sync Engine)."""
+    pool = engine.pool
+    stats = PoolStats(name, pool)
+    if isinstance(pool, _TimedCheckoutMixin):
+        pool.stats = stats
+    with _lock:
+        _pools[name] = stats
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        stats.checkouts += 1
+        record.info["checked_out_at"] = time.perf_counter()
+        record.info["route"] = _current_route()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        started = record.info.pop("checked_out_at", None)
+        if started is None:
+            return
+        route = record.info.pop("route", "<unknown>")
+        with _lock:
+            hist = stats.route_hold.setdefault(route, Histogram())
+        hist.observe(time.perf_counter() - started)
+
+
+def _gauges(pool) -> dict:
+    if isinstance(pool, QueuePool):
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        }
+    return {}
+
+
+def snapshot() -> dict:
+    with _lock:
+        pools = list(_pools.values())
+    return {
+        s.name: {
+            "pool": type(s.pool).__name__,
+            **_gauges(s.pool),
+            "checkouts": s.checkouts,
+            "timeouts": s.timeouts,
+            "wait_seconds": s.wait.snapshot(),
+            "checkout_seconds_by_route": {route: h.snapshot() for route, h in sorted(s.route_hold.items())},
+        }
+        for s in pools
+    }
+
+
+def render_prometheus() -> List[str]:
+    with _lock:
+        pools = list(_pools.values())
+    lines: List[str] = []
+    for key, help_text in (
+        ("size", "Configured pool size"),
+        ("checked_out", "Connections currently checked out"),
+        ("checked_in", "Idle connections in the pool"),
+        ("overflow", "Connections open beyond pool_size"),
+    ):
+        samples = [({"pool": s.name}, g[key]) for s in pools for g in [_gauges(s.pool)] if key in g]
+        if samples:
+            lines += render_metric(f"db_pool_{key}", help_text, samples)
+    lines += render_metric("db_pool_checkouts_total", "Connection checkouts",
+                           [({"pool": s.name}, s.checkouts) for s in pools], kind="counter")
+    lines += render_metric("db_pool_timeouts_total", "Checkouts that hit pool_timeout",
+                           [({"pool": s.name}, s.timeouts) for s in pools], kind="counter")
+    lines += render_histogram("db_pool_wait_seconds", "Time spent waiting for a connection",
+                              [({"pool": s.name}, s.wait) for s in pools])
+    lines += render_histogram(
+        "db_pool_checkout_seconds", "Time a connection was held, by route",
+        [({"pool": s.name, "route": route}, h) for s in pools for route, h in sorted(s.route_hold.items())],
+    )
+    return lines
+
+
+class RouteContextMiddleware:
+    """Exposes the ASGI scope of the in-flight request to pool listeners."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
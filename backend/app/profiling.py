@@ -0,0 +1,258 @@
+"""Per-request performance instrumentation.
+
+``RequestMetricsMiddleware`` times every request and, through cursor events
+installed by ``instrument_queries``, counts the SQL statements it issued and
+the time spent in them. Per-route aggregates are rendered by ``/metrics``.
+
+Statements slower than ``SLOW_QUERY_MS`` are logged, and a request that runs
+the same normalized statement ``N_PLUS_ONE_THRESHOLD`` times or more is logged
+as a likely N+1.
+
+Setting ``PROFILE_ROUTE`` to a route template (e.g. ``/customers``) turns on a
+sampling profiler: while a request for that route is in flight, a background
+thread samples the stacks of threads running application code every
+``PROFILE_INTERVAL_MS`` and aggregates them in folded form
+(``frame;frame;frame count``), ready for flamegraph.pl or speedscope. Other
+requests running concurrently on the same worker may appear in the samples.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from .metrics import Histogram, render_histogram, render_metric
+
+logger = logging.getLogger("app.performance")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 10))
+PROFILE_ROUTE = os.getenv("PROFILE_ROUTE") or None
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 10))
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\?|%s")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse literals and bind parameters so equivalent queries compare equal."""
+    s = _STRING_LITERAL.sub("?", statement)
+    s = _PARAM.sub("?", s)
+    s = _NUMBER.sub("?", s)
+    s = _PARAM_LIST.sub("(...)", s)
+    return _WHITESPACE.sub(" ", s).strip()
+
+
+class RequestStats:
+    __slots__ = ("sql_count", "sql_seconds", "statements")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.statements: Counter = Counter()
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.requests = 0
+        self.errors = 0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.n_plus_one = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_lock = threading.Lock()
+_routes: Dict[Tuple[str, str], RouteStats] = {}
+slow_queries = 0
+
+
+def instrument_queries(engine) -> None:
+    """Attach SQL timing listeners to a sync Engine (or ``AsyncEngine.sync_engine``)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        global slow_queries
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _request_stats.get()
+        normalized = None
+        if stats is not None:
+            normalized = normalize_statement(statement)
+            stats.sql_count += 1
+            stats.sql_seconds += elapsed
+            stats.statements[normalized] += 1
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_queries += 1
+            logger.warning(
+                "Slow query (%.1f ms): %s", elapsed * 1000, normalized or normalize_statement(statement)
+            )
+
+
+class _Sampler:
+    def __init__(self, route: str, interval: float):
+        self.route = route
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._inflight: Dict[int, dict] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def enter(self, scope: dict) -> None:
+        with self._cond:
+            self._inflight[id(scope)] = scope
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="route-profiler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def exit(self, scope: dict) -> None:
+        with self._cond:
+            self._inflight.pop(id(scope), None)
+
+    def _profiled_request_running(self) -> bool:
+        # The route template is only known once routing has run, so check lazily
+        with self._cond:
+            while not self._inflight:
+                self._cond.wait()
+            return any(_route_of(scope) == self.route for scope in self._inflight.values())
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            if self._profiled_request_running():
+                self._sample(me)
+            time.sleep(self.interval)
+
+    def _sample(self, me: int) -> None:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            in_app = False
+            while frame is not None:
+                code = frame.f_code
+                in_app = in_app or code.co_filename.startswith(APP_DIR)
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if in_app:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self, reset: bool = False) -> str:
+        lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        if reset:
+            self.stacks.clear()
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+profiler: Optional[_Sampler] = _Sampler(PROFILE_ROUTE, PROFILE_INTERVAL_MS / 1000) if PROFILE_ROUTE else None
+
+
+def _route_of(scope: dict) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+class RequestMetricsMiddleware:
+    """Records latency and SQL usage for every HTTP request, keyed by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        if profiler is not None:
+            profiler.enter(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            if profiler is not None:
+                profiler.exit(scope)
+            self._record(scope, status_code, elapsed, stats)
+
+    @staticmethod
+    def _record(scope: dict, status_code: int, elapsed: float, stats: RequestStats) -> None:
+        route = _route_of(scope)
+        key = (scope.get("method", "GET"), route)
+        with _lock:
+            route_stats = _routes.setdefault(key, RouteStats())
+        route_stats.latency.observe(elapsed)
+        with _lock:
+            route_stats.requests += 1
+            route_stats.errors += status_code >= 500
+            route_stats.sql_count += stats.sql_count
+            route_stats.sql_seconds += stats.sql_seconds
+        repeated = [(stmt, n) for stmt, n in stats.statements.items() if n >= N_PLUS_ONE_THRESHOLD]
+        if repeated:
+            with _lock:
+                route_stats.n_plus_one += 1
+            for stmt, n in repeated:
+                logger.warning("Possible N+1 in %s %s: %d x %s", key[0], route, n, stmt)
+
+
+def summary() -> dict:
+    with _lock:
+        items = sorted(_routes.items())
+    return {
+        f"{method} {route}": {
+            "requests": s.requests,
+            "errors": s.errors,
+            "p50_seconds": s.latency.quantile(0.50),
+            "p95_seconds": s.latency.quantile(0.95),
+            "p99_seconds": s.latency.quantile(0.99),
+            "sql_statements_per_request": s.sql_count / s.requests if s.requests else 0,
+            "sql_seconds_per_request": s.sql_seconds / s.requests if s.requests else 0,
+            "n_plus_one_requests": s.n_plus_one,
+        }
+        for (method, route), s in items
+    }
+
+
+def render_prometheus() -> List[str]:
+    with _lock:
+        items = sorted(_routes.items())
+    labelled = [({"method": method, "route": route}, s) for (method, route), s in items]
+    lines = render_histogram("http_request_duration_seconds", "Request latency by route",
+                             [(labels, s.latency) for labels, s in labelled])
+    lines += render_metric("http_requests_total", "Requests by route",
+                           [(labels, s.requests) for labels, s in labelled], kind="counter")
+    lines += render_metric("http_request_errors_total", "5xx responses by route",
+                           [(labels, s.errors) for labels, s in labelled], kind="counter")
+    lines += render_metric("http_request_sql_statements_total", "SQL statements issued by route",
+                           [(labels, s.sql_count) for labels, s in labelled], kind="counter")
+    lines += render_metric("http_request_sql_seconds_total", "Time spent in SQL by route",
+                           [(labels, s.sql_seconds) for labels, s in labelled], kind="counter")
+    lines += render_metric("http_request_n_plus_one_total", "Requests flagged as likely N+1 by route",
+                           [(labels, s.n_plus_one) for labels, s in labelled], kind="counter")
+    lines += render_metric("db_slow_queries_total", f"Statements slower than {SLOW_QUERY_MS:g} ms",
+                           [({}, slow_queries)], kind="counter")
+    return lines
@@ -0,0 +1,101 @@
+"""Gift redemption built on conditional atomic updates.
+
+Instead of reading the customer and gift ``FOR UPDATE`` and checking them in
+Python, each row is changed by a single guarded UPDATE that only matches while
+the redemption is still valid (enough points, stock left, same price). No row
+is locked before it is written, and the hot gift row is touched last, so during
+a promotion concurrent redemptions of the same gift queue only for the stock
+decrement and the commit rather than for the whole request.
+
+Rows are always locked in the order customers -> gifts -> dashboard_counters
+-> cache_versions, the same order every other writer uses, so redemptions
+cannot deadlock with each other or with point and gift updates.
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from . import catalog, idempotency, models, schemas, stats
+
+customers = models.Customer.__table__
+gifts = models.Gift.__table__
+
+
+def _gift_unavailable(db: Session, gift_id: str) -> HTTPException:
+    gift = db.execute(select(gifts.c.stock).where(gifts.c.id == gift_id)).first()
+    if gift is None:
+        return HTTPException(404, "Gift not found")
+    if gift.stock <= 0:
+        return HTTPException(400, "Gift is out of stock")
+    return HTTPException(409, "Gift was changed, please retry")
+
+
+def redeem(
+    db: Session, customer_id: str, gift_id: str, staff_id: str, pending: Optional[idempotency.PendingKey] = None
+) -> schemas.RedemptionOut:
+    """Redeem one gift for a customer and commit; raise HTTPException if it cannot be done.
+
+    ``pending`` (from ``idempotency.begin``) is committed along with the redemption.
+    """
+    gift = db.execute(
+        select(gifts.c.name, gifts.c.points_required, gifts.c.stock).where(gifts.c.id == gift_id)
+    ).first()
+    if gift is None:
+        raise HTTPException(404, "Gift not found")
+    if gift.stock <= 0:
+        # Cheap unlocked pre-check; the conditional UPDATE below is authoritative
+        raise HTTPException(400, "Gift is out of stock")
+    cost = gift.points_required
+
+    debited = db.execute(
+        update(customers)
+        .where(customers.c.id == customer_id, customers.c.total_points >= cost)
+        .values(total_points=customers.c.total_points - cost)
+        .returning(customers.c.total_points)
+    ).first()
+    if debited is None:
+        db.rollback()
+        if db.execute(select(customers.c.id).where(customers.c.id == customer_id)).first() is None:
+            raise HTTPException(404, "Customer not found")
+        raise HTTPException(400, "Insufficient points for this gift")
+
+    now = datetime.utcnow()
+    redemption = {
+        "id": models.new_uuid(),
+        "customer_id": customer_id,
+        "gift_id": gift_id,
+        "staff_id": staff_id,
+        "points_used": cost,
+        "created_at": now,
+    }
+    db.execute(insert(models.Redemption.__table__), redemption)
+    db.execute(insert(models.PointTransaction.__table__), {
+        "id": models.new_uuid(),
+        "customer_id": customer_id,
+        "staff_id": staff_id,
+        "type": "redeem",
+        "amount": -cost,
+        "description": f"Redeemed: {gift.name}",
+        "balance_after": debited.total_points,
+        "created_at": now,
+    })
+
+    claimed = db.execute(
+        update(gifts)
+        .where(gifts.c.id == gift_id, gifts.c.stock > 0, gifts.c.points_required == cost)
+        .values(stock=gifts.c.stock - 1)
+        .returning(gifts.c.stock)
+    ).first()
+    if claimed is None:
+        db.rollback()
+        raise _gift_unavailable(db, gift_id)
+
+    # Core statements bypass the ORM flush hooks that keep these in sync
+    stats.apply_deltas(db, total_redemptions=1, active_gifts=-1 if claimed.stock == 0 else 0)
+    catalog.bump_version(db)
+    out = schemas.RedemptionOut(**redemption)
+    idempotency.commit(db, pending, 201, out)
+    return out
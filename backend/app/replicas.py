@@ -0,0 +1,264 @@
+"""Read-replica routing for read-heavy endpoints.
+
+With ``DATABASE_REPLICA_URLS`` set (comma-separated), endpoints that depend on
+``get_read_db`` / ``get_async_read_db`` instead of ``get_db`` read from the
+replicas in round-robin order. Everything else stays on the primary, and so
+does anything a read session would write: flushes, INSERT/UPDATE/DELETE and
+``FOR UPDATE`` selects are routed to the primary by ``RoutingSession``.
+
+A replica is health-checked as its connection is checked out (with
+``pool_pre_ping``). If that fails it is skipped for
+``DATABASE_REPLICA_RETRY_SECONDS`` and the request moves on to the next one,
+falling back to the primary when none are left.
+
+Read-your-writes: for ``READ_YOUR_WRITES_SECONDS`` after a successful
+POST/PUT/PATCH/DELETE, the same client reads from the primary. The client is
+recognised by its bearer token in this process and, across worker processes,
+by the pin's expiry echoed back in the ``X-Primary-Until`` request header (the
+cross-origin SPA, which sends no cookies) or in a short-lived cookie. An echoed
+expiry more than ``READ_YOUR_WRITES_SECONDS`` away cannot have been issued by
+us and is ignored, so a client cannot pin itself to the primary for good.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+from . import database
+from .pool_metrics import instrument_engine
+from .profiling import instrument_queries
+
+logger = logging.getLogger(__name__)
+
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+DATABASE_REPLICA_RETRY_SECONDS = float(os.getenv("DATABASE_REPLICA_RETRY_SECONDS", 10))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+PRIMARY_PIN_COOKIE = "primary_until"
+PRIMARY_PIN_HEADER = "X-Primary-Until"
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+MAX_PINS = 10000
+
+
+class Replica:
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        # The sync Engine a Session binds to (AsyncEngine.sync_engine for async replicas)
+        self.bind = getattr(engine, "sync_engine", engine)
+        self.down_until = 0.0
+        self.failures = 0
+        self.reads = 0
+
+
+class ReplicaPool:
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self.primary_fallbacks = 0
+
+    def candidates(self) -> List[Replica]:
+        """Healthy replicas, starting from the next one in round-robin order."""
+        if not self.replicas:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._next) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [r for r in ordered if r.down_until <= now]
+
+    def mark_down(self, replica: Replica, exc: Exception) -> None:
+        replica.down_until = time.monotonic() + DATABASE_REPLICA_RETRY_SECONDS
+        replica.failures += 1
+        logger.warning("Replica %s unavailable, retrying in %ss: %s",
+                       replica.name, DATABASE_REPLICA_RETRY_SECONDS, exc)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "replicas": {
+                r.name: {"healthy": r.down_until <= now, "reads": r.reads, "failures": r.failures}
+                for r in self.replicas
+            },
+            "primary_fallbacks": self.primary_fallbacks,
+        }
+
+
+def _replica_options(url: str, is_async: bool = False) -> dict:
+    # Always ping replicas on checkout: that is what takes a dead one out of rotation
+    return {**database.pool_options(url, is_async), "pool_pre_ping": True}
+
+
+def _sync_replicas() -> List[Replica]:
+    replicas = []
+    for i, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+        engine = create_engine(url, **_replica_options(url))
+        instrument_engine(engine, f"replica{i}")
+        instrument_queries(engine)
+        replicas.append(Replica(f"replica{i}", engine))
+    return replicas
+
+
+def _async_replicas() -> List[Replica]:
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    replicas = []
+    for i, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+        url = database.async_database_url(url)
+        engine = create_async_engine(url, **_replica_options(url, is_async=True))
+        instrument_engine(engine.sync_engine, f"replica{i}_async")
+        instrument_queries(engine.sync_engine)
+        replicas.append(Replica(f"replica{i}", engine))
+    return replicas
+
+
+replica_pool = ReplicaPool(_sync_replicas())
+async_replica_pool = ReplicaPool(_async_replicas() if database.DATABASE_ASYNC else [])
+
+
+def _needs_primary(clause) -> bool:
+    return (
+        isinstance(clause, (UpdateBase, TextClause))
+        or getattr(clause, "_for_update_arg", None) is not None
+    )
+
+
+class RoutingSession(Session):
+    """Reads go to ``info["replica"]`` when set; writes and locking reads go to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is None or self._flushing or (clause is not None and _needs_primary(clause)):
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        return replica
+
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=database.engine)
+
+AsyncReadSessionLocal = None
+if database.DATABASE_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    AsyncReadSessionLocal = async_sessionmaker(
+        database.async_engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False,
+    )
+
+
+# ─── Read-your-writes ───────────────────────────────────
+
+_pins: Dict[str, float] = {}
+_pins_lock = threading.Lock()
+
+
+def _pin(key: str, until: float) -> None:
+    with _pins_lock:
+        if len(_pins) >= MAX_PINS:
+            now = time.time()
+            for k in [k for k, v in _pins.items() if v <= now]:
+                del _pins[k]
+        _pins[key] = until
+
+
+def _pin_unexpired(value: Optional[str], now: float) -> bool:
+    # The value comes from the client: a pin we issued never ends further out
+    # than READ_YOUR_WRITES_SECONDS, so anything later is forged and ignored
+    try:
+        return now < float(value or 0) <= now + READ_YOUR_WRITES_SECONDS
+    except ValueError:
+        return False
+
+
+def pinned_to_primary(request: Request) -> bool:
+    now = time.time()
+    if _pin_unexpired(request.headers.get(PRIMARY_PIN_HEADER), now):
+        return True
+    if _pin_unexpired(request.cookies.get(PRIMARY_PIN_COOKIE), now):
+        return True
+    key = request.headers.get("authorization")
+    return key is not None and _pins.get(key, 0) > now
+
+
+class ReadYourWritesMiddleware:
+    """Pins a client to the primary for ``READ_YOUR_WRITES_SECONDS`` after each successful write."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in UNSAFE_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + READ_YOUR_WRITES_SECONDS
+                for name, value in scope["headers"]:
+                    if name == b"authorization":
+                        _pin(value.decode("latin-1"), until)
+                cookie = (f"{PRIMARY_PIN_COOKIE}={until:.3f}; Max-Age={int(READ_YOUR_WRITES_SECONDS) + 1}; "
+                          f"Path=/; HttpOnly; SameSite=Lax")
+                message = {**message, "headers": [
+                    *message.get("headers", []),
+                    (b"set-cookie", cookie.encode()),
+                    (PRIMARY_PIN_HEADER.lower().encode(), f"{until:.3f}".encode()),
+                ]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
+
+
+# ─── Dependencies ───────────────────────────────────────
+
+def read_session(use_primary: bool = False) -> Session:
+    """A session reading from the next healthy replica, or from the primary."""
+    for replica in ([] if use_primary else replica_pool.candidates()):
+        db = ReadSessionLocal(info={"replica": replica.bind})
+        try:
+            db.connection()
+        except DBAPIError as exc:
+            db.close()
+            replica_pool.mark_down(replica, exc)
+            continue
+        replica.reads += 1
+        return db
+    if replica_pool.replicas and not use_primary:
+        replica_pool.primary_fallbacks += 1
+    return database.SessionLocal()
+
+
+async def async_read_session(use_primary: bool = False):
+    for replica in ([] if use_primary else async_replica_pool.candidates()):
+        db = AsyncReadSessionLocal(info={"replica": replica.bind})
+        try:
+            await db.connection()
+        except DBAPIError as exc:
+            await db.close()
+            async_replica_pool.mark_down(replica, exc)
+            continue
+        replica.reads += 1
+        return db
+    if async_replica_pool.replicas and not use_primary:
+        async_replica_pool.primary_fallbacks += 1
+    return database.AsyncSessionLocal()
+
+
+def get_read_db(request: Request):
+    db = read_session(pinned_to_primary(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    async with await async_read_session(pinned_to_primary(request)) as db:
+        yield db
@@ -0,0 +1,326 @@
+"""Daily rollups behind the dashboard's time series and leaderboard.
+
+``refresh_rollups`` (``refresh_rollups.py``, e.g. from cron every few minutes)
+folds the ``point_transactions`` and ``redemptions`` created since the
+watermark into three tables keyed by UTC day: ledger entries per staff member
+and type, redemptions per gift, and points earned and redeemed per customer.
+It advances one day at a time, each step one transaction that adds the day's
+aggregates with ``INSERT ... SELECT ... ON CONFLICT DO UPDATE`` and moves the
+watermark, so it only reads new rows (through the ``created_at`` indexes) and
+an interrupted run resumes where it stopped. The watermark stays
+``ROLLUP_LAG_SECONDS`` behind the clock so that no transaction still in flight
+can commit rows behind it.
+
+Reads only touch the rollup rows of the requested days, so they cost the same
+however long the history is. Deleting a customer drops their per-customer
+rows (leaderboards list existing customers only) but leaves the other totals. ``rebuild_rollups`` recomputes everything, e.g.
+after ledger rows were deleted by hand.
+"""
+import os
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import String, case, cast, delete, event, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+ROLLUP_LAG_SECONDS = int(os.getenv("ROLLUP_LAG_SECONDS", 60))
+MAX_RANGE_DAYS = 1096
+DEFAULT_RANGE_DAYS = 30
+WATERMARK = "dashboard"
+
+INTERVALS = ("day", "week", "month")
+METRICS = ("points", "redemptions")
+LEADERBOARD_METRICS = ("earned", "redeemed")
+
+transactions = models.PointTransaction.__table__
+redemptions = models.Redemption.__table__
+customers = models.Customer.__table__
+points_rollup = models.PointsDailyRollup.__table__
+redemption_rollup = models.RedemptionDailyRollup.__table__
+customer_rollup = models.CustomerDailyRollup.__table__
+watermarks = models.RollupWatermark.__table__
+
+
+# ─── Refresh ────────────────────────────────────────────
+
+def _upsert(db: Session, table):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise RuntimeError(f"Dashboard rollups are not supported on {dialect}")
+
+
+def _accumulate(db: Session, table, source, keys: Tuple[str, ...], sums: Tuple[str, ...]) -> None:
+    """Add the rows of ``source`` (``keys`` then ``sums`` columns) to ``table``."""
+    stmt = _upsert(db, table).from_select([*keys, *sums], source)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c[k] for k in keys],
+        set_={name: table.c[name] + stmt.excluded[name] for name in sums},
+    ))
+
+
+def _fold(db: Session, start: datetime, end: datetime) -> None:
+    """Add the rows created in ``[start, end)`` to the rollups."""
+    t, r = transactions, redemptions
+    day = func.date(t.c.created_at)
+    type_ = cast(t.c.type, String)
+    window = (t.c.created_at >= start, t.c.created_at < end)
+    _accumulate(db, points_rollup, (
+        select(day, t.c.staff_id, type_, func.count(), func.sum(t.c.amount))
+        .where(*window)
+        .group_by(day, t.c.staff_id, type_)
+    ), ("day", "staff_id", "type"), ("entries", "points"))
+    _accumulate(db, customer_rollup, (
+        select(
+            day, t.c.customer_id,
+            func.sum(case((t.c.type == "earn", t.c.amount), else_=0)),
+            func.sum(case((t.c.type == "redeem", -t.c.amount), else_=0)),
+        )
+        .where(*window, t.c.type.in_(("earn", "redeem")))
+        .group_by(day, t.c.customer_id)
+    ), ("day", "customer_id"), ("earned", "redeemed"))
+    rday = func.date(r.c.created_at)
+    _accumulate(db, redemption_rollup, (
+        select(rday, r.c.gift_id, func.count(), func.sum(r.c.points_used))
+        .where(r.c.created_at >= start, r.c.created_at < end)
+        .group_by(rday, r.c.gift_id)
+    ), ("day", "gift_id"), ("redemptions", "points_used"))
+
+
+@event.listens_for(Session, "after_flush")
+def _forget_deleted_customers(session: Session, flush_context) -> None:
+    # Keeps leaderboards to existing customers; the other rollups keep counting their history
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, models.Customer)]
+    if deleted:
+        session.connection().execute(delete(customer_rollup).where(customer_rollup.c.customer_id.in_(deleted)))
+
+
+def rollups_through(db: Session, lock: bool = False) -> Optional[datetime]:
+    """Rows created before this are in the rollups (None before the first refresh)."""
+    q = select(watermarks.c.through).where(watermarks.c.name == WATERMARK)
+    if lock:
+        q = q.with_for_update()
+    return db.execute(q).scalar()
+
+
+def _start(db: Session) -> Optional[datetime]:
+    """Create the watermark at midnight before the oldest row; None while there are no rows."""
+    oldest = [
+        db.execute(select(func.min(transactions.c.created_at))).scalar(),
+        db.execute(select(func.min(redemptions.c.created_at))).scalar(),
+    ]
+    oldest = [o for o in oldest if o is not None]
+    if not oldest:
+        return None
+    try:
+        db.execute(insert(watermarks), {"name": WATERMARK, "through": datetime.combine(min(oldest).date(), time.min)})
+        db.commit()
+    except IntegrityError:
+        # Another refresh created it first
+        db.rollback()
+    return rollups_through(db)
+
+
+def refresh_rollups(upto: Optional[datetime] = None, session_factory=SessionLocal) -> dict:
+    """Fold every row created before ``upto`` (default: now minus the lag) into the rollups."""
+    upto = upto or datetime.utcnow() - timedelta(seconds=ROLLUP_LAG_SECONDS)
+    report = {"from": None, "through": None, "steps": 0}
+    with session_factory() as db:
+        report["from"] = rollups_through(db) or _start(db)
+        while report["from"] is not None:
+            through = rollups_through(db, lock=True)
+            if through >= upto:
+                db.rollback()
+                break
+            end = min(datetime.combine(through.date() + timedelta(days=1), time.min), upto)
+            _fold(db, through, end)
+            moved = db.execute(
+                update(watermarks)
+                .where(watermarks.c.name == WATERMARK, watermarks.c.through == through)
+                .values(through=end, updated_at=datetime.utcnow())
+            ).rowcount
+            if not moved:
+                # A concurrent refresh folded this day first (possible where FOR UPDATE is a no-op)
+                db.rollback()
+                continue
+            db.commit()
+            report["steps"] += 1
+        report["through"] = rollups_through(db)
+    return report
+
+
+def rebuild_rollups(upto: Optional[datetime] = None, session_factory=SessionLocal) -> dict:
+    """Drop the rollups and recompute them from the whole history."""
+    with session_factory() as db:
+        for table in (points_rollup, redemption_rollup, customer_rollup, watermarks):
+            db.execute(delete(table))
+        db.commit()
+    return refresh_rollups(upto, session_factory)
+
+
+# ─── Reads ──────────────────────────────────────────────
+
+def _date_range(start: Optional[date], end: Optional[date]) -> Tuple[date, date]:
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise ValueError("start is after end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"The range is limited to {MAX_RANGE_DAYS} days")
+    return start, end
+
+
+def period_start(day: date, interval: str) -> date:
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _points_rows(db: Session, start: date, end: date, by_staff: bool, staff_id: Optional[str]):
+    p = points_rollup
+    group = [p.c.day, p.c.type] + ([p.c.staff_id] if by_staff else [])
+    q = (
+        select(*group, func.sum(p.c.entries).label("entries"), func.sum(p.c.points).label("points"))
+        .where(p.c.day.between(start, end))
+        .group_by(*group)
+    )
+    if staff_id is not None:
+        q = q.where(p.c.staff_id == staff_id)
+    for row in db.execute(q):
+        sign = -1 if row.type in ("redeem", "expire") else 1
+        field = {"earn": "earned", "redeem": "redeemed", "manual_adjust": "adjusted", "expire": "expired"}[row.type]
+        yield row.day, row.staff_id if by_staff else None, {field: sign * int(row.points), "entries": int(row.entries)}
+
+
+def _redemption_rows(db: Session, start: date, end: date, by_gift: bool, gift_id: Optional[str]):
+    r = redemption_rollup
+    group = [r.c.day] + ([r.c.gift_id] if by_gift else [])
+    q = (
+        select(*group, func.sum(r.c.redemptions).label("redemptions"), func.sum(r.c.points_used).label("points_used"))
+        .where(r.c.day.between(start, end))
+        .group_by(*group)
+    )
+    if gift_id is not None:
+        q = q.where(r.c.gift_id == gift_id)
+    for row in db.execute(q):
+        yield row.day, row.gift_id if by_gift else None, {
+            "redemptions": int(row.redemptions), "points_used": int(row.points_used),
+        }
+
+
+def _group_names(db: Session, group_by: str, ids) -> dict:
+    if not ids:
+        return {}
+    if group_by == "staff":
+        table, name = models.Staff.__table__, models.Staff.__table__.c.username
+    else:
+        table, name = models.Gift.__table__, models.Gift.__table__.c.name
+    return dict(db.execute(select(table.c.id, name).where(table.c.id.in_(ids))).all())
+
+
+def timeseries(
+    db: Session,
+    metric: str = "points",
+    interval: str = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: Optional[str] = None,
+    staff_id: Optional[str] = None,
+    gift_id: Optional[str] = None,
+) -> dict:
+    """Per-period totals of ``metric`` between ``start`` and ``end`` (inclusive, UTC days).
+
+    ``points`` buckets hold earned, redeemed, adjusted and expired points and the
+    number of ledger entries, and can be grouped by or filtered on staff member;
+    ``redemptions`` buckets hold redemptions and points used, per gift if asked.
+    Each bucket is labelled with the first day of its period; without a grouping
+    every period in the range is present, with zeros where nothing happened.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}")
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown interval {interval!r}")
+    start, end = _date_range(start, end)
+    if metric == "points":
+        if group_by not in (None, "staff") or gift_id is not None:
+            raise ValueError("points can only be grouped by or filtered on staff")
+        fields = ("earned", "redeemed", "adjusted", "expired", "entries")
+        rows = _points_rows(db, start, end, group_by == "staff", staff_id)
+    else:
+        if group_by not in (None, "gift") or staff_id is not None:
+            raise ValueError("redemptions can only be grouped by or filtered on gift")
+        fields = ("redemptions", "points_used")
+        rows = _redemption_rows(db, start, end, group_by == "gift", gift_id)
+
+    buckets = defaultdict(lambda: dict.fromkeys(fields, 0))
+    if group_by is None:
+        day = start
+        while day <= end:
+            buckets[(period_start(day, interval), None)]
+            day += timedelta(days=1)
+    for day, group_id, values in rows:
+        bucket = buckets[(period_start(day, interval), group_id)]
+        for name, value in values.items():
+            bucket[name] += value
+    names = _group_names(db, group_by, {g for _, g in buckets if g is not None}) if group_by else {}
+    return {
+        "metric": metric,
+        "interval": interval,
+        "start": start,
+        "end": end,
+        "through": rollups_through(db),
+        "buckets": [
+            {"period": period, "group_id": group_id, "group_name": names.get(group_id), "values": values}
+            for (period, group_id), values in sorted(buckets.items(), key=lambda kv: (kv[0][0], kv[0][1] or ""))
+        ],
+    }
+
+
+def leaderboard(
+    db: Session,
+    metric: str = "earned",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = 10,
+) -> dict:
+    """The ``limit`` customers who earned (or redeemed) the most points between ``start`` and ``end``."""
+    if metric not in LEADERBOARD_METRICS:
+        raise ValueError(f"Unknown metric {metric!r}")
+    start, end = _date_range(start, end)
+    c = customer_rollup
+    points = func.sum(c.c[metric])
+    # Rank first and look up names for the winners only; deleted customers' rows are already gone
+    top = (
+        select(c.c.customer_id, points.label("points"))
+        .where(c.c.day.between(start, end))
+        .group_by(c.c.customer_id)
+        .having(points > 0)
+        .order_by(points.desc(), c.c.customer_id)
+        .limit(limit)
+        .subquery("top")
+    )
+    rows = db.execute(
+        select(top.c.customer_id, customers.c.full_name, top.c.points)
+        .join_from(top, customers, customers.c.id == top.c.customer_id)
+        .order_by(top.c.points.desc(), top.c.customer_id)
+    ).all()
+    return {
+        "metric": metric,
+        "start": start,
+        "end": end,
+        "through": rollups_through(db),
+        "entries": [
+            {"rank": rank, "customer_id": row.customer_id, "full_name": row.full_name, "points": int(row.points)}
+            for rank, row in enumerate(rows, start=1)
+        ],
+    }
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from .. import models, pool_metrics
+from ..auth import require_admin
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/pool")
+def pool_stats(_: models.Staff = Depends(require_admin)):
+    return pool_metrics.snapshot()
+
+
+@router.get("/pool/metrics", response_class=PlainTextResponse)
+def pool_prometheus(_: models.Staff = Depends(require_admin)):
+    body = "\n".join(pool_metrics.render_prometheus()) + "\n"
+    return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,5 @@
+"""Async counterparts of the routers in ``app.routers``, enabled with DATABASE_ASYNC.
+
+Handlers keep the same paths, payloads and semantics as their sync versions but
+run on the event loop against an ``AsyncSession`` instead of the threadpool.
+"""
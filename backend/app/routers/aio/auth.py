@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...database import get_async_db
+from ... import models, schemas
+from ...auth import (
+    check_password_async, rehash_password, create_staff_token, get_current_staff_async, require_admin_async, staff_cache,
+)
+
+router = APIRouter(prefix="/auth", tags=["auth"])
+
+
+@router.post("/login", response_model=schemas.Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    staff = (await db.execute(
+        select(models.Staff).where(models.Staff.username == form_data.username)
+    )).scalar_one_or_none()
+    valid, new_hash = await check_password_async(form_data.password, staff.password_hash) if staff else (False, None)
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+        )
+    if new_hash:
+        rehash_password(staff, new_hash)
+        await db.commit()
+    token = create_staff_token(staff)
+    return {"access_token": token, "token_type": "bearer"}
+
+
+@router.get("/me", response_model=schemas.StaffOut)
+async def me(current_staff: models.Staff = Depends(get_current_staff_async)):
+    return current_staff
+
+
+@router.get("/cache-stats")
+async def cache_stats(_: models.Staff = Depends(require_admin_async)):
+    return staff_cache.stats()
@@ -0,0 +1,222 @@
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...database import get_async_db
+from ...replicas import async_read_session, get_async_read_db, pinned_to_primary
+from ... import earn_batching, idempotency, ledger, models, phones, schemas
+from ...auth import get_current_staff_async
+from ...pagination import apply_keyset, split_page, NEXT_CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..customers import (
+    TRANSACTION_TYPES, customer_by_phone, phone_taken, search_filter, transaction_page, transaction_page_select,
+)
+
+router = APIRouter(prefix="/customers", tags=["customers"])
+
+
+async def _get_customer(db: AsyncSession, customer_id: str, for_update: bool = False) -> models.Customer:
+    stmt = select(models.Customer).where(models.Customer.id == customer_id)
+    if for_update:
+        stmt = stmt.with_for_update()
+    c = (await db.execute(stmt)).scalar_one_or_none()
+    if not c:
+        raise HTTPException(404, "Customer not found")
+    return c
+
+
+def _customer_select(dialect_name: str, search: Optional[str]):
+    stmt = select(models.Customer)
+    criterion = search_filter(dialect_name, search)
+    return stmt if criterion is None else stmt.where(criterion)
+
+
+@router.post("", response_model=schemas.CustomerOut, status_code=201)
+async def create_customer(
+    data: schemas.CustomerCreate,
+    db: AsyncSession = Depends(get_async_db),
+    _: models.Staff = Depends(get_current_staff_async),
+):
+    existing = (await db.execute(select(models.Customer.id).where(phone_taken(data.phone_number)))).first()
+    if existing:
+        raise HTTPException(400, "Phone number already registered")
+    c = models.Customer(**data.model_dump())
+    db.add(c)
+    await db.commit()
+    await db.refresh(c)
+    return c
+
+
+async def _stream_customers_ndjson(search: Optional[str], use_primary: bool):
+    async with await async_read_session(use_primary) as db:
+        stmt = _customer_select(db.bind.dialect.name, search).order_by(
+            models.Customer.created_at.desc(), models.Customer.id.desc()
+        ).execution_options(yield_per=1000)
+        async for c in await db.stream_scalars(stmt):
+            yield schemas.CustomerOut.model_validate(c).model_dump_json() + "\n"
+
+
+@router.get("", response_model=List[schemas.CustomerOut])
+async def list_customers(
+    request: Request,
+    response: Response,
+    search: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_async_read_db),
+    _: models.Staff = Depends(get_current_staff_async),
+):
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_customers_ndjson(search, pinned_to_primary(request)), media_type="application/x-ndjson"
+        )
+    stmt = apply_keyset(
+        _customer_select(db.bind.dialect.name, search),
+        models.Customer.created_at, models.Customer.id, cursor, limit,
+    )
+    rows, next_cursor = split_page((await db.execute(stmt)).scalars().all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+@router.get("/by-phone/{phone}", response_model=schemas.CustomerOut)
+async def get_customer_by_phone(
+    phone: str, db: AsyncSession = Depends(get_async_db), _: models.Staff = Depends(get_current_staff_async),
+):
+    c = await db.run_sync(customer_by_phone, phone)
+    if not c:
+        raise HTTPException(404, "Customer not found")
+    return c
+
+
+@router.get("/{customer_id}", response_model=schemas.CustomerOut)
+async def get_customer(customer_id: str, db: AsyncSession = Depends(get_async_db), _: models.Staff = Depends(get_current_staff_async)):
+    return await _get_customer(db, customer_id)
+
+
+@router.put("/{customer_id}", response_model=schemas.CustomerOut)
+async def update_customer(
+    customer_id: str,
+    data: schemas.CustomerUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    _: models.Staff = Depends(get_current_staff_async),
+):
+    c = await _get_customer(db, customer_id)
+    changes = data.model_dump(exclude_unset=True)
+    if changes.get("phone_number") is not None and (await db.execute(
+        select(models.Customer.id).where(phone_taken(changes["phone_number"], exclude_id=c.id))
+    )).first():
+        raise HTTPException(400, "Phone number already registered")
+    old_key = c.phone_key
+    for field, value in changes.items():
+        setattr(c, field, value)
+    await db.commit()
+    phones.phone_cache.pop(old_key)
+    await db.refresh(c)
+    return c
+
+
+@router.delete("/{customer_id}", status_code=204)
+async def delete_customer(customer_id: str, db: AsyncSession = Depends(get_async_db), _: models.Staff = Depends(get_current_staff_async)):
+    c = await _get_customer(db, customer_id)
+    key = c.phone_key
+    await db.delete(c)
+    await db.commit()
+    phones.phone_cache.pop(key)
+
+
+@router.post("/{customer_id}/add-points", response_model=schemas.CustomerOut)
+async def add_points(
+    customer_id: str,
+    data: schemas.PointsRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
+    db: AsyncSession = Depends(get_async_db),
+    staff: models.Staff = Depends(get_current_staff_async),
+):
+    pending = await db.run_sync(idempotency.begin, staff.id, idempotency_key, request.url.path, data)
+    if earn_batching.async_batcher is not None:
+        earn = earn_batching.Earn(customer_id, staff.id, data.amount, data.description, pending)
+        return await earn_batching.async_batcher.submit(db, earn)
+    c = await _get_customer(db, customer_id, for_update=True)
+    if data.amount <= 0:
+        raise HTTPException(400, "Amount must be positive")
+    c.total_points += data.amount
+    tx = models.PointTransaction(
+        customer_id=customer_id,
+        staff_id=staff.id,
+        type="earn",
+        amount=data.amount,
+        description=data.description,
+        balance_after=c.total_points,
+    )
+    db.add(tx)
+    out = schemas.CustomerOut.model_validate(c)
+    await db.run_sync(idempotency.commit, pending, 200, out)
+    return out
+
+
+@router.post("/{customer_id}/deduct-points", response_model=schemas.CustomerOut)
+async def deduct_points(
+    customer_id: str,
+    data: schemas.PointsRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
+    db: AsyncSession = Depends(get_async_db),
+    staff: models.Staff = Depends(get_current_staff_async),
+):
+    pending = await db.run_sync(idempotency.begin, staff.id, idempotency_key, request.url.path, data)
+    c = await _get_customer(db, customer_id, for_update=True)
+    if data.amount <= 0:
+        raise HTTPException(400, "Amount must be positive")
+    if c.total_points < data.amount:
+        raise HTTPException(400, "Insufficient points")
+    c.total_points -= data.amount
+    tx = models.PointTransaction(
+        customer_id=customer_id,
+        staff_id=staff.id,
+        type="manual_adjust",
+        amount=-data.amount,
+        description=data.description,
+        balance_after=c.total_points,
+    )
+    db.add(tx)
+    out = schemas.CustomerOut.model_validate(c)
+    await db.run_sync(idempotency.commit, pending, 200, out)
+    return out
+
+
+@router.get("/{customer_id}/transactions", response_model=List[schemas.TransactionOut])
+async def get_transactions(
+    customer_id: str,
+    response: Response,
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    type: Optional[str] = Query(None, pattern=TRANSACTION_TYPES),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_read_db),
+    _: models.Staff = Depends(get_current_staff_async),
+):
+    stmt = transaction_page_select(customer_id, since, until, type, cursor, limit)
+    rows, next_cursor = transaction_page((await db.execute(stmt)).all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+@router.get("/{customer_id}/balance", response_model=schemas.BalanceOut)
+async def get_balance(
+    customer_id: str,
+    as_of: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    _: models.Staff = Depends(get_current_staff_async),
+):
+    balance = await db.run_sync(ledger.balance_as_of, customer_id, as_of)
+    if balance is None:
+        raise HTTPException(404, "Customer not found")
+    return balance
@@ -0,0 +1,49 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...replicas import get_async_read_db
+from ... import models, rollups, schemas, stats
+from ...auth import get_current_staff_async
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+
+@router.get("/stats", response_model=schemas.DashboardStats)
+async def get_stats(db: AsyncSession = Depends(get_async_read_db), _: models.Staff = Depends(get_current_staff_async)):
+    return schemas.DashboardStats(**await db.run_sync(stats.read_stats))
+
+
+@router.get("/timeseries", response_model=schemas.Timeseries)
+async def get_timeseries(
+    metric: str = Query("points", pattern="^(points|redemptions)$"),
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    group_by: Optional[str] = Query(None, pattern="^(staff|gift)$"),
+    staff_id: Optional[str] = Query(None),
+    gift_id: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+    _: models.Staff = Depends(get_current_staff_async),
+):
+    try:
+        return await db.run_sync(rollups.timeseries, metric, interval, start, end, group_by, staff_id, gift_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@router.get("/leaderboard", response_model=schemas.Leaderboard)
+async def get_leaderboard(
+    metric: str = Query("earned", pattern="^(earned|redeemed)$"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db),
+    _: models.Staff = Depends(get_current_staff_async),
+):
+    try:
+        return await db.run_sync(rollups.leaderboard, metric, start, end, limit)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
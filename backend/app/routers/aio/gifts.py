@@ -0,0 +1,59 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...database import get_async_db
+from ... import models, schemas
+from ...auth import get_current_staff_async
+from ...catalog import catalog_response, gift_catalog
+
+router = APIRouter(prefix="/gifts", tags=["gifts"])
+
+
+async def _get_gift(db: AsyncSession, gift_id: str) -> models.Gift:
+    g = (await db.execute(select(models.Gift).where(models.Gift.id == gift_id))).scalar_one_or_none()
+    if not g:
+        raise HTTPException(404, "Gift not found")
+    return g
+
+
+@router.post("", response_model=schemas.GiftOut, status_code=201)
+async def create_gift(data: schemas.GiftCreate, db: AsyncSession = Depends(get_async_db), _: models.Staff = Depends(get_current_staff_async)):
+    g = models.Gift(**data.model_dump())
+    db.add(g)
+    await db.commit()
+    await db.refresh(g)
+    return g
+
+
+@router.get("", response_model=List[schemas.GiftOut])
+async def list_gifts(
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    _: models.Staff = Depends(get_current_staff_async),
+):
+    body, etag = gift_catalog.fresh() or await db.run_sync(gift_catalog.refresh)
+    return catalog_response(body, etag, if_none_match)
+
+
+@router.put("/{gift_id}", response_model=schemas.GiftOut)
+async def update_gift(gift_id: str, data: schemas.GiftUpdate, db: AsyncSession = Depends(get_async_db), _: models.Staff = Depends(get_current_staff_async)):
+    g = await _get_gift(db, gift_id)
+    for field, value in data.model_dump(exclude_unset=True).items():
+        setattr(g, field, value)
+    await db.commit()
+    await db.refresh(g)
+    return g
+
+
+@router.delete("/{gift_id}", status_code=204)
+async def delete_gift(gift_id: str, db: AsyncSession = Depends(get_async_db), _: models.Staff = Depends(get_current_staff_async)):
+    g = await _get_gift(db, gift_id)
+    try:
+        await db.delete(g)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(400, "Cannot delete gift because it has linked redemptions.")
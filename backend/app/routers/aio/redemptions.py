@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...database import get_async_db
+from ...replicas import get_async_read_db
+from ... import idempotency, models, redemption, schemas
+from ...auth import get_current_staff_async
+from ...pagination import NEXT_CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..redemptions import redemption_page, redemption_page_select
+
+router = APIRouter(tags=["redemptions"])
+
+
+@router.post("/redeem", response_model=schemas.RedemptionOut, status_code=201)
+async def redeem_gift(
+    data: schemas.RedemptionCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
+    db: AsyncSession = Depends(get_async_db),
+    staff: models.Staff = Depends(get_current_staff_async),
+):
+    pending = await db.run_sync(idempotency.begin, staff.id, idempotency_key, request.url.path, data)
+    return await db.run_sync(redemption.redeem, data.customer_id, data.gift_id, staff.id, pending)
+
+
+@router.get("/redemptions", response_model=List[schemas.RedemptionDetailOut], response_model_exclude_none=True)
+async def list_redemptions(
+    response: Response,
+    gift_id: Optional[str] = Query(None),
+    customer_id: Optional[str] = Query(None),
+    staff_id: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    expand: bool = Query(False),
+    db: AsyncSession = Depends(get_async_read_db),
+    _: models.Staff = Depends(get_current_staff_async),
+):
+    stmt = redemption_page_select(gift_id, customer_id, staff_id, since, until, cursor, limit, expand)
+    rows, next_cursor = redemption_page((await db.execute(stmt)).scalars().all(), limit, expand)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
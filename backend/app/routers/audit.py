@@ -0,0 +1,151 @@
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import String, Text, cast, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from ..replicas import get_read_db
+from .. import models, schemas
+from ..auth import StaffPrincipal, get_current_staff, require_admin
+from ..pagination import keyset_criterion, split_page, NEXT_CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+router = APIRouter(tags=["audit"])
+
+ACTIVITY_TYPES = "^(earn|redeem|manual_adjust|expire|redemption)$"
+
+
+def _conditions(table, amount, staff_id, customer_id, min_amount, max_amount, since, until) -> list:
+    conditions = []
+    for column, value in ((table.c.staff_id, staff_id), (table.c.customer_id, customer_id)):
+        if value is not None:
+            conditions.append(column == value)
+    if min_amount is not None:
+        conditions.append(amount >= min_amount)
+    if max_amount is not None:
+        conditions.append(amount <= max_amount)
+    if since is not None:
+        conditions.append(table.c.created_at >= since)
+    if until is not None:
+        conditions.append(table.c.created_at < until)
+    return conditions
+
+
+def _branch(table, columns: dict, conditions: list, cursor: Optional[str], limit: int):
+    after_cursor = keyset_criterion(table.c.created_at, table.c.id, cursor)
+    if after_cursor is not None:
+        conditions = [*conditions, after_cursor]
+    return (
+        select(*[value.label(name) for name, value in columns.items()])
+        .where(*conditions)
+        .order_by(table.c.created_at.desc(), table.c.id.desc())
+        .limit(limit + 1)
+        .subquery()
+    )
+
+
+def activity_page_select(
+    staff_id: Optional[str],
+    customer_id: Optional[str],
+    type: Optional[str],
+    min_amount: Optional[int],
+    max_amount: Optional[int],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    cursor: Optional[str],
+    limit: int,
+):
+    """One page of point transactions and redemptions merged, newest first.
+
+    Each table is filtered, keyset-paged and limited on its own before the
+    UNION ALL, so a page reads at most ``limit + 1`` rows from each: from
+    ix_point_transactions_staff_created / ix_redemptions_staff_created for a
+    staff member, from the customer or created_at indexes otherwise. Amount
+    thresholds apply to the signed change in points.
+    """
+    t = models.PointTransaction.__table__
+    r = models.Redemption.__table__
+    filters = (staff_id, customer_id, min_amount, max_amount, since, until)
+    branches = []
+    if type != "redemption":
+        conditions = _conditions(t, t.c.amount, *filters)
+        if type is not None:
+            conditions.append(t.c.type == type)
+        branches.append(_branch(t, {
+            "source": literal("transaction"),
+            "id": t.c.id,
+            "staff_id": t.c.staff_id,
+            "customer_id": t.c.customer_id,
+            # Plain text so it unions with "redemption" (the column is an enum on Postgres)
+            "type": cast(t.c.type, String),
+            "amount": t.c.amount,
+            "description": t.c.description,
+            "gift_id": cast(null(), r.c.gift_id.type),
+            "created_at": t.c.created_at,
+        }, conditions, cursor, limit))
+    if type in (None, "redemption"):
+        branches.append(_branch(r, {
+            "source": literal("redemption"),
+            "id": r.c.id,
+            "staff_id": r.c.staff_id,
+            "customer_id": r.c.customer_id,
+            "type": literal("redemption"),
+            "amount": -r.c.points_used,
+            "description": cast(null(), Text),
+            "gift_id": r.c.gift_id,
+            "created_at": r.c.created_at,
+        }, _conditions(r, -r.c.points_used, *filters), cursor, limit))
+    merged = union_all(*[select(b) for b in branches]).subquery() if len(branches) > 1 else branches[0]
+    return select(merged).order_by(merged.c.created_at.desc(), merged.c.id.desc()).limit(limit + 1)
+
+
+def activity_page(db: Session, stmt, limit: int):
+    rows, next_cursor = split_page(db.execute(stmt).all(), limit)
+    return [schemas.ActivityOut.model_validate(dict(row._mapping)) for row in rows], next_cursor
+
+
+@router.get("/staff/{staff_id}/activity", response_model=List[schemas.ActivityOut], response_model_exclude_none=True)
+def staff_activity(
+    staff_id: str,
+    response: Response,
+    type: Optional[str] = Query(None, pattern=ACTIVITY_TYPES),
+    min_amount: Optional[int] = Query(None),
+    max_amount: Optional[int] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+    current: StaffPrincipal = Depends(get_current_staff),
+):
+    """What one staff member did; staff may see their own activity, admins anyone's."""
+    if current.role != "admin" and current.id != staff_id:
+        raise HTTPException(403, "Admin access required")
+    if db.get(models.Staff, staff_id) is None:
+        raise HTTPException(404, "Staff member not found")
+    stmt = activity_page_select(staff_id, None, type, min_amount, max_amount, since, until, cursor, limit)
+    rows, next_cursor = activity_page(db, stmt, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+@router.get("/admin/audit", response_model=List[schemas.ActivityOut], response_model_exclude_none=True)
+def audit_search(
+    response: Response,
+    staff_id: Optional[str] = Query(None),
+    customer_id: Optional[str] = Query(None),
+    type: Optional[str] = Query(None, pattern=ACTIVITY_TYPES),
+    min_amount: Optional[int] = Query(None),
+    max_amount: Optional[int] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+    _: StaffPrincipal = Depends(require_admin),
+):
+    stmt = activity_page_select(staff_id, customer_id, type, min_amount, max_amount, since, until, cursor, limit)
+    rows, next_cursor = activity_page(db, stmt, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
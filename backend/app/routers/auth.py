@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 
 from ..database import get_db
 from .. import models, schemas
-from ..auth import verify_password, create_access_token, get_current_staff
+from ..auth import check_password, rehash_password, create_staff_token, get_current_staff, require_admin, staff_cache
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -12,15 +12,24 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 @router.post("/login", response_model=schemas.Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     staff = db.query(models.Staff).filter(models.Staff.username == form_data.username).first()
-    if not staff or not verify_password(form_data.password, staff.password_hash):
+    valid, new_hash = check_password(form_data.password, staff.password_hash) if staff else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
-    token = create_access_token({"sub": staff.username, "role": staff.role})
+    if new_hash:
+        rehash_password(staff, new_hash)
+        db.commit()
+    token = create_staff_token(staff)
     return {"access_token": token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=schemas.StaffOut)
 def me(current_staff: models.Staff = Depends(get_current_staff)):
     return current_staff
+
+
+@router.get("/cache-stats")
+def cache_stats(_: models.Staff = Depends(require_admin)):
+    return staff_cache.stats()
@@ -0,0 +1,33 @@
+import csv
+import io
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from .. import models, schemas
+from ..auth import require_admin
+from ..bulk_points import read_csv, read_ndjson
+from ..customer_import import import_customers, DEFAULT_CHUNK_SIZE
+
+router = APIRouter(prefix="/customers", tags=["customers"])
+
+
+# Sync in both modes, like /points/bulk: validating a large file is CPU work
+# that must not run on the event loop.
+@router.post("/import", response_model=schemas.CustomerImportReport)
+def import_customer_file(
+    file: UploadFile = File(...),
+    format: str = Query(None, pattern="^(csv|ndjson)$"),
+    policy: str = Query("skip", pattern="^(skip|fill|overwrite)$"),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=20000),
+    db: Session = Depends(get_db),
+    _: models.Staff = Depends(require_admin),
+):
+    fmt = format or ("ndjson" if (file.filename or "").endswith((".ndjson", ".jsonl")) else "csv")
+    try:
+        stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        reader = read_ndjson(stream) if fmt == "ndjson" else read_csv(stream)
+        return import_customers(db, reader, policy=policy, chunk_size=chunk_size)
+    except (UnicodeDecodeError, csv.Error):
+        raise HTTPException(400, "Upload must be UTF-8 CSV or NDJSON")
@@ -1,22 +1,59 @@
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, func, select
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from .. import models, schemas
+from ..replicas import get_read_db, pinned_to_primary, read_session
+from .. import earn_batching, idempotency, ledger, models, phones, schemas
 from ..auth import get_current_staff
+from ..pagination import keyset_criterion, keyset_page, split_page, NEXT_CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(prefix="/customers", tags=["customers"])
 
 
+def phone_taken(phone_number: str, exclude_id: Optional[str] = None):
+    """Criterion for customers already registered under ``phone_number``, as typed or normalized."""
+    criterion = models.Customer.phone_number == phone_number
+    key = phones.phone_key(phone_number)
+    if key is not None:
+        criterion = criterion | (models.Customer.phone_key == key)
+    if exclude_id is not None:
+        criterion = criterion & (models.Customer.id != exclude_id)
+    return criterion
+
+
+def customer_by_phone(db: Session, phone: str) -> Optional[models.Customer]:
+    """The customer registered under ``phone`` in any format.
+
+    ``phones.phone_cache`` remembers which customer id a key leads to; a hit
+    costs a primary key read, checked against the row's own ``phone_key`` in
+    case the number moved to someone else in another worker.
+    """
+    key = phones.phone_key(phone)
+    if key is None:
+        return None
+    customer_id = phones.phone_cache.get(key)
+    if customer_id is not None:
+        c = db.get(models.Customer, customer_id)
+        if c is not None and c.phone_key == key:
+            return c
+        phones.phone_cache.pop(key)
+    c = db.query(models.Customer).filter(models.Customer.phone_key == key).first()
+    if c is not None:
+        phones.phone_cache.set(key, c.id)
+    return c
+
+
 @router.post("", response_model=schemas.CustomerOut, status_code=201)
 def create_customer(
     data: schemas.CustomerCreate,
     db: Session = Depends(get_db),
     _: models.Staff = Depends(get_current_staff),
 ):
-    existing = db.query(models.Customer).filter(models.Customer.phone_number == data.phone_number).first()
+    existing = db.query(models.Customer.id).filter(phone_taken(data.phone_number)).first()
     if existing:
         raise HTTPException(400, "Phone number already registered")
     c = models.Customer(**data.model_dump())
@@ -26,19 +63,78 @@ def create_customer(
     return c
 
 
+def _prefix_upper_bound(prefix: str) -> str:
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def search_filter(dialect_name: str, search: Optional[str]):
+    term = (search or "").strip()
+    if not term:
+        return None
+    if dialect_name == "postgresql":
+        # Served by the pg_trgm GIN indexes on full_name / phone_number
+        return (
+            models.Customer.full_name.ilike(f"%{term}%") |
+            models.Customer.phone_number.ilike(f"%{term}%")
+        )
+    # Index-friendly normalized prefix match for databases without pg_trgm
+    term = term.lower()
+    upper = _prefix_upper_bound(term)
+    name_key = func.lower(models.Customer.full_name)
+    return (
+        ((name_key >= term) & (name_key < upper)) |
+        ((models.Customer.phone_number >= term) & (models.Customer.phone_number < upper))
+    )
+
+
+def _customer_query(db: Session, search: Optional[str]):
+    q = db.query(models.Customer)
+    criterion = search_filter(db.get_bind().dialect.name, search)
+    return q if criterion is None else q.filter(criterion)
+
+
+def _stream_customers_ndjson(search: Optional[str], use_primary: bool):
+    # Own session: the request-scoped one may be closed before the body is sent
+    db = read_session(use_primary)
+    try:
+        q = _customer_query(db, search).order_by(
+            models.Customer.created_at.desc(), models.Customer.id.desc()
+        ).yield_per(1000)
+        for c in q:
+            yield schemas.CustomerOut.model_validate(c).model_dump_json() + "\n"
+    finally:
+        db.close()
+
+
 @router.get("", response_model=List[schemas.CustomerOut])
 def list_customers(
+    request: Request,
+    response: Response,
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_read_db),
     _: models.Staff = Depends(get_current_staff),
 ):
-    q = db.query(models.Customer)
-    if search:
-        q = q.filter(
-            models.Customer.full_name.ilike(f"%{search}%") |
-            models.Customer.phone_number.ilike(f"%{search}%")
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_customers_ndjson(search, pinned_to_primary(request)), media_type="application/x-ndjson"
         )
-    return q.order_by(models.Customer.created_at.desc()).all()
+    rows, next_cursor = keyset_page(
+        _customer_query(db, search), models.Customer.created_at, models.Customer.id, cursor, limit
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+@router.get("/by-phone/{phone}", response_model=schemas.CustomerOut)
+def get_customer_by_phone(phone: str, db: Session = Depends(get_db), _: models.Staff = Depends(get_current_staff)):
+    c = customer_by_phone(db, phone)
+    if not c:
+        raise HTTPException(404, "Customer not found")
+    return c
 
 
 @router.get("/{customer_id}", response_model=schemas.CustomerOut)
@@ -59,9 +155,16 @@ def update_customer(
     c = db.query(models.Customer).filter(models.Customer.id == customer_id).first()
     if not c:
         raise HTTPException(404, "Customer not found")
-    for field, value in data.model_dump(exclude_unset=True).items():
+    changes = data.model_dump(exclude_unset=True)
+    if changes.get("phone_number") is not None and db.query(models.Customer.id).filter(
+        phone_taken(changes["phone_number"], exclude_id=c.id)
+    ).first():
+        raise HTTPException(400, "Phone number already registered")
+    old_key = c.phone_key
+    for field, value in changes.items():
         setattr(c, field, value)
     db.commit()
+    phones.phone_cache.pop(old_key)
     db.refresh(c)
     return c
 
@@ -71,17 +174,25 @@ def delete_customer(customer_id: str, db: Session = Depends(get_db), _: models.S
     c = db.query(models.Customer).filter(models.Customer.id == customer_id).first()
     if not c:
         raise HTTPException(404, "Customer not found")
+    key = c.phone_key
     db.delete(c)
     db.commit()
+    phones.phone_cache.pop(key)
 
 
 @router.post("/{customer_id}/add-points", response_model=schemas.CustomerOut)
 def add_points(
     customer_id: str,
     data: schemas.PointsRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
     db: Session = Depends(get_db),
     staff: models.Staff = Depends(get_current_staff),
 ):
+    pending = idempotency.begin(db, staff.id, idempotency_key, request.url.path, data)
+    if earn_batching.batcher is not None:
+        earn = earn_batching.Earn(customer_id, staff.id, data.amount, data.description, pending)
+        return earn_batching.batcher.submit(db, earn)
     c = db.query(models.Customer).filter(models.Customer.id == customer_id).with_for_update().first()
     if not c:
         raise HTTPException(404, "Customer not found")
@@ -94,20 +205,24 @@ def add_points(
         type="earn",
         amount=data.amount,
         description=data.description,
+        balance_after=c.total_points,
     )
     db.add(tx)
-    db.commit()
-    db.refresh(c)
-    return c
+    out = schemas.CustomerOut.model_validate(c)
+    idempotency.commit(db, pending, 200, out)
+    return out
 
 
 @router.post("/{customer_id}/deduct-points", response_model=schemas.CustomerOut)
 def deduct_points(
     customer_id: str,
     data: schemas.PointsRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
     db: Session = Depends(get_db),
     staff: models.Staff = Depends(get_current_staff),
 ):
+    pending = idempotency.begin(db, staff.id, idempotency_key, request.url.path, data)
     c = db.query(models.Customer).filter(models.Customer.id == customer_id).with_for_update().first()
     if not c:
         raise HTTPException(404, "Customer not found")
@@ -122,18 +237,86 @@ def deduct_points(
         type="manual_adjust",
         amount=-data.amount,
         description=data.description,
+        balance_after=c.total_points,
     )
     db.add(tx)
-    db.commit()
-    db.refresh(c)
-    return c
+    out = schemas.CustomerOut.model_validate(c)
+    idempotency.commit(db, pending, 200, out)
+    return out
+
+
+TRANSACTION_TYPES = "^(earn|redeem|manual_adjust|expire)$"
+
+
+def transaction_page_select(
+    customer_id: str,
+    since: Optional[datetime],
+    until: Optional[datetime],
+    type: Optional[str],
+    cursor: Optional[str],
+    limit: int,
+):
+    """One page of a customer's transactions, newest first, plus the customer's existence.
+
+    The transactions are outer-joined onto the customer row, so an unknown
+    customer yields no rows and a customer with an empty page yields a single
+    row whose transaction is None. All filters live in the join condition to
+    keep that outer row; the page is read from ix_point_transactions_customer_created.
+    """
+    tx = models.PointTransaction
+    conditions = [tx.customer_id == models.Customer.id]
+    if since is not None:
+        conditions.append(tx.created_at >= since)
+    if until is not None:
+        conditions.append(tx.created_at < until)
+    if type is not None:
+        conditions.append(tx.type == type)
+    after_cursor = keyset_criterion(tx.created_at, tx.id, cursor)
+    if after_cursor is not None:
+        conditions.append(after_cursor)
+    return (
+        select(models.Customer.id, tx)
+        .outerjoin(tx, and_(*conditions))
+        .where(models.Customer.id == customer_id)
+        .order_by(tx.created_at.desc(), tx.id.desc())
+        .limit(limit + 1)
+    )
+
+
+def transaction_page(rows: list, limit: int):
+    """Split ``transaction_page_select`` results into (transactions, next_cursor)."""
+    if not rows:
+        raise HTTPException(404, "Customer not found")
+    return split_page([tx for _, tx in rows if tx is not None], limit)
 
 
 @router.get("/{customer_id}/transactions", response_model=List[schemas.TransactionOut])
-def get_transactions(customer_id: str, db: Session = Depends(get_db), _: models.Staff = Depends(get_current_staff)):
-    c = db.query(models.Customer).filter(models.Customer.id == customer_id).first()
-    if not c:
+def get_transactions(
+    customer_id: str,
+    response: Response,
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    type: Optional[str] = Query(None, pattern=TRANSACTION_TYPES),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+    _: models.Staff = Depends(get_current_staff),
+):
+    stmt = transaction_page_select(customer_id, since, until, type, cursor, limit)
+    rows, next_cursor = transaction_page(db.execute(stmt).all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+@router.get("/{customer_id}/balance", response_model=schemas.BalanceOut)
+def get_balance(
+    customer_id: str,
+    as_of: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+    _: models.Staff = Depends(get_current_staff),
+):
+    balance = ledger.balance_as_of(db, customer_id, as_of)
+    if balance is None:
         raise HTTPException(404, "Customer not found")
-    return db.query(models.PointTransaction).filter(
-        models.PointTransaction.customer_id == customer_id
-    ).order_by(models.PointTransaction.created_at.desc()).all()
+    return balance
@@ -1,29 +1,49 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import func
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from ..database import get_db
-from .. import models, schemas
+from ..replicas import get_read_db
+from .. import models, rollups, schemas, stats
 from ..auth import get_current_staff
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
 
 @router.get("/stats", response_model=schemas.DashboardStats)
-def get_stats(db: Session = Depends(get_db), _: models.Staff = Depends(get_current_staff)):
-    total_customers = db.query(func.count(models.Customer.id)).scalar()
-
-    total_points_issued = db.query(func.sum(models.PointTransaction.amount)).filter(
-        models.PointTransaction.type == "earn"
-    ).scalar() or 0
-
-    total_redemptions = db.query(func.count(models.Redemption.id)).scalar()
-
-    active_gifts = db.query(func.count(models.Gift.id)).filter(models.Gift.stock > 0).scalar()
-
-    return schemas.DashboardStats(
-        total_customers=total_customers,
-        total_points_issued=total_points_issued,
-        total_redemptions=total_redemptions,
-        active_gifts=active_gifts,
-    )
+def get_stats(db: Session = Depends(get_read_db), _: models.Staff = Depends(get_current_staff)):
+    return schemas.DashboardStats(**stats.read_stats(db))
+
+
+@router.get("/timeseries", response_model=schemas.Timeseries)
+def get_timeseries(
+    metric: str = Query("points", pattern="^(points|redemptions)$"),
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    group_by: Optional[str] = Query(None, pattern="^(staff|gift)$"),
+    staff_id: Optional[str] = Query(None),
+    gift_id: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+    _: models.Staff = Depends(get_current_staff),
+):
+    try:
+        return rollups.timeseries(db, metric, interval, start, end, group_by, staff_id, gift_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@router.get("/leaderboard", response_model=schemas.Leaderboard)
+def get_leaderboard(
+    metric: str = Query("earned", pattern="^(earned|redeemed)$"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    _: models.Staff = Depends(get_current_staff),
+):
+    try:
+        return rollups.leaderboard(db, metric, start, end, limit)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
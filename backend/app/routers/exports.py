@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from .. import models
+from ..auth import require_admin
+from ..exports import DATASETS, EXPORT_BATCH_SIZE, TRANSACTION_TYPES, export_query, iter_csv
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+
+# Served by the sync router in both modes: the body is produced from its own
+# streaming connection, in the threadpool, after the request has returned.
+@router.get("/{dataset}.csv")
+def export_csv(
+    dataset: str,
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    type: Optional[str] = Query(None, pattern=f"^({'|'.join(TRANSACTION_TYPES)})$"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=100, le=100_000),
+    _: models.Staff = Depends(require_admin),
+):
+    if dataset not in DATASETS:
+        raise HTTPException(404, f"Unknown export, expected one of: {', '.join(DATASETS)}")
+    try:
+        stmt = export_query(dataset, since, until, type)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    filename = f"{dataset}-{datetime.utcnow():%Y%m%dT%H%M%S}.csv"
+    return StreamingResponse(
+        iter_csv(stmt, batch_size),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
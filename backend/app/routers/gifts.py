@@ -1,11 +1,12 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from .. import models, schemas
 from ..auth import get_current_staff
+from ..catalog import catalog_response, gift_catalog
 
 router = APIRouter(prefix="/gifts", tags=["gifts"])
 
@@ -20,8 +21,13 @@ def create_gift(data: schemas.GiftCreate, db: Session = Depends(get_db), _: mode
 
 
 @router.get("", response_model=List[schemas.GiftOut])
-def list_gifts(db: Session = Depends(get_db), _: models.Staff = Depends(get_current_staff)):
-    return db.query(models.Gift).order_by(models.Gift.created_at.desc()).all()
+def list_gifts(
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    _: models.Staff = Depends(get_current_staff),
+):
+    body, etag = gift_catalog.fresh() or gift_catalog.refresh(db)
+    return catalog_response(body, etag, if_none_match)
 
 
 @router.put("/{gift_id}", response_model=schemas.GiftOut)
@@ -0,0 +1,124 @@
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from fastapi.security.utils import get_authorization_scheme_param
+
+from .. import earn_batching, phones, pool_metrics, profiling
+from ..auth import StaffPrincipal, get_current_staff, require_admin
+from ..catalog import gift_catalog
+from ..hashing import hash_pool
+from ..replicas import async_replica_pool, replica_pool
+from ..metrics import render_metric
+from .admin import PROMETHEUS_CONTENT_TYPE
+
+# Scrapers cannot log in, so /metrics also takes this static bearer token; unset, only admins get in
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+def _require_admin_header(authorization: Optional[str]) -> None:
+    scheme, token = get_authorization_scheme_param(authorization)
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    require_admin(get_current_staff(token))
+
+
+def require_metrics_token(
+    format: str = Query("prometheus", pattern="^(prometheus|json)$"),
+    authorization: Optional[str] = Header(None),
+) -> None:
+    # The scraper token only reads the Prometheus text; the JSON view (per-route profile) is for admins
+    if (format == "prometheus" and METRICS_TOKEN is not None
+            and secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}")):
+        return
+    _require_admin_header(authorization)
+
+
+def _hash_pool_metrics():
+    stats = hash_pool.stats()
+    return (
+        render_metric("password_hash_pending", "Hash/verify calls queued or running", [({}, stats["pending"])])
+        + render_metric("password_hash_rejected_total", "Hash/verify calls shed with 503",
+                        [({}, stats["rejected"])], kind="counter")
+        + render_metric("password_hash_pool_restarts_total", "Process pools replaced after a worker process died",
+                        [({}, stats["restarts"])], kind="counter")
+    )
+
+
+def _catalog_metrics():
+    stats = gift_catalog.stats()
+    return (
+        render_metric("gift_catalog_cache_hits_total", "GET /gifts served without a version check",
+                      [({}, stats["hits"])], kind="counter")
+        + render_metric("gift_catalog_reloads_total", "Gift catalog reloads after a version change",
+                        [({}, stats["reloads"])], kind="counter")
+    )
+
+
+def _phone_cache_metrics():
+    stats = phones.phone_cache.stats()
+    return (
+        render_metric("phone_lookup_cache_hits_total", "GET /customers/by-phone served from the phone cache",
+                      [({}, stats["hits"])], kind="counter")
+        + render_metric("phone_lookup_cache_misses_total", "GET /customers/by-phone looked up by phone key",
+                        [({}, stats["misses"])], kind="counter")
+    )
+
+
+def _replica_stats():
+    pool = async_replica_pool if async_replica_pool.replicas else replica_pool
+    return pool.stats()
+
+
+def _replica_metrics():
+    stats = _replica_stats()
+    if not stats["replicas"]:
+        return []
+    return (
+        render_metric("db_replica_healthy", "1 while the replica is in rotation",
+                      [({"replica": name}, int(r["healthy"])) for name, r in stats["replicas"].items()])
+        + render_metric("db_replica_reads_total", "Read sessions served by the replica",
+                        [({"replica": name}, r["reads"]) for name, r in stats["replicas"].items()], kind="counter")
+        + render_metric("db_replica_primary_fallbacks_total", "Read sessions sent to the primary, no replica healthy",
+                        [({}, stats["primary_fallbacks"])], kind="counter")
+    )
+
+
+def _earn_batch_stats():
+    batcher = earn_batching.async_batcher or earn_batching.batcher
+    return batcher.stats.as_dict() if batcher is not None else None
+
+
+def _earn_batch_metrics():
+    stats = _earn_batch_stats()
+    if stats is None:
+        return []
+    return (
+        render_metric("earn_batches_total", "Group-committed add-points batches", [({}, stats["batches"])], kind="counter")
+        + render_metric("earn_batched_total", "Add-points requests committed through a batch",
+                        [({}, stats["earns"])], kind="counter")
+        + render_metric("earn_batch_fallbacks_total", "Batches retried one earn at a time after failing",
+                        [({}, stats["fallbacks"])], kind="counter")
+    )
+
+
+@router.get("", dependencies=[Depends(require_metrics_token)])
+def metrics(format: str = Query("prometheus", pattern="^(prometheus|json)$")):
+    if format == "json":
+        return {"routes": profiling.summary(), "pools": pool_metrics.snapshot(), "password_hashing": hash_pool.stats(),
+                "gift_catalog": gift_catalog.stats(), "phone_cache": phones.phone_cache.stats(),
+                "replicas": _replica_stats(), "earn_batching": _earn_batch_stats()}
+    lines = (profiling.render_prometheus() + pool_metrics.render_prometheus() + _hash_pool_metrics()
+             + _catalog_metrics() + _phone_cache_metrics() + _replica_metrics() + _earn_batch_metrics())
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+def profile(reset: bool = Query(False), _: StaffPrincipal = Depends(require_admin)):
+    if profiling.profiler is None:
+        raise HTTPException(404, "Profiling is disabled; set PROFILE_ROUTE to enable it")
+    return PlainTextResponse(profiling.profiler.folded(reset=reset))
@@ -0,0 +1,29 @@
+import csv
+import io
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from .. import models, schemas
+from ..auth import get_current_staff
+from ..bulk_points import accrue_points, read_csv, read_ndjson, DEFAULT_CHUNK_SIZE
+
+router = APIRouter(prefix="/points", tags=["points"])
+
+
+@router.post("/bulk", response_model=schemas.BulkPointsReport)
+def bulk_add_points(
+    file: UploadFile = File(...),
+    format: str = Query(None, pattern="^(csv|ndjson)$"),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_db),
+    staff: models.Staff = Depends(get_current_staff),
+):
+    fmt = format or ("ndjson" if (file.filename or "").endswith((".ndjson", ".jsonl")) else "csv")
+    try:
+        stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        reader = read_ndjson(stream) if fmt == "ndjson" else read_csv(stream)
+        return accrue_points(db, reader, staff.id, chunk_size=chunk_size)
+    except (UnicodeDecodeError, csv.Error):
+        raise HTTPException(400, "Upload must be UTF-8 CSV or NDJSON")
@@ -1,10 +1,14 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
 
 from ..database import get_db
-from .. import models, schemas
+from ..replicas import get_read_db
+from .. import idempotency, models, redemption, schemas
 from ..auth import get_current_staff
+from ..pagination import apply_keyset, split_page, NEXT_CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(tags=["redemptions"])
 
@@ -12,51 +16,80 @@ router = APIRouter(tags=["redemptions"])
 @router.post("/redeem", response_model=schemas.RedemptionOut, status_code=201)
 def redeem_gift(
     data: schemas.RedemptionCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
     db: Session = Depends(get_db),
     staff: models.Staff = Depends(get_current_staff),
 ):
-    # Atomic row-level locks
-    customer = db.query(models.Customer).filter(models.Customer.id == data.customer_id).with_for_update().first()
-    if not customer:
-        raise HTTPException(404, "Customer not found")
-
-    gift = db.query(models.Gift).filter(models.Gift.id == data.gift_id).with_for_update().first()
-    if not gift:
-        raise HTTPException(404, "Gift not found")
-
-    if gift.stock <= 0:
-        raise HTTPException(400, "Gift is out of stock")
-
-    if customer.total_points < gift.points_required:
-        raise HTTPException(400, "Insufficient points for this gift")
-
-    # Deduct points & stock atomically
-    customer.total_points -= gift.points_required
-    gift.stock -= 1
-
-    redemption = models.Redemption(
-        customer_id=customer.id,
-        gift_id=gift.id,
-        staff_id=staff.id,
-        points_used=gift.points_required,
-    )
-    db.add(redemption)
-
-    # Always record a transaction
-    tx = models.PointTransaction(
-        customer_id=customer.id,
-        staff_id=staff.id,
-        type="redeem",
-        amount=-gift.points_required,
-        description=f"Redeemed: {gift.name}",
-    )
-    db.add(tx)
-
-    db.commit()
-    db.refresh(redemption)
-    return redemption
-
-
-@router.get("/redemptions", response_model=List[schemas.RedemptionOut])
-def list_redemptions(db: Session = Depends(get_db), _: models.Staff = Depends(get_current_staff)):
-    return db.query(models.Redemption).order_by(models.Redemption.created_at.desc()).all()
+    pending = idempotency.begin(db, staff.id, idempotency_key, request.url.path, data)
+    return redemption.redeem(db, data.customer_id, data.gift_id, staff.id, pending)
+
+
+def redemption_page_select(
+    gift_id: Optional[str],
+    customer_id: Optional[str],
+    staff_id: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    cursor: Optional[str],
+    limit: int,
+    expand: bool,
+):
+    """One page of the redemption log, newest first.
+
+    Served by ix_redemptions_gift_created / ix_redemptions_customer_created /
+    ix_redemptions_staff_created when filtering on gift, customer or staff, by
+    ix_redemptions_created_at_id otherwise.
+    With ``expand`` the gift and customer names come from the same query.
+    """
+    r = models.Redemption
+    stmt = select(r)
+    for column, value in ((r.gift_id, gift_id), (r.customer_id, customer_id), (r.staff_id, staff_id)):
+        if value is not None:
+            stmt = stmt.where(column == value)
+    if since is not None:
+        stmt = stmt.where(r.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(r.created_at < until)
+    if expand:
+        stmt = stmt.options(
+            joinedload(r.gift, innerjoin=True).load_only(models.Gift.name),
+            joinedload(r.customer, innerjoin=True).load_only(models.Customer.full_name),
+        )
+    return apply_keyset(stmt, r.created_at, r.id, cursor, limit)
+
+
+def redemption_page(rows: list, limit: int, expand: bool):
+    """Split ``redemption_page_select`` results into (redemptions, next_cursor)."""
+    rows, next_cursor = split_page(rows, limit)
+    if expand:
+        rows = [
+            schemas.RedemptionDetailOut(
+                **schemas.RedemptionOut.model_validate(r).model_dump(),
+                gift_name=r.gift.name,
+                customer_name=r.customer.full_name,
+            )
+            for r in rows
+        ]
+    return rows, next_cursor
+
+
+@router.get("/redemptions", response_model=List[schemas.RedemptionDetailOut], response_model_exclude_none=True)
+def list_redemptions(
+    response: Response,
+    gift_id: Optional[str] = Query(None),
+    customer_id: Optional[str] = Query(None),
+    staff_id: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    expand: bool = Query(False),
+    db: Session = Depends(get_read_db),
+    _: models.Staff = Depends(get_current_staff),
+):
+    stmt = redemption_page_select(gift_id, customer_id, staff_id, since, until, cursor, limit, expand)
+    rows, next_cursor = redemption_page(db.execute(stmt).scalars().all(), limit, expand)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
@@ -0,0 +1,140 @@
+"""One-off schema setup: tables, dashboard counters and cache version shards.
+
+Run once per deploy with ``python migrate.py`` before the workers start. Workers
+only repeat it themselves when ``DATABASE_AUTO_MIGRATE`` is on (the default, for
+local development); start.sh turns it off so that N workers do not each reflect
+every table on boot.
+
+With ``POINT_TRANSACTIONS_PARTITIONED`` on PostgreSQL, ``point_transactions`` is
+created partitioned and the coming months' partitions are added on every
+run; see ``app.partitions``.
+
+``create_all`` only creates what is missing and never alters an existing
+table, so ``upgrade`` brings a database created by an earlier release up to
+the models first: it adds the columns listed in ``ADDED_COLUMNS`` (filling
+``balance_after`` and ``phone_key`` on the rows already there), the values in
+``ADDED_ENUM_VALUES`` and any index missing from an existing table. Index
+builds block writes to their table, so upgrade large databases in a quiet
+window.
+"""
+import os
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from .database import Base, SessionLocal, engine
+from . import catalog, customer_import, ledger, models, partitions, stats
+
+DATABASE_AUTO_MIGRATE = os.getenv("DATABASE_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+# Columns added to tables that existed before them, in the order they were added
+ADDED_COLUMNS = (
+    models.Staff.__table__.c.token_version,
+    models.PointTransaction.__table__.c.external_ref,
+    models.PointTransaction.__table__.c.balance_after,
+    models.Customer.__table__.c.phone_key,
+    models.PointTransactionArchive.__table__.c.points_issued,
+)
+
+# Values added to PostgreSQL enum types after they were created
+ADDED_ENUM_VALUES = (
+    ("transaction_type", "expire"),
+)
+
+
+def _add_columns(conn: Connection) -> set:
+    inspector = inspect(conn)
+    ddl = conn.dialect.ddl_compiler(conn.dialect, None)
+    added = set()
+    for column in ADDED_COLUMNS:
+        table = column.table
+        if not inspector.has_table(table.name):
+            continue
+        if column.name in {c["name"] for c in inspector.get_columns(table.name)}:
+            continue
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl.get_column_specification(column)}"))
+        if column.unique and not column.index:
+            # What create_all makes a UNIQUE table constraint
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX {table.name}_{column.name}_key ON {table.name} ({column.name})"
+            ))
+        added.add(f"{table.name}.{column.name}")
+    return added
+
+
+def _add_enum_values() -> None:
+    if engine.dialect.name != "postgresql":
+        # Elsewhere an Enum is a plain VARCHAR
+        return
+    # ADD VALUE cannot run inside a transaction block before PostgreSQL 12
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for type_name, value in ADDED_ENUM_VALUES:
+            # A type that does not exist yet is created whole by create_all
+            if conn.execute(text("SELECT 1 FROM pg_type WHERE typname = :name"), {"name": type_name}).first():
+                conn.execute(text(f"ALTER TYPE {type_name} ADD VALUE IF NOT EXISTS '{value}'"))
+
+
+def _index_names(conn: Connection) -> set:
+    # Reflection skips expression indexes on SQLite; index names are unique per schema in both
+    if conn.dialect.name == "postgresql":
+        return set(conn.execute(text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")).scalars())
+    return set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+
+
+def _add_indexes(conn: Connection, skip: tuple) -> List[str]:
+    inspector = inspect(conn)
+    existing = _index_names(conn)
+    for table in Base.metadata.sorted_tables:
+        if table in skip or not inspector.has_table(table.name):
+            continue
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            if conn.dialect.name == "postgresql" and index.dialect_options["postgresql"]["ops"]:
+                # The trigram indexes; create_all installs it from a before_create hook on customers
+                conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            # Honors ddl_if, so the other dialect's indexes are skipped
+            index.create(conn)
+    return sorted(_index_names(conn) - existing)
+
+
+def upgrade() -> List[str]:
+    """Add the columns, enum values and indexes that ``create_all`` leaves out of existing tables; return what was done."""
+    partitioned = False
+    if partitions.enabled():
+        with SessionLocal() as db:
+            partitioned = partitions.table_kind(db) == "partitioned"
+    with engine.begin() as conn:
+        added = _add_columns(conn)
+        # The partitioned ledger carries its own set of indexes; see app.partitions
+        indexes = _add_indexes(conn, skip=(partitions.transactions,) if partitioned else ())
+    _add_enum_values()
+    done = [f"Added column {name}" for name in sorted(added)] + [f"Created index {name}" for name in indexes]
+    if "point_transactions.balance_after" in added:
+        filled = ledger.backfill_balance_after()["filled"]
+        done.append(f"Filled balance_after on {filled} ledger entries")
+    if "customers.phone_key" in added:
+        with SessionLocal() as db:
+            report = customer_import.backfill_phone_keys(db)
+        done.append(
+            f"Filled phone_key on {report['filled']} customers ({report['invalid']} invalid numbers, "
+            f"{report['conflicts']} shared with another customer; see backfill_phone_keys.py)"
+        )
+    return done
+
+
+def migrate() -> List[str]:
+    """Bring the schema up to the models; return the upgrade steps taken on existing tables."""
+    done = upgrade()
+    partitioned = partitions.enabled()
+    # The partitioned ledger is left to app.partitions, after the customers and staff it references
+    Base.metadata.create_all(bind=engine, tables=[
+        table for table in Base.metadata.sorted_tables if not (partitioned and table is partitions.transactions)
+    ])
+    with SessionLocal() as db:
+        if partitioned:
+            partitions.setup(db)
+        stats.ensure_counters(db)
+        catalog.ensure_versions(db)
+    return done
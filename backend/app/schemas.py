@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import Optional, List
+from datetime import date, datetime
+from typing import Dict, Optional, List
 from pydantic import BaseModel, EmailStr
 
 
@@ -57,6 +57,36 @@ class PointsRequest(BaseModel):
     description: str
 
 
+class BulkRowError(BaseModel):
+    line: int
+    external_ref: Optional[str] = None
+    error: str
+
+
+class BulkPointsReport(BaseModel):
+    processed: int
+    credited: int
+    duplicates: int
+    failed: int
+    points_credited: int
+    errors: List[BulkRowError]
+
+
+class ImportRowError(BaseModel):
+    line: int
+    phone_number: Optional[str] = None
+    error: str
+
+
+class CustomerImportReport(BaseModel):
+    processed: int
+    inserted: int
+    updated: int
+    unchanged: int
+    rejected: int
+    errors: List[ImportRowError]
+
+
 # ─── Gift ───────────────────────────────────────────────
 class GiftCreate(BaseModel):
     name: str
@@ -102,6 +132,12 @@ class RedemptionOut(BaseModel):
         from_attributes = True
 
 
+class RedemptionDetailOut(RedemptionOut):
+    # Only filled in by GET /redemptions?expand=true
+    gift_name: Optional[str] = None
+    customer_name: Optional[str] = None
+
+
 # ─── Transaction ────────────────────────────────────────
 class TransactionOut(BaseModel):
     id: str
@@ -110,15 +146,69 @@ class TransactionOut(BaseModel):
     type: str
     amount: int
     description: str
+    balance_after: Optional[int] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class BalanceOut(BaseModel):
+    customer_id: str
+    as_of: datetime
+    balance: int
+    snapshot_as_of: Optional[datetime] = None
+
+
+# ─── Staff activity ─────────────────────────────────────
+class ActivityOut(BaseModel):
+    source: str  # "transaction" or "redemption"
+    id: str
+    staff_id: str
+    customer_id: str
+    type: str  # the transaction type, or "redemption"
+    # Signed change to the customer's points (a redemption's is -points_used)
+    amount: int
+    description: Optional[str] = None
+    gift_id: Optional[str] = None
+    created_at: datetime
+
+
 # ─── Dashboard ──────────────────────────────────────────
 class DashboardStats(BaseModel):
     total_customers: int
     total_points_issued: int
     total_redemptions: int
     active_gifts: int
+
+
+class TimeseriesBucket(BaseModel):
+    period: date
+    group_id: Optional[str] = None
+    group_name: Optional[str] = None
+    values: Dict[str, int]
+
+
+class Timeseries(BaseModel):
+    metric: str
+    interval: str
+    start: date
+    end: date
+    # Rows created before this are counted (None until the rollups are first refreshed)
+    through: Optional[datetime] = None
+    buckets: List[TimeseriesBucket]
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    customer_id: str
+    full_name: str
+    points: int
+
+
+class Leaderboard(BaseModel):
+    metric: str
+    start: date
+    end: date
+    through: Optional[datetime] = None
+    entries: List[LeaderboardEntry]
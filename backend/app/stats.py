@@ -0,0 +1,123 @@
+"""Incrementally maintained dashboard totals.
+
+Every ORM flush that inserts or deletes customers, earn transactions,
+redemptions or gifts (or moves a gift's stock across zero) adds its deltas to
+one randomly chosen ``dashboard_counters`` shard in the same transaction, so
+the totals commit or roll back together with the rows they describe. Writers
+spread over ``DASHBOARD_COUNTER_SHARDS`` rows instead of queueing on one, and
+``/dashboard/stats`` sums that handful of rows instead of scanning the tables.
+
+Core-level bulk writes bypass the ORM and must call ``apply_deltas`` themselves.
+``reconcile`` rebuilds the counters from the base tables.
+"""
+import os
+import random
+from collections import Counter
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+DASHBOARD_COUNTER_SHARDS = max(1, int(os.getenv("DASHBOARD_COUNTER_SHARDS", 8)))
+
+COUNTER_FIELDS = ("total_customers", "total_points_issued", "total_redemptions", "active_gifts")
+
+
+def apply_deltas(db: Session, **deltas: int) -> None:
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    table = models.DashboardCounter.__table__
+    shard = random.randrange(DASHBOARD_COUNTER_SHARDS)
+    stmt = (
+        update(table)
+        .where(table.c.shard == shard)
+        .values({name: table.c[name] + delta for name, delta in deltas.items()})
+    )
+    if db.connection().execute(stmt).rowcount == 0:
+        # Counters were never initialised; fold the delta into a fresh shard row.
+        db.connection().execute(
+            table.insert().values(shard=shard, **{name: deltas.get(name, 0) for name in COUNTER_FIELDS})
+        )
+
+
+def _gift_active(gift: models.Gift, committed: bool) -> bool:
+    stock = gift.stock
+    if committed:
+        history = inspect(gift).attrs.stock.history
+        if history.deleted:
+            stock = history.deleted[0]
+    return (stock or 0) > 0
+
+
+@event.listens_for(Session, "after_flush")
+def _track_counters(session: Session, flush_context) -> None:
+    deltas = Counter()
+    for obj, sign in [(o, 1) for o in session.new] + [(o, -1) for o in session.deleted]:
+        if isinstance(obj, models.Customer):
+            deltas["total_customers"] += sign
+        elif isinstance(obj, models.PointTransaction):
+            if obj.type == "earn":
+                deltas["total_points_issued"] += sign * obj.amount
+        elif isinstance(obj, models.Redemption):
+            deltas["total_redemptions"] += sign
+        elif isinstance(obj, models.Gift):
+            deltas["active_gifts"] += sign * _gift_active(obj, committed=sign < 0)
+    for obj in session.dirty:
+        if isinstance(obj, models.Gift):
+            deltas["active_gifts"] += _gift_active(obj, False) - _gift_active(obj, True)
+    apply_deltas(session, **deltas)
+
+
+def read_stats(db: Session) -> dict:
+    table = models.DashboardCounter.__table__
+    row = db.query(
+        *[func.coalesce(func.sum(table.c[name]), 0).label(name) for name in COUNTER_FIELDS]
+    ).one()
+    return {name: int(getattr(row, name)) for name in COUNTER_FIELDS}
+
+
+def compute_stats(db: Session) -> dict:
+    """Full-scan totals straight from the base tables, plus the points earned in archived months."""
+    issued = select(func.coalesce(func.sum(models.PointTransaction.amount), 0)).where(
+        models.PointTransaction.type == "earn"
+    ).scalar_subquery()
+    archived = select(func.coalesce(func.sum(models.PointTransactionArchive.points_issued), 0)).scalar_subquery()
+    return {
+        "total_customers": db.query(func.count(models.Customer.id)).scalar(),
+        # One statement, so a month archived meanwhile is counted in exactly one of the two
+        "total_points_issued": int(db.execute(select(issued + archived)).scalar()),
+        "total_redemptions": db.query(func.count(models.Redemption.id)).scalar(),
+        "active_gifts": db.query(func.count(models.Gift.id)).filter(models.Gift.stock > 0).scalar(),
+    }
+
+
+def reconcile(db: Session) -> dict:
+    """Recompute the counters from scratch and return the totals before and after."""
+    table = models.DashboardCounter.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        # Writers block on their counter UPDATE until we commit, so every row is
+        # counted exactly once: either in our scan or in their later delta.
+        db.connection().exec_driver_sql("LOCK TABLE dashboard_counters IN EXCLUSIVE MODE")
+    before = read_stats(db)
+    after = compute_stats(db)
+    db.execute(table.delete())
+    db.execute(table.insert(), [
+        {"shard": shard, **{name: (after[name] if shard == 0 else 0) for name in COUNTER_FIELDS}}
+        for shard in range(DASHBOARD_COUNTER_SHARDS)
+    ])
+    db.commit()
+    return {"before": before, "after": after}
+
+
+def ensure_counters(db: Session) -> None:
+    """Seed the counters on first start against an existing database."""
+    if db.query(models.DashboardCounter.shard).first() is not None:
+        return
+    try:
+        reconcile(db)
+    except IntegrityError:
+        # Another worker initialised them first
+        db.rollback()
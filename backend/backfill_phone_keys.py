@@ -0,0 +1,23 @@
+import argparse
+
+from app.customer_import import DEFAULT_CHUNK_SIZE, backfill_phone_keys
+from app.database import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Set the normalized phone key on customers that have none yet")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    def show(conflict):
+        print(f"{conflict['customer_id']}  {conflict['phone_number']!r} is {conflict['phone_key']}, "
+              f"shared with another customer", flush=True)
+
+    with SessionLocal() as db:
+        report = backfill_phone_keys(db, args.chunk_size, on_conflict=show)
+    print(f"{report['filled']} phone keys set, {report['conflicts']} conflicts, "
+          f"{report['invalid']} numbers that are not phone numbers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Authenticated request throughput against a running server.
+
+Start the server the way production does (``./start.sh`` runs 4 gunicorn
+workers), then run this from backend/:
+
+    python -m benchmarks.bench_auth_throughput --url http://127.0.0.1:8000
+
+For the "before" number restart the server with STAFF_CACHE_TTL_SECONDS=0,
+which disables the staff principal cache so every request hits the database.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import httpx
+
+
+def worker(url: str, headers: dict, deadline: float, latencies: list, errors: list) -> None:
+    with httpx.Client(base_url=url, headers=headers) as client:
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            r = client.get("/auth/me")
+            latencies.append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                errors.append(r.status_code)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=15)
+    args = parser.parse_args()
+
+    token = httpx.post(
+        f"{args.url}/auth/login", data={"username": args.username, "password": args.password}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(args.url, headers, deadline, latencies, errors))
+        for _ in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    print(f"requests: {len(latencies)}  errors: {len(errors)}")
+    print(f"throughput: {len(latencies) / args.seconds:.1f} req/s")
+    print(f"latency: p50 {statistics.median(latencies) * 1000:.2f} ms  p99 {p99:.2f} ms")
+    stats = httpx.get(f"{args.url}/auth/cache-stats", headers=headers)
+    if stats.status_code == 200:
+        print(f"cache (one worker): {stats.json()}")
+
+
+if __name__ == "__main__":
+    main()
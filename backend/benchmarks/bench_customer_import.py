@@ -0,0 +1,85 @@
+"""Throughput of the bulk customer import vs one create_customer-style insert per row.
+
+Usage (from backend/):
+    python -m benchmarks.bench_customer_import [--rows 200000 --existing 0.2 --chunk-size 5000]
+
+Generates a member list in which ``--existing`` of the phone numbers are
+already registered and 1% of the rows are invalid or repeated, imports it with
+each merge policy, and times the per-row path on a small sample for comparison.
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from app.database import engine, Base, SessionLocal  # noqa: E402
+from app.customer_import import MERGE_POLICIES, import_customers  # noqa: E402
+from app import models  # noqa: E402
+
+
+def member_list(rows: int):
+    for i in range(rows):
+        line = i + 2
+        if i % 100 == 99:
+            yield line, {"full_name": f"Member {i}", "phone_number": "not a phone"}
+        elif i % 100 == 98:
+            yield line, {"full_name": f"Member {i}", "phone_number": f"09{i - 1:08d}"}
+        else:
+            # Some spelled with separators, as legacy lists often are
+            phone = f"09{i:08d}" if i % 3 else f"09 {i // 10000:04d}-{i % 10000:04d}"
+            yield line, {"full_name": f"Member  {i}", "phone_number": phone, "email": f"M{i}@Example.com"}
+
+
+def reset(existing: int) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for start in range(0, existing, 50_000):
+            conn.execute(models.Customer.__table__.insert(), [
+                {"id": models.new_uuid(), "full_name": f"Old {i}", "phone_number": f"09{i:08d}", "total_points": 0}
+                for i in range(start, min(start + 50_000, existing))
+            ])
+
+
+def per_row(rows: int) -> float:
+    """The create_customer path: a duplicate check then one ORM insert and commit per row."""
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    for i in range(rows):
+        phone = f"08{i:08d}"
+        if db.query(models.Customer).filter(models.Customer.phone_number == phone).first() is None:
+            db.add(models.Customer(full_name=f"Member {i}", phone_number=phone))
+            db.commit()
+    elapsed = time.perf_counter() - t0
+    db.close()
+    return rows / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--existing", type=float, default=0.2)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--per-row-sample", type=int, default=2000)
+    args = parser.parse_args()
+    existing = int(args.rows * args.existing)
+
+    print(f"{'path':<22} {'rows/s':>10} {'inserted':>9} {'updated':>8} {'unchanged':>10} {'rejected':>9}")
+    for policy in MERGE_POLICIES:
+        reset(existing)
+        db = SessionLocal()
+        t0 = time.perf_counter()
+        report = import_customers(db, member_list(args.rows), policy, args.chunk_size)
+        elapsed = time.perf_counter() - t0
+        db.close()
+        print(f"{'import ' + policy:<22} {args.rows / elapsed:>10.0f} {report['inserted']:>9} "
+              f"{report['updated']:>8} {report['unchanged']:>10} {report['rejected']:>9}")
+    reset(0)
+    print(f"{'per-row create':<22} {per_row(args.per_row_sample):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Latency of GET /customers as the customers table grows.
+
+Usage (from backend/):
+    python -m benchmarks.bench_customers_list [--sizes 1000,10000,100000]
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import get_current_staff  # noqa: E402
+from app.database import engine, Base  # noqa: E402
+from app.main import app  # noqa: E402
+from app import models  # noqa: E402
+
+
+def grow_to(size: int, current: int) -> None:
+    base = datetime(2024, 1, 1)
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "full_name": f"Member {i:07d}",
+            "phone_number": f"09{i:08d}",
+            "total_points": 0,
+            "created_at": base + timedelta(seconds=i),
+        }
+        for i in range(current, size)
+    ]
+    with engine.begin() as conn:
+        for start in range(0, len(rows), 10_000):
+            conn.execute(models.Customer.__table__.insert(), rows[start:start + 10_000])
+
+
+def timed(client: TestClient, url: str, params: dict, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        r = client.get(url, params=params)
+        samples.append((time.perf_counter() - t0) * 1000)
+        assert r.status_code == 200, r.text
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    app.dependency_overrides[get_current_staff] = lambda: None
+    client = TestClient(app)
+
+    current = 0
+    print(f"{'rows':>10} {'first page':>12} {'page 20':>10} {'search':>10}  (median ms)")
+    for size in (int(s) for s in args.sizes.split(",")):
+        grow_to(size, current)
+        current = size
+        first = timed(client, "/customers", {"limit": 50}, args.runs)
+        cursor = None
+        for _ in range(20):
+            r = client.get("/customers", params={"limit": 50, **({"cursor": cursor} if cursor else {})})
+            cursor = r.headers.get("X-Next-Cursor") or cursor
+        deep = timed(client, "/customers", {"limit": 50, "cursor": cursor}, args.runs)
+        search = timed(client, "/customers", {"limit": 50, "search": "Member 00005"}, args.runs)
+        print(f"{size:>10} {first:>12.2f} {deep:>10.2f} {search:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
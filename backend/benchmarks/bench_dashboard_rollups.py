@@ -0,0 +1,132 @@
+"""Dashboard time series and leaderboard: scanning the base tables vs reading the rollups.
+
+Usage (from backend/):
+    python -m benchmarks.bench_dashboard_rollups [--transactions 5000000 --days 730]
+
+Seeds --transactions ledger entries spread over --days, rolls them up, then
+times a 30-day daily series and a 30-day top-10 leaderboard both ways, plus an
+incremental refresh after one more day of traffic. Uses DATABASE_URL when set,
+otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import func, select  # noqa: E402
+
+from app.database import engine, Base, SessionLocal  # noqa: E402
+from app import models, rollups  # noqa: E402
+from benchmarks.bench_export import new_id  # noqa: E402
+
+TYPES = ("earn", "earn", "earn", "redeem", "manual_adjust")
+
+
+def seed(transactions: int, customers: int, start: datetime, days: int, staff_ids, customer_ids) -> None:
+    span = days * 86400
+    batch = 50_000
+    for first in range(0, transactions, batch):
+        rows = []
+        for i in range(first, min(first + batch, transactions)):
+            type_ = TYPES[i % len(TYPES)]
+            rows.append({
+                "id": new_id(),
+                "customer_id": customer_ids[random.randrange(customers)],
+                "staff_id": staff_ids[i % len(staff_ids)],
+                "type": type_,
+                "amount": -10 if type_ == "redeem" else 10,
+                "description": "bench",
+                "created_at": start + timedelta(seconds=i * span // transactions),
+            })
+        with engine.begin() as conn:
+            conn.execute(models.PointTransaction.__table__.insert(), rows)
+
+
+def scan_timeseries(db, start, end):
+    t = models.PointTransaction.__table__
+    day = func.date(t.c.created_at)
+    return db.execute(
+        select(day, t.c.type, func.count(), func.sum(t.c.amount))
+        .where(t.c.created_at >= start, t.c.created_at < end)
+        .group_by(day, t.c.type)
+    ).all()
+
+
+def scan_leaderboard(db, start, end):
+    t = models.PointTransaction.__table__
+    total = func.sum(t.c.amount)
+    return db.execute(
+        select(t.c.customer_id, total)
+        .where(t.c.type == "earn", t.c.created_at >= start, t.c.created_at < end)
+        .group_by(t.c.customer_id)
+        .order_by(total.desc())
+        .limit(10)
+    ).all()
+
+
+def timed(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        with SessionLocal() as db:
+            t0 = time.perf_counter()
+            fn(db)
+            samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=5_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--staff", type=int, default=20)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    random.seed(0)
+    staff_ids = [new_id() for _ in range(args.staff)]
+    customer_ids = [new_id() for _ in range(args.customers)]
+    with engine.begin() as conn:
+        conn.execute(models.Staff.__table__.insert(), [
+            {"id": sid, "username": f"bench{i}", "password_hash": "x"} for i, sid in enumerate(staff_ids)
+        ])
+        conn.execute(models.Customer.__table__.insert(), [
+            {"id": cid, "full_name": f"Member {i}", "phone_number": f"09{i:08d}", "total_points": 0}
+            for i, cid in enumerate(customer_ids)
+        ])
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=args.days)
+    t0 = time.perf_counter()
+    seed(args.transactions, args.customers, start, args.days, staff_ids, customer_ids)
+    print(f"seeded {args.transactions} transactions over {args.days} days in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    report = rollups.refresh_rollups(upto=today)
+    print(f"initial rollup ({report['steps']} days):  {time.perf_counter() - t0:10.2f} s")
+
+    per_day = args.transactions // args.days
+    seed(per_day, args.customers, today, 1, staff_ids, customer_ids)
+    t0 = time.perf_counter()
+    rollups.refresh_rollups(upto=today + timedelta(days=1))
+    print(f"incremental refresh ({per_day} new rows): {(time.perf_counter() - t0) * 1000:10.2f} ms")
+
+    last = today.date()
+    first = last - timedelta(days=29)
+    since, until = today - timedelta(days=29), today + timedelta(days=1)
+    print(f"{'30-day daily series, base table scan':<40} {timed(lambda db: scan_timeseries(db, since, until), args.runs):10.2f} ms")
+    print(f"{'30-day daily series, rollups':<40} {timed(lambda db: rollups.timeseries(db, 'points', 'day', first, last), args.runs):10.2f} ms")
+    print(f"{'30-day top 10, base table scan':<40} {timed(lambda db: scan_leaderboard(db, since, until), args.runs):10.2f} ms")
+    print(f"{'30-day top 10, rollups':<40} {timed(lambda db: rollups.leaderboard(db, 'earned', first, last), args.runs):10.2f} ms")
+    print(f"{'2-year monthly series, rollups':<40} "
+          f"{timed(lambda db: rollups.timeseries(db, 'points', 'month', last - timedelta(days=729), last), args.runs):10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Dashboard stats: full-table aggregates vs the maintained counters.
+
+Usage (from backend/):
+    python -m benchmarks.bench_dashboard_stats [--transactions 10000000]
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from app.database import engine, Base, SessionLocal  # noqa: E402
+from app import models, stats  # noqa: E402
+
+
+def seed(transactions: int, customers: int) -> None:
+    staff_id = str(uuid.uuid4())
+    customer_ids = [str(uuid.uuid4()) for _ in range(customers)]
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(models.Staff.__table__.insert(), [{"id": staff_id, "username": "bench", "password_hash": "x"}])
+        conn.execute(models.Customer.__table__.insert(), [
+            {"id": cid, "full_name": f"Member {i}", "phone_number": f"09{i:08d}", "total_points": 0}
+            for i, cid in enumerate(customer_ids)
+        ])
+    batch = 50_000
+    for start in range(0, transactions, batch):
+        with engine.begin() as conn:
+            conn.execute(models.PointTransaction.__table__.insert(), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "customer_id": customer_ids[i % customers],
+                    "staff_id": staff_id,
+                    "type": "earn" if i % 4 else "redeem",
+                    "amount": 10 if i % 4 else -10,
+                    "description": "bench",
+                    "created_at": now,
+                }
+                for i in range(start, min(start + batch, transactions))
+            ])
+
+
+def timed(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        db = SessionLocal()
+        t0 = time.perf_counter()
+        fn(db)
+        samples.append((time.perf_counter() - t0) * 1000)
+        db.close()
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=10_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    t0 = time.perf_counter()
+    seed(args.transactions, args.customers)
+    print(f"seeded {args.transactions} transactions in {time.perf_counter() - t0:.1f}s")
+
+    db = SessionLocal()
+    stats.reconcile(db)
+    assert stats.read_stats(db) == stats.compute_stats(db)
+    db.close()
+
+    print(f"full-table aggregates: {timed(stats.compute_stats, args.runs):10.2f} ms (median)")
+    print(f"counter read:          {timed(stats.read_stats, args.runs):10.2f} ms (median)")
+
+
+if __name__ == "__main__":
+    main()
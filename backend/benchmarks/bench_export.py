@@ -0,0 +1,122 @@
+"""Throughput and memory of streaming point_transactions out as CSV and Parquet.
+
+Usage (from backend/):
+    python -m benchmarks.bench_export [--rows 10000000 --batch-size 10000]
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file. Peak Python
+allocations (tracemalloc) are reported per export; they should stay flat as
+--rows grows. tracemalloc slows the exports down, so rows/s is measured in a
+separate run without it.
+"""
+import argparse
+import os
+import re
+import resource
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from app.database import engine, Base  # noqa: E402
+from app import exports, models  # noqa: E402
+
+BASE = datetime(2020, 1, 1)
+TYPES = ("earn", "earn", "earn", "redeem", "manual_adjust")
+# Hex that parses as a number ("1234...", "12e34...") is stored as REAL by SQLite's
+# numeric affinity and cannot be read back as a UUID; at 10M rows that happens
+NUMERIC_HEX = re.compile(r"\d*e?\d*")
+
+
+def new_id() -> str:
+    while True:
+        value = uuid.uuid4()
+        if not NUMERIC_HEX.fullmatch(value.hex):
+            return str(value)
+
+
+def populate(rows: int, customers: int) -> None:
+    staff_id = new_id()
+    ids = [new_id() for _ in range(customers)]
+    with engine.begin() as conn:
+        conn.execute(models.Staff.__table__.insert(), {
+            "id": staff_id, "username": "bench", "password_hash": "-", "role": "staff",
+        })
+        conn.execute(models.Customer.__table__.insert(), [
+            {"id": cid, "full_name": f"Member {i}", "phone_number": f"09{i:08d}", "created_at": BASE}
+            for i, cid in enumerate(ids)
+        ])
+        batch = []
+        for i in range(rows):
+            batch.append({
+                "id": new_id(), "customer_id": ids[i % customers], "staff_id": staff_id,
+                "type": TYPES[i % len(TYPES)], "amount": 10, "description": "Purchase",
+                "balance_after": 10 * (i // customers + 1), "created_at": BASE + timedelta(seconds=i),
+            })
+            if len(batch) == 50_000:
+                conn.execute(models.PointTransaction.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(models.PointTransaction.__table__.insert(), batch)
+
+
+def export(fmt: str, path: str, batch_size: int) -> int:
+    stmt = exports.export_query("transactions")
+    if fmt == "parquet":
+        return exports.write_parquet(stmt, path, batch_size)
+    total = 0
+
+    def count(n):
+        nonlocal total
+        total = n
+
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        for chunk in exports.iter_csv(stmt, batch_size, on_batch=count):
+            out.write(chunk)
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=exports.EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    t0 = time.perf_counter()
+    populate(args.rows, min(args.customers, args.rows))
+    print(f"populated {args.rows} transactions in {time.perf_counter() - t0:.1f}s\n")
+
+    formats = ["csv"]
+    try:
+        import pyarrow  # noqa: F401
+        formats.append("parquet")
+    except ImportError:
+        print("pyarrow not installed, skipping Parquet\n")
+
+    out_dir = tempfile.mkdtemp()
+    print(f"{'format':<8} {'rows':>10} {'seconds':>8} {'rows/s':>10} {'MiB out':>8} {'peak alloc MiB':>15}")
+    for fmt in formats:
+        path = os.path.join(out_dir, f"transactions.{fmt}")
+        t0 = time.perf_counter()
+        rows = export(fmt, path, args.batch_size)
+        elapsed = time.perf_counter() - t0
+        assert rows == args.rows, (rows, args.rows)
+        tracemalloc.start()
+        export(fmt, path, args.batch_size)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size = os.path.getsize(path)
+        print(f"{fmt:<8} {rows:>10} {elapsed:>8.1f} {rows / elapsed:>10.0f} "
+              f"{size / 2**20:>8.1f} {peak / 2**20:>15.1f}")
+    # ru_maxrss is in KiB on Linux
+    print(f"\nprocess max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB "
+          f"(includes populating)")
+
+
+if __name__ == "__main__":
+    main()
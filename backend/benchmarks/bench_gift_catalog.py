@@ -0,0 +1,76 @@
+"""Latency of GET /gifts: uncached reload vs cached body vs 304 revalidation.
+
+Usage (from backend/):
+    python -m benchmarks.bench_gift_catalog [--gifts 200]
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import get_current_staff  # noqa: E402
+from app.catalog import gift_catalog  # noqa: E402
+from app.database import engine, Base  # noqa: E402
+from app.main import app  # noqa: E402
+from app import models  # noqa: E402
+
+
+def timed(client: TestClient, headers: dict, runs: int, status: int, before=None) -> float:
+    samples = []
+    for _ in range(runs):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        r = client.get("/gifts", headers=headers)
+        samples.append((time.perf_counter() - t0) * 1000)
+        assert r.status_code == status, r.text
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gifts", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    base = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.Gift.__table__.insert(), [
+            {
+                "id": str(uuid.uuid4()),
+                "name": f"Gift {i}",
+                "description": "A reasonably long description of the gift shown on the redemption screen.",
+                "points_required": 100 + i,
+                "stock": 50,
+                "created_at": base + timedelta(minutes=i),
+            }
+            for i in range(args.gifts)
+        ])
+    app.dependency_overrides[get_current_staff] = lambda: None
+    client = TestClient(app)
+
+    def force_reload():
+        gift_catalog.version = None
+        gift_catalog.invalidate()
+
+    etag = client.get("/gifts").headers["ETag"]
+    print(f"{'case':<22} {'median ms':>10}")
+    print(f"{'reload from database':<22} {timed(client, {}, args.runs, 200, force_reload):>10.3f}")
+    print(f"{'version check only':<22} {timed(client, {}, args.runs, 200, gift_catalog.invalidate):>10.3f}")
+    print(f"{'cached body':<22} {timed(client, {}, args.runs, 200):>10.3f}")
+    print(f"{'304 Not Modified':<22} {timed(client, {'If-None-Match': etag}, args.runs, 304):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Point-in-time balances with and without snapshots, and full verification throughput.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ledger [--customers 10000 --per-customer 50 --long-history 500000]
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from app.database import engine, Base, SessionLocal  # noqa: E402
+from app import ledger, models  # noqa: E402
+
+BASE = datetime(2020, 1, 1)
+
+
+def populate(customers: int, per_customer: int, long_history: int) -> str:
+    staff_id = str(uuid.uuid4())
+    with engine.begin() as conn:
+        conn.execute(models.Staff.__table__.insert(), {
+            "id": staff_id, "username": "bench", "password_hash": "-", "role": "staff",
+        })
+        sizes = [long_history] + [per_customer] * (customers - 1)
+        ids = [str(uuid.uuid4()) for _ in sizes]
+        conn.execute(models.Customer.__table__.insert(), [
+            {"id": cid, "full_name": f"Member {i}", "phone_number": f"09{i:08d}",
+             "total_points": 10 * n, "created_at": BASE}
+            for i, (cid, n) in enumerate(zip(ids, sizes))
+        ])
+        batch = []
+        for cid, n in zip(ids, sizes):
+            for i in range(n):
+                batch.append({
+                    "id": str(uuid.uuid4()), "customer_id": cid, "staff_id": staff_id, "type": "earn",
+                    "amount": 10, "description": "Purchase", "balance_after": 10 * (i + 1),
+                    "created_at": BASE + timedelta(minutes=i),
+                })
+                if len(batch) == 50_000:
+                    conn.execute(models.PointTransaction.__table__.insert(), batch)
+                    batch = []
+        if batch:
+            conn.execute(models.PointTransaction.__table__.insert(), batch)
+    return ids[0]
+
+
+def timed(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--per-customer", type=int, default=50)
+    parser.add_argument("--long-history", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    loyal = populate(args.customers, args.per_customer, args.long_history)
+    as_of = BASE + timedelta(minutes=args.long_history - 10)
+
+    def point_in_time():
+        with SessionLocal() as db:
+            ledger.balance_as_of(db, loyal, as_of)
+
+    print(f"{'step':<36} {'ms':>10}")
+    print(f"{'balance as of X, no snapshot':<36} {timed(point_in_time, args.runs):>10.2f}")
+    t0 = time.perf_counter()
+    result = ledger.snapshot_balances(as_of - timedelta(minutes=100), workers=args.workers)
+    step = f"snapshot {result['snapshots']} customers"
+    print(f"{step:<36} {(time.perf_counter() - t0) * 1000:>10.2f}")
+    print(f"{'balance as of X, from snapshot':<36} {timed(point_in_time, args.runs):>10.2f}")
+    for workers in sorted({1, args.workers}):
+        t0 = time.perf_counter()
+        report = ledger.verify_balances(workers=workers)
+        elapsed = (time.perf_counter() - t0) * 1000
+        step = f"verify {report['customers']} customers, {workers} workers"
+        print(f"{step:<36} {elapsed:>10.2f}")
+        assert report["drifted"] == 0, report["drifts"][:5]
+
+
+if __name__ == "__main__":
+    main()
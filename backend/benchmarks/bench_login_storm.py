@@ -0,0 +1,85 @@
+"""Effect of a login storm on the latency of other routes.
+
+Runs normal traffic alone, then the same traffic alongside a burst of
+concurrent logins, and compares the p99 of the normal routes. Start the server
+first (e.g. ``./start.sh``), then from backend/:
+
+    python -m benchmarks.bench_login_storm --url http://127.0.0.1:8000 --logins 200
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+NORMAL_ROUTES = ("/gifts", "/customers?limit=20", "/dashboard/stats", "/auth/me")
+
+
+async def normal_traffic(client: httpx.AsyncClient, seconds: float, concurrency: int) -> list:
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def user(i: int):
+        n = i
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            await client.get(NORMAL_ROUTES[n % len(NORMAL_ROUTES)])
+            latencies.append(time.perf_counter() - t0)
+            n += 1
+
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return sorted(latencies)
+
+
+async def login_storm(url: str, seconds: float, concurrency: int, username: str, password: str) -> Counter:
+    outcomes = Counter()
+    deadline = time.perf_counter() + seconds
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        async def tablet():
+            while time.perf_counter() < deadline:
+                r = await client.post("/auth/login", data={"username": username, "password": password})
+                outcomes[r.status_code] += 1
+                if r.status_code == 503:
+                    await asyncio.sleep(float(r.headers.get("Retry-After", 1)))
+
+        await asyncio.gather(*(tablet() for _ in range(concurrency)))
+    return outcomes
+
+
+def p(latencies: list, q: float) -> float:
+    return latencies[max(0, int(len(latencies) * q) - 1)] * 1000 if latencies else 0.0
+
+
+async def run(args) -> None:
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        token = (await client.post(
+            "/auth/login", data={"username": args.username, "password": args.password}
+        )).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        baseline = await normal_traffic(client, args.seconds, args.concurrency)
+        storm, outcomes = await asyncio.gather(
+            normal_traffic(client, args.seconds, args.concurrency),
+            login_storm(args.url, args.seconds, args.logins, args.username, args.password),
+        )
+
+    print(f"{'phase':<12} {'requests':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, lat in (("baseline", baseline), ("login storm", storm)):
+        print(f"{name:<12} {len(lat):>9} {p(lat, 0.5):>9.2f} {p(lat, 0.99):>9.2f}")
+    print("login responses:", dict(outcomes))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--concurrency", type=int, default=16, help="normal-traffic clients")
+    parser.add_argument("--logins", type=int, default=200, help="concurrent logging-in tablets")
+    parser.add_argument("--seconds", type=float, default=15)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Counter lookups by phone number: GET /customers/by-phone vs the search list.
+
+Usage (from backend/):
+    python -m benchmarks.bench_phone_lookup [--customers 1000000 --lookups 2000]
+
+Registers --customers members with mixed phone formats, checks that a phone
+key lookup reads ix_customers_phone_key (the run exits non-zero otherwise),
+then times looking up random members as a cashier types them (with or
+without the country code, with spaces): through ``customer_by_phone`` with
+a cold and a warm phone cache, through the HTTP route, and through
+GET /customers?search=, which is what the POS did before. Uses DATABASE_URL
+when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.auth import StaffPrincipal, get_current_staff  # noqa: E402
+from app.database import engine, Base, SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app import models, phones  # noqa: E402
+from app.routers.customers import customer_by_phone  # noqa: E402
+from benchmarks.bench_export import new_id  # noqa: E402
+from benchmarks.bench_staff_activity import BASE, query_plan  # noqa: E402
+
+
+def registered(i: int) -> str:
+    """How member ``i`` gave their number at sign-up."""
+    national = f"9{i:08d}"
+    return (f"0{national}", f"+84 {national[:2]} {national[2:5]} {national[5:]}", f"84{national}")[i % 3]
+
+
+def typed(i: int) -> str:
+    """How the cashier types it at the counter."""
+    national = f"9{i:08d}"
+    return (f"+84{national}", f"0{national[:3]} {national[3:6]} {national[6:]}", f"0{national}")[i % 3]
+
+
+def populate(customers: int) -> None:
+    for start in range(0, customers, 50_000):
+        with engine.begin() as conn:
+            conn.execute(models.Customer.__table__.insert(), [
+                {
+                    "id": new_id(),
+                    "full_name": f"Member {i}",
+                    "phone_number": registered(i),
+                    "phone_key": phones.phone_key(registered(i)),
+                    "total_points": 0,
+                    "created_at": BASE,
+                }
+                for i in range(start, min(start + 50_000, customers))
+            ])
+
+
+def timed(fn, args: list) -> float:
+    samples = []
+    for arg in args:
+        t0 = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--search-lookups", type=int, default=50)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    t0 = time.perf_counter()
+    populate(args.customers)
+    print(f"registered {args.customers} customers in {time.perf_counter() - t0:.1f}s")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    customers = models.Customer.__table__
+    plan = query_plan(select(customers).where(customers.c.phone_key == "+84900000001"))
+    plan_ok = "ix_customers_phone_key" in plan
+    print(f"plan phone key lookup: {'index scan' if plan_ok else 'MISSING ix_customers_phone_key'}")
+    if not plan_ok:
+        print(plan)
+
+    members = random.Random(1).sample(range(args.customers), min(args.lookups, args.customers))
+    db = SessionLocal()
+
+    def lookup(i: int) -> None:
+        c = customer_by_phone(db, typed(i))
+        assert c is not None and c.full_name == f"Member {i}"
+        # A fresh request session each time, as in the route
+        db.expunge_all()
+
+    phones.phone_cache.clear()
+    cold = timed(lookup, members)
+    warm = timed(lookup, members)
+    db.close()
+
+    admin = StaffPrincipal(id=new_id(), username="bench-admin", role="admin", token_version=0, created_at=BASE)
+    app.dependency_overrides[get_current_staff] = lambda: admin
+    client = TestClient(app)
+
+    def by_phone(i: int) -> None:
+        r = client.get(f"/customers/by-phone/{typed(i)}")
+        assert r.status_code == 200, r.text
+
+    def search(i: int) -> None:
+        # Only an exact spelling of the stored number is found this way
+        r = client.get("/customers", params={"search": registered(i), "limit": 1})
+        assert r.status_code == 200, r.text
+
+    print(f"{'lookup':<36} {'median ms':>10}")
+    print(f"{'customer_by_phone, cold cache':<36} {cold:>10.3f}")
+    print(f"{'customer_by_phone, warm cache':<36} {warm:>10.3f}")
+    print(f"{'GET /customers/by-phone (warm)':<36} {timed(by_phone, members):>10.3f}")
+    print(f"{'GET /customers?search=':<36} {timed(search, members[:args.search_lookups]):>10.3f}")
+    print("phone cache", phones.phone_cache.stats())
+
+    if not plan_ok:
+        print("FAIL: phone key lookups are not served by ix_customers_phone_key")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
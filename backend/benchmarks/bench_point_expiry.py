@@ -0,0 +1,109 @@
+"""Nightly point expiry over a large member base.
+
+Usage (from backend/):
+    python -m benchmarks.bench_point_expiry [--customers 5000000 --earns 8 --redeems 2]
+
+Every customer gets ``--earns`` earn entries spread over the 18 months before
+the first cutoff plus ``--redeems`` redemptions. The benchmark times a dry
+run, the first (full) run, the following night's incremental run that only
+visits customers with lots that crossed the boundary that day, and a rerun
+of the same night, which must expire nothing. Uses DATABASE_URL when set,
+otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from app.database import engine, Base  # noqa: E402
+from app import expiry, ledger, models  # noqa: E402
+from benchmarks.bench_export import new_id  # noqa: E402
+
+CUTOFF = datetime(2025, 1, 1)
+HISTORY_DAYS = 540
+
+
+def populate(customers: int, earns: int, redeems: int) -> str:
+    rng = random.Random(15)
+    staff_id = new_id()
+    with engine.begin() as conn:
+        conn.execute(models.Staff.__table__.insert(), {
+            "id": staff_id, "username": "bench", "password_hash": "-", "role": "staff",
+        })
+        people, entries = [], []
+
+        def flush():
+            conn.execute(models.Customer.__table__.insert(), people)
+            conn.execute(models.PointTransaction.__table__.insert(), entries)
+            people.clear()
+            entries.clear()
+
+        for i in range(customers):
+            cid = new_id()
+            days = sorted(rng.randrange(HISTORY_DAYS) for _ in range(earns + redeems))
+            kinds = ["earn"] * earns + ["redeem"] * redeems
+            rng.shuffle(kinds)
+            balance = 0
+            for k, (day, kind) in enumerate(zip(days, kinds)):
+                amount = rng.randrange(10, 200) if kind == "earn" else -min(balance, rng.randrange(50, 300))
+                if amount == 0:
+                    continue
+                balance += amount
+                entries.append({
+                    "id": new_id(), "customer_id": cid, "staff_id": staff_id, "type": kind, "amount": amount,
+                    "description": "Purchase", "balance_after": balance,
+                    "created_at": CUTOFF - timedelta(days=HISTORY_DAYS - 30) + timedelta(days=day, minutes=i % 1440, seconds=k),
+                })
+            people.append({"id": cid, "full_name": f"Member {i}", "phone_number": f"09{i:08d}",
+                           "total_points": balance, "created_at": CUTOFF - timedelta(days=HISTORY_DAYS)})
+            if len(entries) >= 50_000:
+                flush()
+        if people:
+            flush()
+    return staff_id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=5_000_000)
+    parser.add_argument("--earns", type=int, default=8)
+    parser.add_argument("--redeems", type=int, default=2)
+    parser.add_argument("--workers", type=int, help="default: 1 on SQLite (a single writer), else 4")
+    parser.add_argument("--chunk-size", type=int, default=ledger.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    workers = args.workers or (1 if engine.dialect.name == "sqlite" else ledger.DEFAULT_WORKERS)
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    t0 = time.perf_counter()
+    staff_id = populate(args.customers, args.earns, args.redeems)
+    print(f"populated {args.customers} customers in {time.perf_counter() - t0:.1f}s\n")
+
+    steps = [
+        ("dry run", CUTOFF, True),
+        ("first run (all customers)", CUTOFF, False),
+        ("next night (incremental)", CUTOFF + timedelta(days=1), False),
+        ("rerun of next night", CUTOFF + timedelta(days=1), False),
+    ]
+    scale = 5_000_000 / args.customers
+    print(f"{'step':<28} {'seconds':>8} {'customers':>10} {'points':>11} {'at 5M members, s':>17}")
+    for name, cutoff, dry_run in steps:
+        t0 = time.perf_counter()
+        report = expiry.expire_points(cutoff, staff_id, workers, args.chunk_size, dry_run=dry_run)
+        elapsed = time.perf_counter() - t0
+        print(f"{name:<28} {elapsed:>8.1f} {report['customers']:>10} {report['points']:>11} "
+              f"{elapsed * scale:>17.0f}")
+    assert report["points"] == 0, report
+    t0 = time.perf_counter()
+    report = ledger.verify_balances(workers)
+    drifted = report["drifted"]
+    print(f"\nledger verified in {time.perf_counter() - t0:.1f}s, {drifted} customers drifted")
+    assert drifted == 0, report["drifts"][:3]
+
+
+if __name__ == "__main__":
+    main()
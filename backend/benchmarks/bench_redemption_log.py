@@ -0,0 +1,132 @@
+"""Latency of GET /redemptions at millions of rows: pages, filters and the expanded mode.
+
+Usage (from backend/):
+    python -m benchmarks.bench_redemption_log [--redemptions 2000000]
+
+Also times what the frontend had to do before: a page of bare ids followed by
+one customer lookup per row (the client-side N+1), and, up to
+--full-list-max rows, the old unpaginated list. Uses DATABASE_URL when set,
+otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import get_current_staff  # noqa: E402
+from app.database import engine, Base, SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app import models  # noqa: E402
+from benchmarks.bench_export import new_id  # noqa: E402
+
+BASE = datetime(2020, 1, 1)
+
+
+def populate(redemptions: int, customers: int, gifts: int, staff: int):
+    staff_ids = [new_id() for _ in range(staff)]
+    gift_ids = [new_id() for _ in range(gifts)]
+    customer_ids = [new_id() for _ in range(customers)]
+    with engine.begin() as conn:
+        conn.execute(models.Staff.__table__.insert(), [
+            {"id": sid, "username": f"bench{i}", "password_hash": "-", "role": "staff"} for i, sid in enumerate(staff_ids)
+        ])
+        conn.execute(models.Gift.__table__.insert(), [
+            {"id": gid, "name": f"Gift {i}", "points_required": 100, "stock": 1_000_000} for i, gid in enumerate(gift_ids)
+        ])
+        conn.execute(models.Customer.__table__.insert(), [
+            {"id": cid, "full_name": f"Member {i}", "phone_number": f"09{i:08d}", "total_points": 0, "created_at": BASE}
+            for i, cid in enumerate(customer_ids)
+        ])
+    for start in range(0, redemptions, 50_000):
+        with engine.begin() as conn:
+            conn.execute(models.Redemption.__table__.insert(), [
+                {
+                    "id": new_id(),
+                    "customer_id": customer_ids[(i * 7919) % customers],
+                    "gift_id": gift_ids[i % gifts],
+                    "staff_id": staff_ids[i % staff],
+                    "points_used": 100,
+                    "created_at": BASE + timedelta(seconds=30 * i),
+                }
+                for i in range(start, min(start + 50_000, redemptions))
+            ])
+    return customer_ids, gift_ids, staff_ids
+
+
+def timed(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redemptions", type=int, default=2_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--gifts", type=int, default=50)
+    parser.add_argument("--staff", type=int, default=20)
+    parser.add_argument("--full-list-max", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    app.dependency_overrides[get_current_staff] = lambda: None
+    client = TestClient(app)
+
+    t0 = time.perf_counter()
+    customer_ids, gift_ids, staff_ids = populate(args.redemptions, args.customers, args.gifts, args.staff)
+    print(f"inserted {args.redemptions} redemptions in {time.perf_counter() - t0:.1f}s")
+
+    def get(params: dict):
+        r = client.get("/redemptions", params=params)
+        assert r.status_code == 200, r.text
+        return r
+
+    cursor = None
+    for _ in range(20):
+        cursor = get({"limit": 50, **({"cursor": cursor} if cursor else {})}).headers.get("X-Next-Cursor") or cursor
+    last = BASE + timedelta(seconds=30 * args.redemptions)
+
+    def n_plus_one():
+        for row in get({"limit": 50}).json():
+            assert client.get(f"/customers/{row['customer_id']}").status_code == 200
+
+    cases = [
+        ("first page", lambda: get({"limit": 50})),
+        ("first page, expanded", lambda: get({"limit": 50, "expand": True})),
+        ("page + 50 customer lookups", n_plus_one),
+        ("page 20, expanded", lambda: get({"limit": 50, "cursor": cursor, "expand": True})),
+        ("gift_id, expanded", lambda: get({"limit": 50, "gift_id": gift_ids[0], "expand": True})),
+        ("customer_id, expanded", lambda: get({"limit": 50, "customer_id": customer_ids[1], "expand": True})),
+        ("staff_id", lambda: get({"limit": 50, "staff_id": staff_ids[0]})),
+        ("last 7 days, expanded", lambda: get({"limit": 50, "since": (last - timedelta(days=7)).isoformat(), "expand": True})),
+        ("gift_id + 30-day window", lambda: get({
+            "limit": 50, "gift_id": gift_ids[1], "since": (last - timedelta(days=60)).isoformat(),
+            "until": (last - timedelta(days=30)).isoformat(),
+        })),
+    ]
+    print(f"{'case':<28} {'median ms':>10}")
+    for name, fn in cases:
+        print(f"{name:<28} {timed(fn, args.runs):>10.2f}")
+
+    if args.redemptions <= args.full_list_max:
+        def full_list():
+            with SessionLocal() as db:
+                db.query(models.Redemption).order_by(models.Redemption.created_at.desc()).all()
+        print(f"{'full list (previous API)':<28} {timed(full_list, max(args.runs // 5, 1)):>10.2f}")
+    else:
+        print(f"{'full list (previous API)':<28} {'skipped':>10}  (more than --full-list-max rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Staff activity / audit search at scale, with and without the staff indexes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_staff_activity [--transactions 9000000 --redemptions 1000000]
+
+Seeds ledger entries and redemptions spread over --staff staff members (the
+last one rarely active, like a new hire under review), then first checks the query plans: a staff member's activity must be read from
+ix_point_transactions_staff_created and ix_redemptions_staff_created, not by
+scanning either table (the run exits non-zero otherwise). It then times
+GET /staff/{id}/activity and GET /admin/audit pages, drops the two indexes
+and times the staff queries again, which is what fraud reviews ran before.
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+
+from app.auth import StaffPrincipal, get_current_staff  # noqa: E402
+from app.database import engine, Base, SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app import models  # noqa: E402
+from app.routers.audit import activity_page_select  # noqa: E402
+from benchmarks.bench_export import new_id  # noqa: E402
+
+BASE = datetime(2020, 1, 1)
+STAFF_INDEXES = ("ix_point_transactions_staff_created", "ix_redemptions_staff_created")
+TYPES = ("earn", "earn", "earn", "redeem", "manual_adjust")
+
+
+def staff_for(i: int, staff_ids: list) -> str:
+    # One row in 1000 belongs to the last, rarely active staff member
+    return staff_ids[-1] if i % 1000 == 0 else staff_ids[i % (len(staff_ids) - 1)]
+
+
+def populate(transactions: int, redemptions: int, customers: int, staff: int):
+    staff_ids = [new_id() for _ in range(staff)]
+    customer_ids = [new_id() for _ in range(customers)]
+    gift_id = new_id()
+    with engine.begin() as conn:
+        conn.execute(models.Staff.__table__.insert(), [
+            {"id": sid, "username": f"bench{i}", "password_hash": "-", "role": "staff"} for i, sid in enumerate(staff_ids)
+        ])
+        conn.execute(models.Gift.__table__.insert(), {"id": gift_id, "name": "Gift", "points_required": 100, "stock": 1})
+        conn.execute(models.Customer.__table__.insert(), [
+            {"id": cid, "full_name": f"Member {i}", "phone_number": f"09{i:08d}", "total_points": 0, "created_at": BASE}
+            for i, cid in enumerate(customer_ids)
+        ])
+    span = 3 * 365 * 86400
+    for start in range(0, transactions, 50_000):
+        with engine.begin() as conn:
+            conn.execute(models.PointTransaction.__table__.insert(), [
+                {
+                    "id": new_id(),
+                    "customer_id": customer_ids[(i * 7919) % customers],
+                    "staff_id": staff_for(i, staff_ids),
+                    "type": TYPES[i % len(TYPES)],
+                    "amount": -(i % 2000) if TYPES[i % len(TYPES)] != "earn" else i % 500,
+                    "description": "bench",
+                    "created_at": BASE + timedelta(seconds=i * span // transactions),
+                }
+                for i in range(start, min(start + 50_000, transactions))
+            ])
+    for start in range(0, redemptions, 50_000):
+        with engine.begin() as conn:
+            conn.execute(models.Redemption.__table__.insert(), [
+                {
+                    "id": new_id(),
+                    "customer_id": customer_ids[(i * 7919) % customers],
+                    "gift_id": gift_id,
+                    "staff_id": staff_for(i, staff_ids),
+                    "points_used": 100,
+                    "created_at": BASE + timedelta(seconds=i * span // redemptions),
+                }
+                for i in range(start, min(start + 50_000, redemptions))
+            ])
+    return staff_ids, customer_ids, BASE + timedelta(seconds=span)
+
+
+@contextmanager
+def explaining():
+    """Run the statements executed inside the block through EXPLAIN instead."""
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        return prefix + statement, parameters
+
+    event.listen(engine, "before_cursor_execute", explain, retval=True)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", explain)
+
+
+def query_plan(stmt) -> str:
+    with SessionLocal() as db, explaining():
+        # Read the DBAPI cursor directly: the plan rows do not fit the statement's result types
+        rows = db.execute(stmt).cursor.fetchall()
+    return "\n".join(" ".join(str(v) for v in row) for row in rows)
+
+
+def plan_cases(staff_id: str, last: datetime) -> dict:
+    """Activity queries by name, each with the staff indexes its plan must read from."""
+    return {
+        "all activity": (
+            activity_page_select(staff_id, None, None, None, None, None, None, None, 50),
+            STAFF_INDEXES,
+        ),
+        # Filtering on a transaction type leaves the redemptions out altogether
+        "last 30 days, deductions": (
+            activity_page_select(
+                staff_id, None, "manual_adjust", None, -1000, last - timedelta(days=30), None, None, 50,
+            ),
+            STAFF_INDEXES[:1],
+        ),
+    }
+
+
+def check_plans(staff_id: str, last: datetime) -> bool:
+    ok = True
+    for name, (stmt, indexes) in plan_cases(staff_id, last).items():
+        plan = query_plan(stmt)
+        missing = [index for index in indexes if index not in plan]
+        print(f"plan {name + ':':<28} {'index scan' if not missing else 'MISSING ' + ', '.join(missing)}")
+        if missing:
+            print(plan)
+            ok = False
+    return ok
+
+
+def timed(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=9_000_000)
+    parser.add_argument("--redemptions", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--staff", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    t0 = time.perf_counter()
+    staff_ids, customer_ids, last = populate(args.transactions, args.redemptions, args.customers, args.staff)
+    print(f"inserted {args.transactions} transactions and {args.redemptions} redemptions in {time.perf_counter() - t0:.1f}s")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    plans_ok = check_plans(staff_ids[0], last)
+
+    admin = StaffPrincipal(id=new_id(), username="bench-admin", role="admin", token_version=0, created_at=BASE)
+    app.dependency_overrides[get_current_staff] = lambda: admin
+    client = TestClient(app)
+
+    def get(path: str, params: dict):
+        r = client.get(path, params=params)
+        assert r.status_code == 200, r.text
+        return r
+
+    staff_path = f"/staff/{staff_ids[0]}/activity"
+    rare_path = f"/staff/{staff_ids[-1]}/activity"
+    cursor = None
+    for _ in range(20):
+        cursor = get(staff_path, {"limit": 50, **({"cursor": cursor} if cursor else {})}).headers.get("X-Next-Cursor") or cursor
+    month = (last - timedelta(days=30)).isoformat()
+    staff_cases = [
+        ("staff: first page", lambda: get(staff_path, {"limit": 50})),
+        ("staff: page 20", lambda: get(staff_path, {"limit": 50, "cursor": cursor})),
+        ("staff: redemptions only", lambda: get(staff_path, {"limit": 50, "type": "redemption"})),
+        ("staff: 30 days, <= -1000", lambda: get(staff_path, {"limit": 50, "since": month, "max_amount": -1000})),
+        ("rare staff: first page", lambda: get(rare_path, {"limit": 50})),
+        ("rare staff: <= -1000", lambda: get(rare_path, {"limit": 50, "max_amount": -1000})),
+    ]
+    audit_cases = [
+        ("audit: first page", lambda: get("/admin/audit", {"limit": 50})),
+        ("audit: customer", lambda: get("/admin/audit", {"limit": 50, "customer_id": customer_ids[1]})),
+        ("audit: 30 days, <= -1000", lambda: get("/admin/audit", {"limit": 50, "since": month, "max_amount": -1000})),
+    ]
+    print(f"{'case':<40} {'median ms':>10}")
+    for name, fn in staff_cases + audit_cases:
+        print(f"{name:<40} {timed(fn, args.runs):>10.2f}")
+
+    with engine.begin() as conn:
+        for index in STAFF_INDEXES:
+            conn.execute(text(f"DROP INDEX {index}"))
+    for name, fn in staff_cases:
+        print(f"{name + ' (no index)':<40} {timed(fn, max(args.runs // 5, 1)):>10.2f}")
+
+    if not plans_ok:
+        print("FAIL: staff activity is not served by the staff indexes")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Cold-start time: from spawning gunicorn to the first 200 on /health.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup [--workers 4 --runs 5] [--async]
+
+Compares schema setup in every worker (how app.main used to boot) with a single
+migrate.py run before the workers start, with and without preload_app. The
+database is migrated once up front, so every case boots against existing
+tables. Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+CASES = (
+    # (name, DATABASE_AUTO_MIGRATE, GUNICORN_PRELOAD)
+    ("schema setup per worker", "true", "false"),
+    ("migrate once", "false", "false"),
+    ("migrate once + preload_app", "false", "true"),
+)
+
+
+def time_to_first_200(env: dict, port: int, workers: int, timeout: float = 60) -> float:
+    cmd = [
+        sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers),
+        "-k", "uvicorn.workers.UvicornWorker", "app.main:app", "--bind", f"127.0.0.1:{port}",
+    ]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                    return time.perf_counter() - t0
+            except httpx.HTTPError:
+                time.sleep(0.01)
+        raise RuntimeError("server did not become healthy")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--async", dest="mode_async", action="store_true", help="serve from the async routers")
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, "migrate.py"], check=True, stdout=subprocess.DEVNULL)
+
+    print(f"{'case':<30} {'median s':>9} {'min s':>7} {'max s':>7}")
+    for name, auto_migrate, preload in CASES:
+        env = dict(
+            os.environ,
+            DATABASE_ASYNC="true" if args.mode_async else "false",
+            DATABASE_AUTO_MIGRATE=auto_migrate,
+            GUNICORN_PRELOAD=preload,
+        )
+        samples = [time_to_first_200(env, args.port, args.workers) for _ in range(args.runs)]
+        print(f"{name:<30} {statistics.median(samples):>9.3f} {min(samples):>7.3f} {max(samples):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
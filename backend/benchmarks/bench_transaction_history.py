@@ -0,0 +1,101 @@
+"""Latency of GET /customers/{id}/transactions for a customer with a long history.
+
+Usage (from backend/):
+    python -m benchmarks.bench_transaction_history [--transactions 1000000]
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import get_current_staff  # noqa: E402
+from app.database import engine, Base  # noqa: E402
+from app.main import app  # noqa: E402
+from app import models  # noqa: E402
+
+TYPES = ("earn", "earn", "earn", "redeem", "manual_adjust")
+
+
+def populate(transactions: int) -> str:
+    staff_id, customer_id = str(uuid.uuid4()), str(uuid.uuid4())
+    base = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.Staff.__table__.insert(), {
+            "id": staff_id, "username": "bench", "password_hash": "-", "role": "staff",
+        })
+        conn.execute(models.Customer.__table__.insert(), {
+            "id": customer_id, "full_name": "Loyal Member", "phone_number": "0900000000",
+            "total_points": 0, "created_at": base,
+        })
+        for start in range(0, transactions, 50_000):
+            conn.execute(models.PointTransaction.__table__.insert(), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "customer_id": customer_id,
+                    "staff_id": staff_id,
+                    "type": TYPES[i % len(TYPES)],
+                    "amount": 10,
+                    "description": "Purchase",
+                    "created_at": base + timedelta(minutes=i),
+                }
+                for i in range(start, min(start + 50_000, transactions))
+            ])
+    return customer_id
+
+
+def timed(client: TestClient, url: str, params: dict, runs: int, status: int = 200) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        r = client.get(url, params=params)
+        samples.append((time.perf_counter() - t0) * 1000)
+        assert r.status_code == status, r.text
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    app.dependency_overrides[get_current_staff] = lambda: None
+    client = TestClient(app)
+
+    t0 = time.perf_counter()
+    customer_id = populate(args.transactions)
+    print(f"inserted {args.transactions} transactions in {time.perf_counter() - t0:.1f}s")
+
+    url = f"/customers/{customer_id}/transactions"
+    cursor = None
+    for _ in range(20):
+        r = client.get(url, params={"limit": 50, **({"cursor": cursor} if cursor else {})})
+        cursor = r.headers.get("X-Next-Cursor") or cursor
+    last = datetime(2020, 1, 1) + timedelta(minutes=args.transactions)
+
+    cases = [
+        ("first page", url, {"limit": 50}, 200),
+        ("page 20", url, {"limit": 50, "cursor": cursor}, 200),
+        ("last 30 days", url, {"limit": 50, "since": (last - timedelta(days=30)).isoformat()}, 200),
+        ("type=redeem", url, {"limit": 50, "type": "redeem"}, 200),
+        ("empty window", url, {"limit": 50, "until": "2019-01-01T00:00:00"}, 200),
+        ("unknown customer", f"/customers/{uuid.uuid4()}/transactions", {"limit": 50}, 404),
+    ]
+    print(f"{'case':<18} {'median ms':>10}")
+    for name, case_url, params, status in cases:
+        print(f"{name:<18} {timed(client, case_url, params, args.runs, status):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
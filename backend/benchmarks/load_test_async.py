@@ -0,0 +1,116 @@
+"""Compare the sync and async router modes under the same mixed workload.
+
+For each mode a server is spawned the way start.sh does it (gunicorn with
+uvicorn workers) with DATABASE_ASYNC toggled, then hammered with concurrent
+reads and writes. Run from backend/ with DATABASE_URL pointing at a
+throwaway database:
+
+    python -m benchmarks.load_test_async --workers 4 --concurrency 64 --seconds 30
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import httpx
+
+WORKLOAD = (
+    # (weight, method, path template)
+    (40, "GET", "/customers/{customer_id}"),
+    (20, "GET", "/customers?limit=50"),
+    (15, "GET", "/gifts"),
+    (10, "GET", "/dashboard/stats"),
+    (10, "POST", "/customers/{customer_id}/add-points"),
+    (5, "GET", "/customers/{customer_id}/transactions"),
+)
+
+
+def start_server(mode_async: bool, port: int, workers: int, extra_env: Optional[dict] = None) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_ASYNC="true" if mode_async else "false", DATABASE_AUTO_MIGRATE="false")
+    env.update(extra_env or {})
+    cmd = [
+        sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "uvicorn.workers.UvicornWorker",
+        "app.main:app", "--bind", f"127.0.0.1:{port}",
+    ]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not become healthy")
+
+
+async def run_load(base_url: str, concurrency: int, seconds: float) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        token = (await client.post("/auth/login", data={"username": "admin", "password": "admin123"})).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        customer_ids = []
+        for i in range(50):
+            r = await client.post("/customers", json={"full_name": f"Load {i}", "phone_number": f"load-{time.time_ns()}-{i}"})
+            customer_ids.append(r.json()["id"])
+
+        weights = [w for w, _, _ in WORKLOAD]
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + seconds
+
+        async def user():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                _, method, path = random.choices(WORKLOAD, weights)[0]
+                url = path.format(customer_id=random.choice(customer_ids))
+                body = {"amount": 1, "description": "load"} if method == "POST" else None
+                t0 = time.perf_counter()
+                try:
+                    r = await client.request(method, url, json=body)
+                    errors += r.status_code >= 400
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / seconds,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, "migrate.py"], check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, "seed.py"], check=True, stdout=subprocess.DEVNULL)
+
+    results = {}
+    for mode in ("sync", "async"):
+        proc = start_server(mode == "async", args.port, args.workers)
+        try:
+            results[mode] = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.concurrency, args.seconds))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{'mode':<6} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<6} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Earns per second against the group-commit window (EARN_BATCH_WINDOW_MS).
+
+For each window (0 = batching off) a server is spawned the way start.sh does it
+and --concurrency clients post add-points for --seconds, spread over --customers
+customers so that some earns for the same customer land in one batch. Every
+run is then checked: each customer's balance must equal the sum of its
+ledger, and the balances handed back to callers must be exactly the
+``balance_after`` values of that customer's ledger entries. Run from backend/
+with DATABASE_URL pointing at a throwaway database:
+
+    python -m benchmarks.load_test_earn_batching --windows 0,2,5,10 --concurrency 128
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from .load_test_async import start_server
+
+
+async def run(base_url: str, args) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60,
+                                 limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        token = (await client.post("/auth/login", data={"username": "admin", "password": "admin123"})).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        customers = []
+        for i in range(args.customers):
+            customers.append((await client.post("/customers", json={
+                "full_name": f"Shopper {i}", "phone_number": f"earn-{time.time_ns()}-{i}",
+            })).json()["id"])
+
+        returned = defaultdict(list)
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + args.seconds
+
+        async def shopper(n: int):
+            nonlocal errors
+            i = n
+            while time.perf_counter() < deadline:
+                cid = customers[i % len(customers)]
+                i += args.concurrency
+                t0 = time.perf_counter()
+                r = await client.post(f"/customers/{cid}/add-points", json={"amount": 1 + i % 7, "description": "purchase"})
+                latencies.append(time.perf_counter() - t0)
+                if r.status_code == 200:
+                    returned[cid].append(r.json()["total_points"])
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(shopper(n) for n in range(args.concurrency)))
+
+        problems = []
+        for cid in customers:
+            balance = (await client.get(f"/customers/{cid}")).json()["total_points"]
+            ledger, cursor = [], None
+            while True:
+                r = await client.get(f"/customers/{cid}/transactions",
+                                     params={"limit": 500, **({"cursor": cursor} if cursor else {})})
+                ledger += r.json()
+                cursor = r.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            if balance != sum(tx["amount"] for tx in ledger):
+                problems.append(f"customer {cid}: balance {balance} != ledger sum")
+            if sorted(returned[cid]) != sorted(tx["balance_after"] for tx in ledger):
+                problems.append(f"customer {cid}: returned balances do not match the ledger's balance_after")
+
+    latencies.sort()
+    return {
+        "earns": len(latencies) - errors,
+        "errors": errors,
+        "eps": (len(latencies) - errors) / args.seconds,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000,
+        "problems": problems,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--windows", default="0,2,5,10", help="comma-separated EARN_BATCH_WINDOW_MS values")
+    parser.add_argument("--max-size", type=int, default=100, help="EARN_BATCH_MAX_SIZE")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--async", dest="mode_async", action="store_true", help="serve from the async routers")
+    parser.add_argument("--port", type=int, default=8769)
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, "migrate.py"], check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, "seed.py"], check=True, stdout=subprocess.DEVNULL, env=dict(os.environ))
+
+    results = {}
+    for window in args.windows.split(","):
+        proc = start_server(args.mode_async, args.port, args.workers,
+                            {"EARN_BATCH_WINDOW_MS": window, "EARN_BATCH_MAX_SIZE": str(args.max_size)})
+        try:
+            results[window] = asyncio.run(run(f"http://127.0.0.1:{args.port}", args))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{'window ms':>9} {'earns':>8} {'errors':>7} {'earns/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for window, r in results.items():
+        print(f"{window:>9} {r['earns']:>8} {r['errors']:>7} {r['eps']:>9.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+    problems = [f"window {w}: {p}" for w, r in results.items() for p in r["problems"]]
+    for problem in problems[:20]:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: balances, ledgers and returned balances agree for every window")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
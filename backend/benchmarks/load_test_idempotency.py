@@ -0,0 +1,131 @@
+"""Parallel duplicate submissions with one Idempotency-Key: exactly one mutation each.
+
+A server is spawned the way start.sh does it. For every round, --duplicates
+identical add-points, deduct-points and redeem requests sharing one
+Idempotency-Key per operation are fired at once, as a POS retrying over flaky
+Wi-Fi would. Afterwards the run fails loudly unless each operation moved the
+balance, the ledger and the gift stock exactly once and every duplicate got the
+same response as the original. Run from backend/ with DATABASE_URL pointing at
+a throwaway database:
+
+    python -m benchmarks.load_test_idempotency --workers 4 --rounds 50 --duplicates 8
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+from .load_test_async import start_server
+
+EARN, DEDUCT, COST = 100, 30, 10
+
+
+async def run(base_url: str, args) -> int:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        token = (await client.post("/auth/login", data={"username": "admin", "password": "admin123"})).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        gift = (await client.post("/gifts", json={
+            "name": f"Retry {time.time_ns()}", "points_required": COST, "stock": args.rounds * 2,
+        })).json()
+        customers = []
+        for i in range(args.rounds):
+            customers.append((await client.post("/customers", json={
+                "full_name": f"Retrier {i}", "phone_number": f"09{time.time_ns() % 10 ** 6:06d}{i:04d}",
+            })).json()["id"])
+
+        statuses: Counter = Counter()
+        replays = 0
+        mismatched = 0
+        latencies = {"original": [], "replay": []}
+
+        async def submit(path: str, body: dict, key: str):
+            nonlocal replays
+            t0 = time.perf_counter()
+            r = await client.post(path, json=body, headers={"Idempotency-Key": key})
+            replayed = r.headers.get("Idempotent-Replayed") == "true"
+            latencies["replay" if replayed else "original"].append(time.perf_counter() - t0)
+            statuses[r.status_code] += 1
+            replays += replayed
+            return r.status_code, r.text
+
+        async def burst(path: str, body: dict):
+            nonlocal mismatched
+            key = str(uuid.uuid4())
+            responses = await asyncio.gather(*(submit(path, body, key) for _ in range(args.duplicates)))
+            mismatched += len(set(responses)) != 1
+
+        t0 = time.perf_counter()
+        for cid in customers:
+            await burst(f"/customers/{cid}/add-points", {"amount": EARN, "description": "retry"})
+            await burst(f"/customers/{cid}/deduct-points", {"amount": DEDUCT, "description": "retry"})
+            await burst("/redeem", {"customer_id": cid, "gift_id": gift["id"]})
+        elapsed = time.perf_counter() - t0
+
+        # A late retry arriving after everything settled is a pure replay
+        late_key = str(uuid.uuid4())
+        for _ in range(args.duplicates):
+            await submit(f"/customers/{customers[0]}/add-points", {"amount": EARN, "description": "late"}, late_key)
+
+        final_gift = next(g for g in (await client.get("/gifts")).json() if g["id"] == gift["id"])
+        balances, entries = {}, {}
+        for cid in customers:
+            balances[cid] = (await client.get(f"/customers/{cid}")).json()["total_points"]
+            entries[cid] = len((await client.get(f"/customers/{cid}/transactions", params={"limit": 100})).json())
+
+    requests = sum(statuses.values())
+    print(f"rounds {args.rounds}  duplicates {args.duplicates}  requests {requests}  elapsed {elapsed:.2f}s")
+    print(f"responses {dict(statuses)}  replayed {replays}")
+    for kind, samples in latencies.items():
+        if samples:
+            samples.sort()
+            print(f"{kind:<8} n={len(samples):<6} p50 {samples[len(samples) // 2] * 1000:7.1f} ms"
+                  f"  p99 {samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000:7.1f} ms")
+
+    problems = []
+    if mismatched:
+        problems.append(f"{mismatched} bursts got differing responses")
+    if final_gift["stock"] != args.rounds:
+        problems.append(f"gift stock moved by {args.rounds * 2 - final_gift['stock']} for {args.rounds} redemptions")
+    expected = EARN - DEDUCT - COST
+    for i, cid in enumerate(customers):
+        want = expected + (EARN if i == 0 else 0)
+        if balances[cid] != want:
+            problems.append(f"customer {cid} balance {balances[cid]}, expected {want}")
+        if entries[cid] != 3 + (i == 0):
+            problems.append(f"customer {cid} has {entries[cid]} ledger entries, expected {3 + (i == 0)}")
+    for problem in problems[:20]:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: every burst of duplicates mutated exactly once and got identical responses")
+    return 1 if problems else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--duplicates", type=int, default=8)
+    parser.add_argument("--async", dest="mode_async", action="store_true", help="serve from the async routers")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, "migrate.py"], check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, "seed.py"], check=True, stdout=subprocess.DEVNULL, env=dict(os.environ))
+
+    proc = start_server(args.mode_async, args.port, args.workers)
+    try:
+        status = asyncio.run(run(f"http://127.0.0.1:{args.port}", args))
+    finally:
+        proc.terminate()
+        proc.wait()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Concurrent redemptions of one hot gift: throughput and invariants.
+
+A server is spawned the way start.sh does it, a gift with limited stock and a
+set of customers with a few redemptions' worth of points are created, and then
+many more redemption requests than there is stock (or points) for are fired
+concurrently at that one gift. Afterwards the run fails loudly if the gift was
+oversold, any balance went negative, or balances and stock disagree with the
+number of successful redemptions. Run from backend/ with DATABASE_URL pointing
+at a throwaway database:
+
+    python -m benchmarks.load_test_redemptions --workers 4 --concurrency 64 --stock 500
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from .load_test_async import start_server
+
+COST = 10
+
+
+async def run(base_url: str, args) -> int:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        token = (await client.post("/auth/login", data={"username": "admin", "password": "admin123"})).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        gift = (await client.post("/gifts", json={
+            "name": f"Promo {time.time_ns()}", "points_required": COST, "stock": args.stock,
+        })).json()
+        customers = []
+        for i in range(args.customers):
+            c = (await client.post("/customers", json={
+                "full_name": f"Redeemer {i}", "phone_number": f"redeem-{time.time_ns()}-{i}",
+            })).json()
+            await client.post(f"/customers/{c['id']}/add-points", json={
+                "amount": COST * args.per_customer + COST // 2, "description": "load",
+            })
+            customers.append(c["id"])
+        start_points = {cid: COST * args.per_customer + COST // 2 for cid in customers}
+
+        attempts = [customers[i % len(customers)] for i in range(args.requests)]
+        statuses: Counter = Counter()
+        redeemed: Counter = Counter()
+        latencies = []
+
+        async def worker():
+            while attempts:
+                cid = attempts.pop()
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/redeem", json={"customer_id": cid, "gift_id": gift["id"]})
+                    statuses[r.status_code] += 1
+                    redeemed[cid] += r.status_code == 201
+                except httpx.HTTPError:
+                    statuses["transport error"] += 1
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+
+        final_gift = next(g for g in (await client.get("/gifts")).json() if g["id"] == gift["id"])
+        balances = {cid: (await client.get(f"/customers/{cid}")).json()["total_points"] for cid in customers}
+
+    successes = sum(redeemed.values())
+    latencies.sort()
+    print(f"requests {args.requests}  concurrency {args.concurrency}  elapsed {elapsed:.2f}s")
+    print(f"responses {dict(statuses)}")
+    print(f"redemptions/sec {successes / elapsed:.1f}  p50 {latencies[len(latencies) // 2] * 1000:.1f} ms"
+          f"  p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"stock {args.stock} -> {final_gift['stock']}  successful redemptions {successes}")
+
+    problems = []
+    if final_gift["stock"] < 0:
+        problems.append(f"gift oversold: stock is {final_gift['stock']}")
+    if args.stock - final_gift["stock"] != successes:
+        problems.append(f"stock moved by {args.stock - final_gift['stock']} for {successes} redemptions")
+    for cid, balance in balances.items():
+        if balance < 0:
+            problems.append(f"customer {cid} has a negative balance ({balance})")
+        if balance != start_points[cid] - COST * redeemed[cid]:
+            problems.append(f"customer {cid} balance {balance} does not match {redeemed[cid]} redemptions")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: no overselling, no negative balances, balances and stock consistent")
+    return 1 if problems else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--per-customer", type=int, default=3, help="redemptions each customer can afford")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--async", dest="mode_async", action="store_true", help="serve from the async routers")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, "migrate.py"], check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, "seed.py"], check=True, stdout=subprocess.DEVNULL, env=dict(os.environ))
+
+    proc = start_server(args.mode_async, args.port, args.workers)
+    try:
+        status = asyncio.run(run(f"http://127.0.0.1:{args.port}", args))
+    finally:
+        proc.terminate()
+        proc.wait()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""Reproducible performance baseline: seed a synthetic dataset, replay a POS day, compare.
+
+Usage (from backend/):
+    python -m benchmarks.regression_suite --scale small --save baseline.json
+    python -m benchmarks.regression_suite --scale small --compare baseline.json [--threshold 0.25]
+    python -m benchmarks.regression_suite --skip-seed --compare baseline.json
+
+Bulk-inserts --scale's customers, ledger entries, gifts and redemptions
+(or the --customers/--transactions/--gifts/--redemptions given), with the
+ledger consistent with every balance and the dashboard counters and rollups
+rebuilt, then spawns the app the way load_test_async does and drives a
+weighted mix of what cashiers do all day: log in, look a member up by phone
+or name, open their history, earn, redeem, and glance at the dashboard.
+Throughput and p50/p95/p99 latency per route, measured after --warmup, are
+printed and written to --save as JSON. With --compare the run fails (exit 1)
+if any route's p95 grew or its throughput fell by more than --threshold
+against the baseline, or if it returned unexpected statuses.
+
+Uses DATABASE_URL when set (a throwaway local Postgres: the tables are
+dropped and recreated unless --skip-seed), otherwise a throwaway SQLite file.
+Runs are only comparable at the same scale, database and server settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+import httpx  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app import models, phones, rollups, stats  # noqa: E402
+from app.auth import hash_password  # noqa: E402
+from app.database import engine, Base, SessionLocal  # noqa: E402
+from benchmarks.bench_export import new_id  # noqa: E402
+from benchmarks.bench_phone_lookup import registered, typed  # noqa: E402
+from benchmarks.load_test_async import start_server  # noqa: E402
+
+SCALES = {
+    # customers, transactions, gifts, redemptions, cashiers
+    "tiny": (1_000, 20_000, 20, 1_000, 5),
+    "small": (10_000, 200_000, 50, 10_000, 10),
+    "medium": (100_000, 2_000_000, 100, 100_000, 25),
+    "large": (1_000_000, 20_000_000, 200, 1_000_000, 50),
+}
+
+CASHIER_PASSWORD = "cashier123"
+
+WORKLOAD = (
+    # (weight, route); see Workload.request for what each one sends
+    (2, "login"),
+    (25, "lookup"),
+    (5, "search"),
+    (10, "customer"),
+    (15, "history"),
+    (20, "earn"),
+    (5, "redeem"),
+    (5, "gifts"),
+    (10, "dashboard"),
+    (3, "timeseries"),
+)
+
+CHUNK = 5_000
+
+
+def seed_dataset(customers: int, transactions: int, gifts: int, redemptions: int, cashiers: int,
+                 days: int, rng: random.Random) -> dict:
+    """Drop and recreate the tables and bulk-insert the synthetic dataset; return row counts."""
+    Base.metadata.drop_all(bind=engine)
+    subprocess.run([sys.executable, "migrate.py"], check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, "seed.py"], check=True, stdout=subprocess.DEVNULL)
+
+    # One hash for every cashier: a thousand bcrypt rounds would dwarf the seeding itself
+    password_hash = hash_password(CASHIER_PASSWORD)
+    end = datetime.utcnow() - timedelta(days=1)
+    start = end - timedelta(days=days)
+    staff_ids = [new_id() for _ in range(cashiers)]
+    gift_rows = [
+        {
+            "id": new_id(),
+            "name": f"Gift {i}",
+            "description": "Synthetic",
+            "points_required": rng.choice((100, 200, 500, 1000, 2000)),
+            "stock": 10_000_000,
+            "created_at": start,
+        }
+        for i in range(gifts)
+    ]
+    with engine.begin() as conn:
+        conn.execute(models.Staff.__table__.insert(), [
+            {
+                "id": staff_id,
+                "username": f"cashier{i}",
+                "password_hash": password_hash,
+                "role": "staff",
+                "token_version": 0,
+                "created_at": start,
+            }
+            for i, staff_id in enumerate(staff_ids)
+        ])
+        conn.execute(models.Gift.__table__.insert(), gift_rows)
+
+    per_customer = transactions / max(customers, 1)
+    redeem_share = redemptions / max(transactions, 1)
+    counts = {"customers": 0, "transactions": 0, "redemptions": 0}
+    for first in range(0, customers, CHUNK):
+        customer_rows, entries, redeemed = [], [], []
+        for i in range(first, min(first + CHUNK, customers)):
+            customer_id = new_id()
+            joined = start + timedelta(seconds=rng.random() * days * 86400)
+            balance = 0
+            n = rng.randint(0, int(2 * per_customer))
+            span = (end - joined).total_seconds()
+            for at in sorted(joined + timedelta(seconds=rng.random() * span) for _ in range(n)):
+                gift = rng.choice(gift_rows) if rng.random() < redeem_share else None
+                staff_id = rng.choice(staff_ids)
+                if gift and balance >= gift["points_required"]:
+                    balance -= gift["points_required"]
+                    redeemed.append({
+                        "id": new_id(),
+                        "customer_id": customer_id,
+                        "gift_id": gift["id"],
+                        "staff_id": staff_id,
+                        "points_used": gift["points_required"],
+                        "created_at": at,
+                    })
+                    kind, amount, description = "redeem", -gift["points_required"], f"Redeemed: {gift['name']}"
+                else:
+                    amount = rng.randint(10, 500)
+                    balance += amount
+                    kind, description = "earn", "Purchase"
+                entries.append({
+                    "id": new_id(),
+                    "customer_id": customer_id,
+                    "staff_id": staff_id,
+                    "type": kind,
+                    "amount": amount,
+                    "description": description,
+                    "external_ref": None,
+                    "balance_after": balance,
+                    "created_at": at,
+                })
+            customer_rows.append({
+                "id": customer_id,
+                "full_name": f"Member {i}",
+                "phone_number": registered(i),
+                "phone_key": phones.phone_key(registered(i)),
+                "email": None,
+                "total_points": balance,
+                "created_at": joined,
+            })
+        with engine.begin() as conn:
+            conn.execute(models.Customer.__table__.insert(), customer_rows)
+            for j in range(0, len(entries), 50_000):
+                conn.execute(models.PointTransaction.__table__.insert(), entries[j:j + 50_000])
+            if redeemed:
+                conn.execute(models.Redemption.__table__.insert(), redeemed)
+        counts["customers"] += len(customer_rows)
+        counts["transactions"] += len(entries)
+        counts["redemptions"] += len(redeemed)
+
+    # The bulk inserts bypassed the ORM hooks that keep these up to date
+    with SessionLocal() as db:
+        stats.reconcile(db)
+    rollups.refresh_rollups()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    counts["gifts"] = gifts
+    counts["cashiers"] = cashiers
+    return counts
+
+
+def working_set(sample: int, rng: random.Random) -> dict:
+    """Members, gifts and cashiers the virtual cashiers pick from, read back from the database."""
+    customers = models.Customer.__table__
+    with engine.connect() as conn:
+        members = conn.execute(
+            select(customers.c.id, customers.c.full_name, customers.c.phone_number)
+            # Ids are random, so the first ones by id are a sample that is the same on every run
+            .order_by(customers.c.id).limit(sample)
+        ).all()
+        gifts = conn.execute(
+            select(models.Gift.__table__.c.id).where(models.Gift.__table__.c.stock > 0)
+        ).scalars().all()
+        cashiers = conn.execute(
+            select(models.Staff.__table__.c.username).where(models.Staff.__table__.c.username.like("cashier%"))
+        ).scalars().all()
+    if not members or not gifts or not cashiers:
+        raise SystemExit("No synthetic dataset in this database; run without --skip-seed first")
+    return {"members": members, "gifts": gifts, "cashiers": cashiers, "rng": rng}
+
+
+class Workload:
+    """One virtual cashier's requests; ``expected`` statuses are not counted as errors."""
+
+    def __init__(self, client: httpx.AsyncClient, data: dict):
+        self.client = client
+        self.data = data
+        self.rng: random.Random = data["rng"]
+
+    async def login(self, username: str) -> str:
+        r = await self.client.post("/auth/login", data={"username": username, "password": CASHIER_PASSWORD})
+        r.raise_for_status()
+        return r.json()["access_token"]
+
+    async def request(self, route: str, headers: dict) -> tuple:
+        rng, data = self.rng, self.data
+        member = rng.choice(data["members"])
+        if route == "login":
+            return await self.client.post(
+                "/auth/login", data={"username": rng.choice(data["cashiers"]), "password": CASHIER_PASSWORD}
+            ), (200,)
+        if route == "lookup":
+            i = int(member.full_name.rsplit(" ", 1)[1])
+            return await self.client.get(f"/customers/by-phone/{typed(i)}", headers=headers), (200,)
+        if route == "search":
+            return await self.client.get(
+                "/customers", params={"search": member.full_name, "limit": 20}, headers=headers
+            ), (200,)
+        if route == "customer":
+            return await self.client.get(f"/customers/{member.id}", headers=headers), (200,)
+        if route == "history":
+            return await self.client.get(f"/customers/{member.id}/transactions", headers=headers), (200,)
+        if route == "earn":
+            return await self.client.post(
+                f"/customers/{member.id}/add-points",
+                json={"amount": rng.randint(10, 500), "description": "Purchase"}, headers=headers,
+            ), (200,)
+        if route == "redeem":
+            # A member short of points is turned away, as at a real counter
+            return await self.client.post(
+                "/redeem", json={"customer_id": member.id, "gift_id": rng.choice(data["gifts"])}, headers=headers
+            ), (201, 400)
+        if route == "gifts":
+            return await self.client.get("/gifts", headers=headers), (200,)
+        if route == "dashboard":
+            return await self.client.get("/dashboard/stats", headers=headers), (200,)
+        if route == "timeseries":
+            return await self.client.get("/dashboard/timeseries", params={"interval": "day"}, headers=headers), (200,)
+        raise ValueError(f"unknown route {route}")
+
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile of sorted ``samples``, in ms."""
+    return samples[max(0, int(round(q * len(samples))) - 1)] * 1000
+
+
+def summarize(latencies: list, errors: int, seconds: float) -> dict:
+    latencies.sort()
+    if not latencies:
+        return {"requests": 0, "errors": errors, "rps": 0.0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 2),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+
+
+async def run_load(base_url: str, data: dict, concurrency: int, seconds: float, warmup: float) -> dict:
+    routes = [route for _, route in WORKLOAD]
+    weights = [weight for weight, _ in WORKLOAD]
+    latencies = {route: [] for route in routes}
+    errors = {route: 0 for route in routes}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        workload = Workload(client, data)
+        tokens = [await workload.login(data["cashiers"][i % len(data["cashiers"])]) for i in range(concurrency)]
+        measure_from = time.perf_counter() + warmup
+        deadline = measure_from + seconds
+
+        async def cashier(token: str):
+            headers = {"Authorization": f"Bearer {token}"}
+            while time.perf_counter() < deadline:
+                route = data["rng"].choices(routes, weights)[0]
+                t0 = time.perf_counter()
+                try:
+                    r, expected = await workload.request(route, headers)
+                    failed = r.status_code not in expected
+                except httpx.HTTPError:
+                    failed = True
+                if t0 >= measure_from:
+                    latencies[route].append(time.perf_counter() - t0)
+                    errors[route] += failed
+
+        await asyncio.gather(*(cashier(token) for token in tokens))
+
+    results = {route: summarize(latencies[route], errors[route], seconds) for route in routes}
+    everything = [sample for samples in latencies.values() for sample in samples]
+    results["total"] = summarize(everything, sum(errors.values()), seconds)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta_ms: float) -> list:
+    """Regressions of ``current`` against ``baseline``, as printable lines."""
+    regressions = []
+    for route, now in current["routes"].items():
+        before = baseline["routes"].get(route)
+        if before is None or not before["requests"] or not now["requests"]:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + threshold) \
+                and now["p95_ms"] - before["p95_ms"] > min_delta_ms:
+            regressions.append(f"{route}: p95 {before['p95_ms']:.2f} -> {now['p95_ms']:.2f} ms")
+        if now["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{route}: {before['rps']:.1f} -> {now['rps']:.1f} req/s")
+        if now["errors"] > before["errors"] and now["errors"] / now["requests"] > 0.001:
+            regressions.append(f"{route}: {now['errors']} unexpected responses (baseline {before['errors']})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--customers", type=int)
+    parser.add_argument("--transactions", type=int)
+    parser.add_argument("--gifts", type=int)
+    parser.add_argument("--redemptions", type=int)
+    parser.add_argument("--cashiers", type=int)
+    parser.add_argument("--days", type=int, default=365, help="days of history to spread the ledger over")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the dataset already in DATABASE_URL")
+    parser.add_argument("--async", dest="mode_async", action="store_true", help="serve with DATABASE_ASYNC=true")
+    parser.add_argument("--workers", type=int, help="gunicorn workers (default: 1 on SQLite, 4 otherwise)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8775)
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the dataset and the workload")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against; exits 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.25, help="tolerated relative change (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="ignore p95 growth smaller than this, whatever the ratio")
+    args = parser.parse_args()
+
+    defaults = SCALES[args.scale]
+    scale = {
+        name: value if value is not None else default
+        for name, value, default in zip(
+            ("customers", "transactions", "gifts", "redemptions", "cashiers"),
+            (args.customers, args.transactions, args.gifts, args.redemptions, args.cashiers),
+            defaults,
+        )
+    }
+    dialect = engine.dialect.name
+    workers = args.workers or (1 if dialect == "sqlite" else 4)
+    rng = random.Random(args.seed)
+
+    if args.skip_seed:
+        seeded = None
+    else:
+        t0 = time.perf_counter()
+        seeded = seed_dataset(days=args.days, rng=rng, **scale)
+        print(f"seeded {seeded} in {time.perf_counter() - t0:.1f}s")
+    data = working_set(5_000, random.Random(args.seed))
+
+    proc = start_server(args.mode_async, args.port, workers)
+    try:
+        routes = asyncio.run(run_load(
+            f"http://127.0.0.1:{args.port}", data, args.concurrency, args.seconds, args.warmup
+        ))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    result = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "dialect": dialect,
+            "mode": "async" if args.mode_async else "sync",
+            "workers": workers,
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+            "scale": scale,
+            "seeded": seeded,
+            "seed": args.seed,
+        },
+        "routes": routes,
+    }
+
+    print(f"{'route':<11} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, r in routes.items():
+        if not r["requests"]:
+            print(f"{route:<11} {0:>9} {r['errors']:>7}")
+            continue
+        print(f"{route:<11} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"saved {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for key in ("dialect", "mode", "workers", "concurrency", "scale"):
+            if baseline["config"].get(key) != result["config"][key]:
+                print(f"warning: {key} differs from the baseline "
+                      f"({baseline['config'].get(key)} vs {result['config'][key]})")
+        regressions = compare(baseline, result, args.threshold, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            print(f"FAIL: {len(regressions)} regressions against {args.compare} "
+                  f"(baseline {baseline.get('git_commit')})")
+            sys.exit(1)
+        print(f"no regressions against {args.compare} beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import csv
+import sys
+import time
+from datetime import datetime
+
+from app import expiry, ledger
+from app.database import SessionLocal
+from app.models import Staff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expire points earned before the cutoff, oldest first (run nightly)")
+    parser.add_argument("--cutoff", type=datetime.fromisoformat,
+                        help=f"expire points earned before this time (default: {expiry.POINT_EXPIRY_MONTHS} months ago)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would expire")
+    parser.add_argument("--list", help="write customer_id, points and lots per affected customer to this CSV file")
+    parser.add_argument("--full", action="store_true", help="check every customer, not only recent earners")
+    parser.add_argument("--staff", default="admin", help="username recorded on the expire entries")
+    parser.add_argument("--workers", type=int, default=ledger.DEFAULT_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=ledger.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        staff = db.query(Staff).filter(Staff.username == args.staff).first()
+        if not staff:
+            sys.exit(f"Unknown staff user: {args.staff}")
+        staff_id = staff.id
+
+    listing = open(args.list, "w", newline="", encoding="utf-8") if args.list else None
+    writer = csv.DictWriter(listing, ("customer_id", "points", "lots")) if listing else None
+    if writer:
+        writer.writeheader()
+
+    t0 = time.perf_counter()
+    try:
+        report = expiry.expire_points(
+            args.cutoff, staff_id, args.workers, args.chunk_size,
+            dry_run=args.dry_run, full=args.full, on_expire=writer.writerow if writer else None,
+        )
+    finally:
+        if listing:
+            listing.close()
+    scope = f"since {report['since'].isoformat()}" if report["since"] else "all customers"
+    verb = "would expire" if args.dry_run else "expired"
+    print(f"cutoff {report['cutoff'].isoformat()} ({scope}): {report['points']} points {verb} "
+          f"from {report['lots']} lots of {report['customers']} customers in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# Picked up automatically when gunicorn is started from backend/ (see start.sh).
+import os
+import sys
+
+# Import the app once in the master and fork the workers from it, instead of
+# every worker importing it on its own. Importing app.main opens no database
+# connections; schema setup runs beforehand through migrate.py.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+
+def post_fork(server, worker):
+    # Sockets must not be shared across processes: if the master did connect,
+    # give each worker fresh pools without closing the parent's connections.
+    database = sys.modules.get("app.database")
+    if database is None:
+        return
+    engines = [database.engine]
+    if database.async_engine is not None:
+        engines.append(database.async_engine.sync_engine)
+    replicas = sys.modules.get("app.replicas")
+    if replicas is not None:
+        engines += [r.bind for r in replicas.replica_pool.replicas + replicas.async_replica_pool.replicas]
+    for engine in engines:
+        engine.dispose(close=False)
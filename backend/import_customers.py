@@ -0,0 +1,51 @@
+import argparse
+import csv
+import sys
+import time
+
+from app.bulk_points import read_csv, read_ndjson
+from app.customer_import import DEFAULT_CHUNK_SIZE, MERGE_POLICIES, import_customers
+from app.database import SessionLocal
+
+REJECT_FIELDS = ("line", "error", "full_name", "phone_number", "email")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a member list (CSV or NDJSON) into customers")
+    parser.add_argument("file", help="full_name, phone_number and optional email per row")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="default: from the file extension")
+    parser.add_argument("--policy", choices=MERGE_POLICIES, default="skip",
+                        help="what to do with phone numbers that are already registered")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--rejects", help="write rejected rows and the reason to this CSV file")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+    rejects = open(args.rejects, "w", newline="", encoding="utf-8") if args.rejects else None
+    writer = csv.DictWriter(rejects, REJECT_FIELDS, extrasaction="ignore") if rejects else None
+    if writer:
+        writer.writeheader()
+
+    def on_reject(line, record, error):
+        if writer:
+            writer.writerow({**record, "line": line, "error": error})
+
+    t0 = time.perf_counter()
+    db = SessionLocal()
+    try:
+        with open(args.file, encoding="utf-8-sig", newline="") as stream:
+            reader = read_ndjson(stream) if fmt == "ndjson" else read_csv(stream)
+            report = import_customers(db, reader, args.policy, args.chunk_size, on_reject=on_reject)
+    finally:
+        db.close()
+        if rejects:
+            rejects.close()
+    elapsed = time.perf_counter() - t0
+    print(f"{report['processed']} rows in {elapsed:.1f}s ({report['processed'] / max(elapsed, 1e-9):.0f} rows/s): "
+          f"{report['inserted']} inserted, {report['updated']} updated, "
+          f"{report['unchanged']} unchanged, {report['rejected']} rejected")
+    sys.exit(1 if report["rejected"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import csv
+import json
+import sys
+
+from app.database import SessionLocal
+from app.models import Staff
+from app.bulk_points import accrue_points, read_csv, read_ndjson, DEFAULT_CHUNK_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Credit a POS batch file (CSV or NDJSON) of point accruals.")
+    parser.add_argument("file", help="path to the batch file, or - for stdin")
+    parser.add_argument("--staff", default="admin", help="username recorded on the transactions")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--errors", help="write rejected rows to this CSV file")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+    db = SessionLocal()
+    try:
+        staff = db.query(Staff).filter(Staff.username == args.staff).first()
+        if not staff:
+            sys.exit(f"Unknown staff user: {args.staff}")
+        stream = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8-sig", newline="")
+        with stream:
+            reader = read_ndjson(stream) if fmt == "ndjson" else read_csv(stream)
+            report = accrue_points(db, reader, staff.id, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+
+    errors = report.pop("errors")
+    print(json.dumps(report, indent=2))
+    if args.errors and errors:
+        with open(args.errors, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["line", "external_ref", "error"])
+            writer.writeheader()
+            writer.writerows(errors)
+        print(f"{len(errors)} rejected rows written to {args.errors}")
+    elif errors:
+        for e in errors[:20]:
+            print(f"line {e['line']}: {e['error']} ({e['external_ref']})")
+
+
+if __name__ == "__main__":
+    main()
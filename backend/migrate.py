@@ -0,0 +1,18 @@
+import argparse
+
+from app import schema
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Create missing tables, columns and indexes and seed the dashboard counters and cache versions (run once per deploy)"
+    )
+    parser.parse_args()
+
+    for step in schema.migrate():
+        print(step)
+    print("Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import sys
+from datetime import datetime
+
+from app import partitions
+from app.database import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Manage the monthly partitions of point_transactions (PostgreSQL; run --ensure from cron)"
+    )
+    parser.add_argument("--enable", action="store_true",
+                        help="convert an existing point_transactions table to partitions (locks the ledger while copying)")
+    parser.add_argument("--ensure", action="store_true", help="create this and the coming months' partitions")
+    parser.add_argument("--months-ahead", type=int, default=partitions.PARTITION_MONTHS_AHEAD)
+    parser.add_argument("--archive", action="store_true", help="detach and dump the months before the retention horizon")
+    parser.add_argument("--retention-months", type=int, default=partitions.POINT_TRANSACTIONS_RETENTION_MONTHS)
+    parser.add_argument("--before", type=datetime.fromisoformat,
+                        help="archive the months ending on or before this (default: the retention horizon)")
+    parser.add_argument("--out", default=partitions.POINT_TRANSACTIONS_ARCHIVE_DIR, help="directory for the dump files")
+    parser.add_argument("--keep-tables", action="store_true", help="only detach archived partitions, do not drop them")
+    args = parser.parse_args()
+    if not (args.enable or args.ensure or args.archive):
+        parser.error("nothing to do: pass --enable, --ensure and/or --archive")
+
+    with SessionLocal() as db:
+        if db.get_bind().dialect.name != "postgresql":
+            sys.exit("Partitioning needs PostgreSQL")
+        if args.enable:
+            moved = partitions.convert(db, args.months_ahead)
+            print(f"point_transactions is partitioned ({moved} entries moved)")
+        if args.ensure or args.enable:
+            created = partitions.ensure_partitions(db, args.months_ahead)
+            print(f"Created {', '.join(created)}" if created else "All partitions exist")
+
+    if args.archive:
+        this_month = partitions.month_start(datetime.utcnow())
+        before = args.before or partitions.add_months(this_month, -args.retention_months)
+
+        def show(record):
+            print(f"{record['partition']}: {record['rows']} entries -> {record['path']}", flush=True)
+
+        try:
+            report = partitions.archive(before, args.out, args.keep_tables, on_archive=show)
+        except (ValueError, RuntimeError) as exc:
+            sys.exit(str(exc))
+        print(f"Archived {report['rows']} entries from {report['partitions']} partitions before {before:%Y-%m-%d}")
+
+
+if __name__ == "__main__":
+    main()
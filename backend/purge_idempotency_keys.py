@@ -0,0 +1,19 @@
+import argparse
+
+from app.database import SessionLocal
+from app import idempotency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete idempotency keys older than their TTL")
+    parser.add_argument("--ttl-hours", type=float, default=idempotency.IDEMPOTENCY_KEY_TTL_HOURS)
+    parser.add_argument("--batch-size", type=int, default=idempotency.PURGE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        purged = idempotency.purge_expired(db, args.ttl_hours, args.batch_size)
+    print(f"{purged} idempotency keys older than {args.ttl_hours:g}h purged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import sys
+from datetime import datetime
+
+from app import ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify customer balances against the points ledger")
+    parser.add_argument("--snapshot", action="store_true", help="write balance snapshots before verifying")
+    parser.add_argument("--as-of", type=datetime.fromisoformat, help="snapshot time (default: now minus the lag)")
+    parser.add_argument("--backfill", action="store_true", help="fill balance_after on pre-ledger entries first")
+    parser.add_argument("--workers", type=int, default=ledger.DEFAULT_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=ledger.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.backfill:
+        result = ledger.backfill_balance_after(args.workers, args.chunk_size)
+        print(f"balance_after filled on {result['filled']} entries")
+    if args.snapshot:
+        result = ledger.snapshot_balances(args.as_of, args.workers, args.chunk_size)
+        print(f"{result['snapshots']} snapshots written as of {result['as_of'].isoformat()}")
+
+    def show(drift):
+        print(f"{drift['customer_id']}  total_points {drift['total_points']}  "
+              f"ledger {drift['ledger_balance']}  last balance_after {drift['last_balance_after']}  "
+              f"drift {drift['drift']:+d}", flush=True)
+
+    report = ledger.verify_balances(args.workers, args.chunk_size, on_drift=show)
+    print(f"{report['customers']} customers checked, {report['drifted']} drifted "
+          f"(net drift {report['total_drift']:+d} points)")
+    sys.exit(1 if report["drifted"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+from app.database import SessionLocal
+from app import stats
+
+
+def main():
+    db = SessionLocal()
+    try:
+        result = stats.reconcile(db)
+    finally:
+        db.close()
+    for name in stats.COUNTER_FIELDS:
+        before, after = result["before"][name], result["after"][name]
+        drift = f"  (drift {after - before:+d})" if before != after else ""
+        print(f"{name:<22} {after}{drift}")
+
+
+if __name__ == "__main__":
+    main()
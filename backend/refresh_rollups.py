@@ -0,0 +1,24 @@
+import argparse
+from datetime import datetime
+
+from app import rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold new point transactions and redemptions into the dashboard rollups")
+    parser.add_argument("--upto", type=datetime.fromisoformat, help="fold rows created before this (default: now minus the lag)")
+    parser.add_argument("--rebuild", action="store_true", help="drop the rollups and recompute them from the whole history")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        report = rollups.rebuild_rollups(args.upto)
+    else:
+        report = rollups.refresh_rollups(args.upto)
+    if report["through"] is None:
+        print("Nothing to roll up yet")
+    else:
+        print(f"Rollups through {report['through'].isoformat()} ({report['steps']} steps since {report['from'].isoformat()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,5 +4,9 @@
 # Load environment variables if needed
 # export $(cat .env | xargs)
 
-# Start Gunicorn
-gunicorn -w 4 -k uvicorn.workers.UvicornWorker app.main:app --bind 0.0.0.0:8000
+# Create tables and seed counters once, before any worker starts
+python migrate.py || exit 1
+
+# Start Gunicorn (gunicorn.conf.py preloads the app); workers skip schema setup
+export DATABASE_AUTO_MIGRATE=false
+exec gunicorn -c gunicorn.conf.py -w 4 -k uvicorn.workers.UvicornWorker app.main:app --bind 0.0.0.0:8000
@@ -0,0 +1,60 @@
+"""Runs the API in-process against a throwaway SQLite database, migrated and seeded once per session."""
+import itertools
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import schema  # noqa: E402
+from app.main import app  # noqa: E402
+
+import seed  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    schema.migrate()
+    seed.seed()
+
+
+@pytest.fixture(scope="session")
+def client() -> TestClient:
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client: TestClient) -> dict:
+    r = client.post("/auth/login", data={"username": "admin", "password": "admin123"})
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def staff_id(client: TestClient, admin_headers: dict) -> str:
+    return client.get("/auth/me", headers=admin_headers).json()["id"]
+
+
+@pytest.fixture(scope="session")
+def new_phone_number():
+    """A national number no other test has registered."""
+    numbers = itertools.count(1)
+    return lambda: f"07{next(numbers):08d}"
+
+
+@pytest.fixture(scope="session")
+def make_customer(client: TestClient, admin_headers: dict, new_phone_number):
+    """Registers a customer (``fields`` override the defaults) and credits it ``points``; returns it."""
+    def make(points: int = 0, **fields) -> dict:
+        r = client.post("/customers", headers=admin_headers, json={
+            "full_name": "Member", "phone_number": new_phone_number(), **fields,
+        })
+        assert r.status_code == 201, r.text
+        if points:
+            r = client.post(f"/customers/{r.json()['id']}/add-points", headers=admin_headers,
+                            json={"amount": points, "description": "opening balance"})
+            assert r.status_code == 200, r.text
+        return r.json()
+    return make
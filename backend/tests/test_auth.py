@@ -0,0 +1,100 @@
+"""Password and role changes revoke a staff member's tokens at once, even from the principal cache; a rehash does not."""
+import uuid
+
+import pytest
+from passlib.hash import bcrypt
+
+from app import models
+from app.auth import create_staff_token, hash_password, staff_cache
+from app.database import SessionLocal
+
+
+@pytest.fixture
+def member():
+    """A staff member (username, password) with a token issued before any change."""
+    username, password = f"clerk-{uuid.uuid4().hex[:8]}", "counter-secret"
+    with SessionLocal() as db:
+        staff = models.Staff(username=username, password_hash=hash_password(password), role="staff")
+        db.add(staff)
+        db.commit()
+        token = create_staff_token(staff)
+    return username, password, {"Authorization": f"Bearer {token}"}
+
+
+def _change(username: str, **fields) -> int:
+    """Apply ``fields`` to the staff row through the ORM; return the new token_version."""
+    with SessionLocal() as db:
+        staff = db.query(models.Staff).filter(models.Staff.username == username).one()
+        for name, value in fields.items():
+            setattr(staff, name, value)
+        db.commit()
+        return staff.token_version
+
+
+def _cached(username: str) -> bool:
+    return any(key[0] == username for key in staff_cache._data)
+
+
+def _login(client, username: str, password: str):
+    return client.post("/auth/login", data={"username": username, "password": password})
+
+
+@pytest.mark.parametrize("fields", [
+    {"password_hash": hash_password("new-secret")},
+    {"role": "admin"},
+])
+def test_credential_or_role_change_revokes_cached_tokens(client, member, fields):
+    username, _, headers = member
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert _cached(username)
+
+    assert _change(username, **fields) == 1
+
+    assert not _cached(username)
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_new_token_after_a_password_change_works(client, member):
+    username, password, headers = member
+    _change(username, password_hash=hash_password("new-secret"))
+
+    assert _login(client, username, password).status_code == 401
+    r = _login(client, username, "new-secret")
+    assert r.status_code == 200, r.text
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {r.json()['access_token']}"})
+    assert me.status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_transparent_rehash_keeps_tokens_valid(client, member):
+    username, password, _ = member
+    # A hash made at a lower cost than configured is upgraded by the next login
+    version = _change(username, password_hash=bcrypt.using(rounds=4).hash(password))
+    with SessionLocal() as db:
+        staff = db.query(models.Staff).filter(models.Staff.username == username).one()
+        headers = {"Authorization": f"Bearer {create_staff_token(staff)}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    assert _login(client, username, password).status_code == 200
+
+    with SessionLocal() as db:
+        staff = db.query(models.Staff).filter(models.Staff.username == username).one()
+        assert not staff.password_hash.startswith("$2b$04$")
+        assert staff.token_version == version
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+
+def test_cache_stats_count_hits_and_misses(client, admin_headers, member):
+    username, _, headers = member
+    before = client.get("/auth/cache-stats", headers=admin_headers).json()
+
+    for _ in range(3):
+        assert client.get("/auth/me", headers=headers).status_code == 200
+    _change(username, role="admin")
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+    after = client.get("/auth/cache-stats", headers=admin_headers).json()
+    # The first /auth/me loads the principal and the next two hit; the revoked token misses again.
+    # The second cache-stats read hits on the admin's own principal.
+    assert after["hits"] - before["hits"] == 2 + 1
+    assert after["misses"] - before["misses"] == 2
@@ -0,0 +1,129 @@
+"""POS batch uploads credit each external_ref once and report every line they skip."""
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app import bulk_points
+from app.database import SessionLocal
+
+
+def _points(client, headers, customer_id: str) -> int:
+    return client.get(f"/customers/{customer_id}", headers=headers).json()["total_points"]
+
+
+def _upload(client, headers, body: str, name: str = "day.csv", **params):
+    r = client.post("/points/bulk", headers=headers, params=params, files={"file": (name, body.encode())})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+@pytest.fixture
+def shoppers(make_customer):
+    return make_customer(), make_customer()
+
+
+def test_reupload_credits_each_ref_once(client, admin_headers, shoppers):
+    a, b = shoppers
+    ref = uuid.uuid4().hex[:8]
+    body = (
+        "customer_id,phone_number,amount,external_ref\n"
+        f"{a['id']},,10,{ref}-1\n"
+        f",{b['phone_number']},20,{ref}-2\n"
+        f"{a['id']},,5,{ref}-3\n"
+        # Same line again, in the next chunk
+        f",{b['phone_number']},20,{ref}-2\n"
+    )
+
+    first = _upload(client, admin_headers, body, chunk_size=2)
+    assert (first["processed"], first["credited"], first["duplicates"], first["failed"]) == (4, 3, 1, 0)
+    assert first["points_credited"] == 35
+    assert (_points(client, admin_headers, a["id"]), _points(client, admin_headers, b["id"])) == (15, 20)
+
+    again = _upload(client, admin_headers, body, chunk_size=2)
+    assert (again["processed"], again["credited"], again["duplicates"], again["failed"]) == (4, 0, 4, 0)
+    assert (_points(client, admin_headers, a["id"]), _points(client, admin_headers, b["id"])) == (15, 20)
+
+
+def test_malformed_rows_are_reported_and_the_rest_credited(client, admin_headers, shoppers):
+    a, _ = shoppers
+    ref = uuid.uuid4().hex[:8]
+    body = "\n".join([
+        f'{{"customer_id": "{a["id"]}", "amount": 7, "external_ref": "{ref}-ok"}}',
+        "{not json",
+        f'{{"customer_id": "{a["id"]}", "amount": "seven", "external_ref": "{ref}-2"}}',
+        f'{{"customer_id": "{a["id"]}", "amount": -1, "external_ref": "{ref}-3"}}',
+        f'{{"customer_id": "not-an-id", "amount": 1, "external_ref": "{ref}-4"}}',
+        f'{{"customer_id": "{a["id"]}", "amount": 1, "external_ref": {{"nested": 1}}}}',
+        f'{{"customer_id": "{a["id"]}", "amount": 1}}',
+        f'{{"customer_id": "{uuid.uuid4()}", "amount": 1, "external_ref": "{ref}-7"}}',
+        f'{{"amount": 1, "external_ref": "{ref}-8"}}',
+    ]) + "\n"
+
+    report = _upload(client, admin_headers, body, name="day.ndjson")
+
+    assert (report["processed"], report["credited"], report["failed"]) == (9, 1, 8)
+    assert [(e["line"], e["error"]) for e in report["errors"]] == [
+        (2, "Malformed JSON line"),
+        (3, "amount must be an integer"),
+        (4, "Amount must be positive"),
+        (5, "customer_id is not a valid id"),
+        (6, "external_ref must be a string"),
+        (7, "external_ref is required"),
+        (8, "Customer not found"),
+        (9, "phone_number or customer_id is required"),
+    ]
+    assert report["errors"][0]["external_ref"] is None
+    assert report["errors"][6]["external_ref"] == f"{ref}-7"
+    assert _points(client, admin_headers, a["id"]) == 7
+
+
+@pytest.fixture
+def archived_ref(monkeypatch):
+    """A ref claimed in point_transaction_refs whose ledger entry has been archived with its month."""
+    ref = f"archived-{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(bulk_points, "_claimed_refs_exist", False)
+    with SessionLocal() as db:
+        db.execute(text("CREATE TABLE point_transaction_refs (external_ref VARCHAR(100) PRIMARY KEY)"))
+        db.execute(bulk_points.claimed_refs.insert().values(external_ref=ref))
+        db.commit()
+    yield ref
+    with SessionLocal() as db:
+        db.execute(text("DROP TABLE point_transaction_refs"))
+        db.commit()
+
+
+def test_resent_line_of_an_archived_month_is_a_duplicate(client, admin_headers, shoppers, archived_ref):
+    a, _ = shoppers
+    body = f"customer_id,amount,external_ref\n{a['id']},10,{archived_ref}\n{a['id']},4,{uuid.uuid4().hex}\n"
+
+    report = _upload(client, admin_headers, body)
+
+    assert (report["processed"], report["credited"], report["duplicates"], report["failed"]) == (2, 1, 1, 0)
+    assert _points(client, admin_headers, a["id"]) == 4
+
+
+def test_balance_delta_update_moves_each_balance_by_its_own_delta(client, admin_headers, shoppers, make_customer):
+    a, b = shoppers
+    bystander = make_customer()
+    with SessionLocal() as db:
+        balances = bulk_points.apply_balance_deltas(db, {a["id"]: 12, b["id"]: 30})
+        db.commit()
+        assert balances == {a["id"]: 12, b["id"]: 30}
+        balances = bulk_points.apply_balance_deltas(db, {a["id"]: 3, b["id"]: -10})
+        db.commit()
+        assert balances == {a["id"]: 15, b["id"]: 20}
+    assert (_points(client, admin_headers, a["id"]), _points(client, admin_headers, b["id"])) == (15, 20)
+    assert _points(client, admin_headers, bystander["id"]) == 0
+
+
+def test_balance_delta_update_joins_a_values_list_on_postgres():
+    dialect = postgresql.dialect()
+    db = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=dialect))
+    stmt = bulk_points.balance_delta_update(db, {"b": 2, "a": 1})
+    sql = " ".join(str(stmt.compile(dialect=dialect)).split())
+    assert "FROM (VALUES" in sql
+    assert "total_points=(customers.total_points + d.delta)" in sql
+    assert "CASE" not in sql
@@ -0,0 +1,80 @@
+"""GET /gifts answers 304 only while the catalog is unchanged; any stock change yields a new ETag and body."""
+import time
+
+from sqlalchemy import update
+
+from app import catalog, models
+from app.catalog import gift_catalog
+from app.database import SessionLocal
+
+
+def _gift(client, headers, stock: int) -> str:
+    r = client.post("/gifts", headers=headers, json={
+        "name": f"Catalogued {time.time_ns()}", "points_required": 10, "stock": stock,
+    })
+    assert r.status_code == 201, r.text
+    return r.json()["id"]
+
+
+def _catalog(client, headers, etag: str = None):
+    extra = {"If-None-Match": etag} if etag else {}
+    return client.get("/gifts", headers={**headers, **extra})
+
+
+def _stock(response, gift_id: str) -> int:
+    return next(g["stock"] for g in response.json() if g["id"] == gift_id)
+
+
+def _revalidated(client, headers, gift_id: str, etag: str, stock: int) -> str:
+    """The stale ``etag`` gets the new body; its new ETag then gets a 304."""
+    r = _catalog(client, headers, etag)
+    assert r.status_code == 200, r.text
+    assert r.headers["ETag"] != etag
+    assert _stock(r, gift_id) == stock
+    fresh = r.headers["ETag"]
+    assert _catalog(client, headers, fresh).status_code == 304
+    return fresh
+
+
+def test_current_etag_is_not_modified(client, admin_headers):
+    _gift(client, admin_headers, stock=3)
+    r = _catalog(client, admin_headers)
+    assert r.status_code == 200
+    etag = r.headers["ETag"]
+
+    again = _catalog(client, admin_headers, etag)
+
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+    assert _catalog(client, admin_headers, f'"other", W/{etag}').status_code == 304
+
+
+def test_stock_change_makes_the_etag_stale(client, admin_headers, make_customer):
+    gift_id = _gift(client, admin_headers, stock=3)
+    etag = _catalog(client, admin_headers).headers["ETag"]
+
+    assert client.put(f"/gifts/{gift_id}", headers=admin_headers, json={"stock": 7}).status_code == 200
+    etag = _revalidated(client, admin_headers, gift_id, etag, stock=7)
+
+    # A redemption takes stock with a Core UPDATE, which bumps the version itself
+    customer_id = make_customer(points=10)["id"]
+    r = client.post("/redeem", headers=admin_headers, json={"customer_id": customer_id, "gift_id": gift_id})
+    assert r.status_code == 201, r.text
+    _revalidated(client, admin_headers, gift_id, etag, stock=6)
+
+
+def test_change_made_by_another_worker_is_seen_on_the_next_check(client, admin_headers, monkeypatch):
+    gift_id = _gift(client, admin_headers, stock=3)
+    etag = _catalog(client, admin_headers).headers["ETag"]
+    with SessionLocal() as db:
+        db.execute(update(models.Gift).where(models.Gift.id == gift_id).values(stock=1))
+        catalog.bump_version(db)
+        # Another worker's commit does not invalidate this worker's copy
+        db.info.pop("stale_caches")
+        db.commit()
+
+    monkeypatch.setattr(gift_catalog, "check_interval", 3600)
+    assert _catalog(client, admin_headers, etag).status_code == 304
+    monkeypatch.setattr(gift_catalog, "check_interval", 0)
+    _revalidated(client, admin_headers, gift_id, etag, stock=1)
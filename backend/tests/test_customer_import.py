@@ -0,0 +1,81 @@
+"""Importing a member list merges rows into existing customers per policy, matching numbers in any format."""
+import pytest
+
+
+def _international(number: str) -> str:
+    """The national ``number`` as the same phone written in E.164 with separators."""
+    return f"+84 {number[1:4]} {number[4:]}"
+
+
+def _import(client, headers, body: str, policy: str) -> dict:
+    r = client.post("/customers/import", headers=headers, params={"policy": policy},
+                    files={"file": ("members.csv", body.encode())})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _counts(report: dict) -> tuple:
+    return report["processed"], report["inserted"], report["updated"], report["unchanged"], report["rejected"]
+
+
+@pytest.fixture
+def existing(make_customer) -> dict:
+    """A customer without an email who also has points, which an import never touches."""
+    return make_customer(points=40, full_name="Registered")
+
+
+def _merged(client, headers, existing: dict, policy: str, email: str = "new@example.com") -> tuple:
+    body = f"full_name,phone_number,email\nLegacy Name,{_international(existing['phone_number'])},{email}\n"
+    report = _import(client, headers, body, policy)
+    return report, client.get(f"/customers/{existing['id']}", headers=headers).json()
+
+
+def test_skip_leaves_existing_customers_untouched(client, admin_headers, existing):
+    report, after = _merged(client, admin_headers, existing, "skip")
+
+    assert _counts(report) == (1, 0, 0, 1, 0)
+    assert (after["full_name"], after["email"], after["total_points"]) == ("Registered", None, 40)
+    assert after["phone_number"] == existing["phone_number"]
+
+
+def test_fill_sets_only_missing_fields(client, admin_headers, existing):
+    report, after = _merged(client, admin_headers, existing, "fill")
+
+    assert _counts(report) == (1, 0, 1, 0, 0)
+    assert (after["full_name"], after["email"], after["total_points"]) == ("Registered", "new@example.com", 40)
+    # The email is no longer missing, so a second file leaves it as is
+    report, after = _merged(client, admin_headers, existing, "fill", email="other@example.com")
+    assert _counts(report) == (1, 0, 0, 1, 0)
+    assert after["email"] == "new@example.com"
+
+
+def test_overwrite_replaces_name_and_email(client, admin_headers, make_customer):
+    existing = make_customer(full_name="Registered", email="old@example.com")
+
+    report, after = _merged(client, admin_headers, existing, "overwrite")
+
+    assert _counts(report) == (1, 0, 1, 0, 0)
+    assert (after["full_name"], after["email"], after["total_points"]) == ("Legacy Name", "new@example.com", 0)
+    assert after["phone_number"] == existing["phone_number"]
+    # Nothing differs any more, and a blank email keeps the stored one
+    body = f"full_name,phone_number,email\nLegacy Name,{existing['phone_number']},\n"
+    assert _counts(_import(client, admin_headers, body, "overwrite")) == (1, 0, 0, 1, 0)
+    assert client.get(f"/customers/{existing['id']}", headers=admin_headers).json()["email"] == "new@example.com"
+
+
+def test_same_phone_in_another_format_is_rejected_as_a_duplicate(client, admin_headers, new_phone_number):
+    number, other = new_phone_number(), new_phone_number()
+    body = (
+        "full_name,phone_number,email\n"
+        f"First,{number},\n"
+        f"Other,{other},\n"
+        f"Second,{_international(number)},\n"
+        f"Third,0084{number[1:]},\n"
+    )
+
+    report = _import(client, admin_headers, body, "overwrite")
+
+    assert _counts(report) == (4, 2, 0, 0, 2)
+    assert [(e["line"], e["error"]) for e in report["errors"]] == [(4, "Duplicate of line 2"), (5, "Duplicate of line 2")]
+    found = client.get(f"/customers/by-phone/{_international(number)}", headers=admin_headers).json()
+    assert (found["full_name"], found["phone_number"]) == ("First", number)
@@ -0,0 +1,84 @@
+"""A group commit credits every earn in it exactly once, and one bad earn fails only itself."""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from app import earn_batching, models, schemas
+from app.database import SessionLocal
+
+
+def _ledger(customer_id: str) -> list:
+    with SessionLocal() as db:
+        return sorted(amount for (amount,) in db.query(models.PointTransaction.amount).filter(
+            models.PointTransaction.customer_id == customer_id
+        ))
+
+
+def _steps(balances: list) -> list:
+    """The sorted increments between balances reached from 0, one per entry."""
+    ordered = [0] + sorted(balances)
+    return sorted(high - low for low, high in zip(ordered, ordered[1:]))
+
+
+def _submit_all(batcher, earns):
+    """Submit every earn from its own request thread and session; return each result or exception."""
+    def submit(earn):
+        with SessionLocal() as db:
+            try:
+                return batcher.submit(db, earn)
+            except Exception as exc:
+                return exc
+
+    with ThreadPoolExecutor(len(earns)) as pool:
+        return list(pool.map(submit, earns))
+
+
+def _batcher(size: int) -> earn_batching.EarnBatcher:
+    # A long window: the batch only closes once all of them have joined
+    return earn_batching.EarnBatcher(window_ms=10_000, max_size=size)
+
+
+def test_one_batch_commits_every_earn_once(client, admin_headers, staff_id, make_customer):
+    a, b, c = (make_customer()["id"] for _ in range(3))
+    plan = [(a, 10), (a, 20), (b, 5), (c, 1), (c, 2), (c, 3)]
+    earns = [earn_batching.Earn(cid, staff_id, amount, "till") for cid, amount in plan]
+    earns.append(earn_batching.Earn(str(uuid.uuid4()), staff_id, 7, "till"))
+    batcher = _batcher(len(earns))
+
+    results = _submit_all(batcher, earns)
+
+    assert batcher.stats.as_dict() == {"batches": 1, "earns": len(earns), "fallbacks": 0}
+    assert isinstance(results[-1], HTTPException) and results[-1].status_code == 404
+    assert [r.id for r in results[:-1]] == [cid for cid, _ in plan]
+    # Each caller sees the balance right after its own entry
+    for cid in (a, b, c):
+        mine = [(amount, r.total_points) for (rid, amount), r in zip(plan, results) if rid == cid]
+        assert _steps([balance for _, balance in mine]) == sorted(amount for amount, _ in mine)
+    assert (_ledger(a), _ledger(b), _ledger(c)) == ([10, 20], [5], [1, 2, 3])
+    for cid, total in ((a, 30), (b, 5), (c, 6)):
+        assert client.get(f"/customers/{cid}", headers=admin_headers).json()["total_points"] == total
+
+
+def test_failing_earn_falls_back_without_losing_the_others(client, admin_headers, staff_id, make_customer, monkeypatch):
+    a, b = make_customer()["id"], make_customer()["id"]
+    apply = earn_batching._apply
+
+    def apply_unless_poisoned(db, earns):
+        if any(earn.description == "poison" for earn in earns):
+            raise RuntimeError("poisoned earn")
+        return apply(db, earns)
+
+    monkeypatch.setattr(earn_batching, "_apply", apply_unless_poisoned)
+    plan = [(a, 10, "till"), (b, 20, "till"), (a, 99, "poison"), (b, 30, "till"), (a, 40, "till")]
+    earns = [earn_batching.Earn(cid, staff_id, amount, description) for cid, amount, description in plan]
+    batcher = _batcher(len(earns))
+
+    results = _submit_all(batcher, earns)
+
+    assert batcher.stats.as_dict() == {"batches": 1, "earns": len(earns), "fallbacks": 1}
+    assert isinstance(results[2], RuntimeError)
+    assert all(isinstance(r, schemas.CustomerOut) for i, r in enumerate(results) if i != 2)
+    assert (_ledger(a), _ledger(b)) == ([10, 40], [20, 30])
+    assert client.get(f"/customers/{a}", headers=admin_headers).json()["total_points"] == 50
+    assert client.get(f"/customers/{b}", headers=admin_headers).json()["total_points"] == 50
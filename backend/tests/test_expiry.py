@@ -0,0 +1,107 @@
+"""Points expire oldest lot first, only what is left of each lot, and never twice."""
+from datetime import datetime
+
+import pytest
+
+from app import expiry, models
+from app.database import SessionLocal
+
+
+def _customer(make_customer, staff_id: str, lots) -> str:
+    """A customer whose ledger is ``lots`` of (created_at, amount), oldest first."""
+    customer_id = make_customer()["id"]
+    with SessionLocal() as db:
+        balance = 0
+        for created_at, amount in lots:
+            balance += amount
+            db.add(models.PointTransaction(
+                customer_id=customer_id, staff_id=staff_id, type="earn" if amount > 0 else "redeem", amount=amount,
+                description="backdated", balance_after=balance, created_at=created_at,
+            ))
+        db.get(models.Customer, customer_id).total_points = balance
+        db.commit()
+    return customer_id
+
+
+def _expired(customer_id: str) -> list:
+    with SessionLocal() as db:
+        return [amount for (amount,) in db.query(models.PointTransaction.amount).filter(
+            models.PointTransaction.customer_id == customer_id, models.PointTransaction.type == "expire",
+        )]
+
+
+def _unfinished_ranges(cutoff: datetime) -> int:
+    with SessionLocal() as db:
+        return db.query(models.PointExpiryRun).filter(
+            models.PointExpiryRun.cutoff == cutoff, models.PointExpiryRun.finished_at.is_(None)
+        ).count()
+
+
+def _points(client, headers, customer_id: str) -> int:
+    return client.get(f"/customers/{customer_id}", headers=headers).json()["total_points"]
+
+
+def _expire(cutoff: datetime, staff_id: str, **kwargs) -> dict:
+    """Run expiry over the whole ledger; return what it expired per customer."""
+    expired = {}
+    expiry.expire_points(cutoff, staff_id, workers=1, on_expire=lambda e: expired.update({e["customer_id"]: e}), **kwargs)
+    return expired
+
+
+def _partly_redeemed(make_customer, staff_id: str, year: int) -> str:
+    # The redemption uses up the first lot and 20 of the second; the third is recent
+    return _customer(make_customer, staff_id, [
+        (datetime(year, 1, 10), 100),
+        (datetime(year, 3, 1), 50),
+        (datetime(year, 4, 1), -120),
+        (datetime(year, 9, 1), 40),
+    ])
+
+
+def test_partly_redeemed_lot_expires_only_its_remainder(client, admin_headers, staff_id, make_customer):
+    customer_id = _partly_redeemed(make_customer, staff_id, 1990)
+
+    expired = _expire(datetime(1990, 6, 1), staff_id)
+
+    assert expired[customer_id] == {"customer_id": customer_id, "points": 30, "lots": 1}
+    assert _expired(customer_id) == [-30]
+    assert _points(client, admin_headers, customer_id) == 40
+
+
+def test_rerunning_never_expires_points_twice(client, admin_headers, staff_id, make_customer):
+    customer_id = _partly_redeemed(make_customer, staff_id, 1991)
+    cutoff = datetime(1991, 6, 1)
+
+    assert _expire(cutoff, staff_id)[customer_id]["points"] == 30
+    # The same run again: every range's watermark is finished
+    assert _expire(cutoff, staff_id) == {}
+    # A new run over every customer: the earlier expiry counts as consumption
+    assert customer_id not in _expire(datetime(1991, 7, 1), staff_id, full=True)
+    assert _expired(customer_id) == [-30]
+    assert _points(client, admin_headers, customer_id) == 40
+
+    # Only the recent lot is left to expire later
+    assert _expire(datetime(1991, 12, 1), staff_id, full=True)[customer_id]["points"] == 40
+    assert sorted(_expired(customer_id)) == [-40, -30]
+    assert _points(client, admin_headers, customer_id) == 0
+
+
+def test_interrupted_run_resumes_from_its_watermark(client, admin_headers, staff_id, make_customer):
+    customer_ids = [_customer(make_customer, staff_id, [(datetime(1992, 1, 1), 25)]) for _ in range(3)]
+    cutoff = datetime(1992, 6, 1)
+
+    def crash_on_first(entry):
+        if entry["customer_id"] in customer_ids:
+            raise RuntimeError("worker killed")
+
+    with pytest.raises(RuntimeError):
+        expiry.expire_points(cutoff, staff_id, workers=1, chunk_size=1, on_expire=crash_on_first)
+    # Each crashed range committed its chunk, then stopped short of finishing
+    assert any(_expired(customer_id) for customer_id in customer_ids)
+    assert _unfinished_ranges(cutoff) > 0
+    expiry.expire_points(cutoff, staff_id, workers=1, chunk_size=1)
+
+    assert _unfinished_ranges(cutoff) == 0
+    for customer_id in customer_ids:
+        assert _expired(customer_id) == [-25]
+        assert _points(client, admin_headers, customer_id) == 0
@@ -0,0 +1,63 @@
+"""Concurrent duplicates of one request sharing an Idempotency-Key must mutate exactly once."""
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import idempotency
+
+DUPLICATES = 8
+
+
+@pytest.fixture
+def customer(make_customer) -> str:
+    return make_customer()["id"]
+
+
+@pytest.fixture
+def racing(monkeypatch):
+    """Hold every duplicate after its key lookup until all of them have looked, so none can just replay."""
+    barrier = threading.Barrier(DUPLICATES, timeout=10)
+    begin = idempotency.begin
+
+    def begin_together(db, staff_id, key, path, payload):
+        try:
+            return begin(db, staff_id, key, path, payload)
+        finally:
+            if key is not None:
+                barrier.wait()
+
+    monkeypatch.setattr(idempotency, "begin", begin_together)
+
+
+@pytest.mark.parametrize("path, amount, change", [
+    ("add-points", 100, 100),
+    ("deduct-points", 30, -30),
+])
+def test_concurrent_duplicates_mutate_once(client, admin_headers, customer, racing, path, amount, change):
+    if change < 0:
+        r = client.post(f"/customers/{customer}/add-points", headers=admin_headers,
+                        json={"amount": 100, "description": "opening balance"})
+        assert r.status_code == 200, r.text
+    before = client.get(f"/customers/{customer}", headers=admin_headers).json()["total_points"]
+    entries_before = len(client.get(f"/customers/{customer}/transactions", headers=admin_headers).json())
+    headers = {**admin_headers, "Idempotency-Key": str(uuid.uuid4())}
+
+    def submit(_):
+        return client.post(f"/customers/{customer}/{path}", headers=headers,
+                           json={"amount": amount, "description": "retry"})
+
+    with ThreadPoolExecutor(DUPLICATES) as pool:
+        responses = list(pool.map(submit, range(DUPLICATES)))
+
+    assert [r.status_code for r in responses] == [200] * DUPLICATES, [r.text for r in responses]
+    assert len({r.text for r in responses}) == 1
+    replayed = [r.headers.get(idempotency.REPLAYED_HEADER) == "true" for r in responses]
+    assert replayed.count(False) == 1
+
+    after = client.get(f"/customers/{customer}", headers=admin_headers).json()["total_points"]
+    entries = client.get(f"/customers/{customer}/transactions", headers=admin_headers).json()
+    assert after == before + change
+    assert len(entries) == entries_before + 1
+    assert entries[0]["amount"] == change
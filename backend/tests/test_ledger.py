@@ -0,0 +1,87 @@
+"""Balances derived from the ledger: drift detection, snapshots and the balance_after backfill."""
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app import ledger, models
+from app.database import SessionLocal
+
+
+def _backdate(customer_id: str, staff_id: str, entries, balance_after: bool = True) -> None:
+    """Append ``entries`` of (created_at, amount) to the customer's ledger and balance."""
+    with SessionLocal() as db:
+        customer = db.get(models.Customer, customer_id)
+        for created_at, amount in entries:
+            customer.total_points += amount
+            db.add(models.PointTransaction(
+                customer_id=customer_id, staff_id=staff_id, type="earn" if amount > 0 else "manual_adjust",
+                amount=amount, description="backdated", created_at=created_at,
+                balance_after=customer.total_points if balance_after else None,
+            ))
+        db.commit()
+
+
+def test_verify_balances_reports_injected_drift(client, admin_headers, make_customer):
+    drifted, clean = make_customer()["id"], make_customer()["id"]
+    for customer_id in (drifted, clean):
+        client.post(f"/customers/{customer_id}/add-points", headers=admin_headers,
+                    json={"amount": 100, "description": "purchase"})
+        client.post(f"/customers/{customer_id}/deduct-points", headers=admin_headers,
+                    json={"amount": 30, "description": "correction"})
+    with SessionLocal() as db:
+        db.execute(update(models.Customer).where(models.Customer.id == drifted).values(total_points=999))
+        db.commit()
+    found = {}
+    try:
+        report = ledger.verify_balances(workers=2, chunk_size=3, on_drift=lambda d: found.update({d["customer_id"]: d}))
+    finally:
+        with SessionLocal() as db:
+            db.execute(update(models.Customer).where(models.Customer.id == drifted).values(total_points=70))
+            db.commit()
+
+    assert found[drifted] == {
+        "customer_id": drifted, "total_points": 999, "ledger_balance": 70, "last_balance_after": 70, "drift": 929,
+    }
+    assert clean not in found
+    assert report["drifted"] == len(found) >= 1
+    assert report["customers"] >= 2
+
+
+def test_balance_as_of_agrees_with_the_snapshot(staff_id, make_customer):
+    customer_id = make_customer()["id"]
+    _backdate(customer_id, staff_id, [
+        (datetime(2001, 1, 5), 100), (datetime(2001, 2, 5), -40), (datetime(2001, 4, 5), 25),
+    ])
+    as_of = datetime(2001, 6, 1)
+
+    ledger.snapshot_balances(as_of, workers=2)
+    _backdate(customer_id, staff_id, [(datetime(2001, 7, 5), 10), (datetime(2001, 9, 5), -5)])
+
+    with SessionLocal() as db:
+        snapshot = db.get(models.BalanceSnapshot, (customer_id, as_of))
+        assert snapshot.balance == 85
+        at_snapshot = ledger.balance_as_of(db, customer_id, as_of)
+        assert (at_snapshot["balance"], at_snapshot["snapshot_as_of"]) == (snapshot.balance, as_of)
+        # Snapshot plus the entries after it
+        later = ledger.balance_as_of(db, customer_id, datetime(2001, 8, 1))
+        assert (later["balance"], later["snapshot_as_of"]) == (95, as_of)
+        # Before the snapshot the entries are summed from the start
+        earlier = ledger.balance_as_of(db, customer_id, datetime(2001, 3, 1))
+        assert (earlier["balance"], earlier["snapshot_as_of"]) == (60, None)
+        assert ledger.balance_as_of(db, customer_id)["balance"] == db.get(models.Customer, customer_id).total_points == 90
+
+
+def test_backfill_fills_balance_after_with_running_sums(staff_id, make_customer):
+    customer_id = make_customer()["id"]
+    _backdate(customer_id, staff_id, [
+        (datetime(2002, 1, 1), 50), (datetime(2002, 2, 1), -20), (datetime(2002, 3, 1), 70),
+    ], balance_after=False)
+
+    assert ledger.backfill_balance_after(workers=2)["filled"] >= 3
+
+    with SessionLocal() as db:
+        filled = [balance for (balance,) in db.query(models.PointTransaction.balance_after).filter(
+            models.PointTransaction.customer_id == customer_id
+        ).order_by(models.PointTransaction.created_at)]
+    assert filled == [50, 30, 100]
+    assert ledger.backfill_balance_after(workers=2)["filled"] == 0
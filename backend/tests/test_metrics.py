@@ -0,0 +1,51 @@
+"""/metrics is for admins, or for scrapers holding METRICS_TOKEN when one is set."""
+import pytest
+
+from app.routers import metrics
+
+
+@pytest.fixture(scope="module")
+def staff_headers(client) -> dict:
+    r = client.post("/auth/login", data={"username": "staff", "password": "staff123"})
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_metrics_needs_an_admin_without_a_token(client, admin_headers, staff_headers, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 401
+    assert client.get("/metrics", headers=staff_headers).status_code == 403
+    r = client.get("/metrics", headers=admin_headers)
+    assert r.status_code == 200, r.text
+    assert "http_requests_total" in r.text
+
+
+def test_metrics_token_lets_a_scraper_in(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-me")
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-me"}).status_code == 200
+    assert client.get("/metrics", headers={"Authorization": "Bearer guess"}).status_code == 401
+    assert client.get("/metrics", headers=admin_headers).status_code == 200
+
+
+def test_profiles_are_for_admins_only(client, admin_headers, staff_headers, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-me")
+    scraper = {"Authorization": "Bearer scrape-me"}
+    for path in ("/metrics?format=json", "/metrics/profile", "/metrics/profile?reset=true"):
+        assert client.get(path).status_code == 401, path
+        assert client.get(path, headers=scraper).status_code == 401, path
+        assert client.get(path, headers=staff_headers).status_code == 403, path
+    r = client.get("/metrics?format=json", headers=admin_headers)
+    assert r.status_code == 200, r.text
+    assert "routes" in r.json()
+    # Past authentication; the profiler itself is off unless PROFILE_ROUTE is set
+    assert client.get("/metrics/profile", headers=admin_headers).status_code == 404
+
+
+def test_json_view_checks_the_admin_once(client, admin_headers, monkeypatch):
+    checks = []
+    check = metrics.get_current_staff
+    monkeypatch.setattr(metrics, "get_current_staff", lambda token: checks.append(token) or check(token))
+
+    assert client.get("/metrics?format=json", headers=admin_headers).status_code == 200
+    assert len(checks) == 1
@@ -0,0 +1,80 @@
+"""Every way of writing a number finds the same customer, and a moved number never finds its old owner."""
+import pytest
+from sqlalchemy import update
+
+from app import models, phones
+from app.database import SessionLocal
+
+
+@pytest.mark.parametrize("typed", [
+    "+84901234567",
+    "+84 90 123 4567",
+    "0901234567",
+    "090-123-4567",
+    "(090) 123.4567",
+    "84901234567",
+    "0084901234567",
+    "901234567",
+])
+def test_national_and_international_forms_share_a_key(typed):
+    assert phones.phone_key(typed) == "+84901234567"
+
+
+def test_foreign_numbers_keep_their_country_code():
+    assert phones.phone_key("+44 20 7946 0958") == phones.phone_key("0044 20 7946 0958") == "+442079460958"
+
+
+@pytest.mark.parametrize("typed", [None, "", "  ", "hotline", "090 123 456x", "+0901234567", "012", "+1234567890123456"])
+def test_non_numbers_have_no_key(typed):
+    assert phones.phone_key(typed) is None
+
+
+def _by_phone(client, headers, phone: str):
+    r = client.get(f"/customers/by-phone/{phone}", headers=headers)
+    return r.json()["id"] if r.status_code == 200 else r.status_code
+
+
+def test_changed_number_is_evicted_from_the_cache(client, admin_headers, make_customer, new_phone_number):
+    old, new = new_phone_number(), new_phone_number()
+    first = make_customer(phone_number=old)["id"]
+    assert _by_phone(client, admin_headers, f"+84{old[1:]}") == first
+    assert phones.phone_cache.get(phones.phone_key(old)) == first
+
+    r = client.put(f"/customers/{first}", headers=admin_headers, json={"phone_number": new})
+    assert r.status_code == 200, r.text
+
+    assert phones.phone_cache.get(phones.phone_key(old)) is None
+    assert _by_phone(client, admin_headers, old) == 404
+    assert _by_phone(client, admin_headers, new) == first
+    # The freed number now leads to whoever registers it next
+    second = make_customer(phone_number=f"+84 {old[1:]}")["id"]
+    assert _by_phone(client, admin_headers, old) == second
+
+
+def test_deleted_customer_is_evicted_from_the_cache(client, admin_headers, make_customer, new_phone_number):
+    number = new_phone_number()
+    customer_id = make_customer(phone_number=number)["id"]
+    assert _by_phone(client, admin_headers, number) == customer_id
+
+    assert client.delete(f"/customers/{customer_id}", headers=admin_headers).status_code == 204
+
+    assert phones.phone_cache.get(phones.phone_key(number)) is None
+    assert _by_phone(client, admin_headers, number) == 404
+
+
+def test_stale_entry_from_another_worker_is_checked_against_the_row(client, admin_headers, make_customer, new_phone_number):
+    old, new = new_phone_number(), new_phone_number()
+    first = make_customer(phone_number=old)["id"]
+    assert _by_phone(client, admin_headers, old) == first
+    # Another worker moves the number: this worker's cache still points at the old owner
+    with SessionLocal() as db:
+        db.execute(update(models.Customer).where(models.Customer.id == first).values(
+            phone_number=new, phone_key=phones.phone_key(new),
+        ))
+        db.commit()
+    assert phones.phone_cache.get(phones.phone_key(old)) == first
+
+    assert _by_phone(client, admin_headers, old) == 404
+    assert phones.phone_cache.get(phones.phone_key(old)) is None
+    second = make_customer(phone_number=old)["id"]
+    assert _by_phone(client, admin_headers, old) == second
@@ -0,0 +1,97 @@
+"""Concurrent redemptions may never oversell a gift, overdraw a customer or charge a stale price."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import update
+
+from app import models, redemption
+from app.database import SessionLocal
+
+RACERS = 8
+
+
+def _gift(client, headers, points_required: int, stock: int) -> str:
+    r = client.post("/gifts", headers=headers, json={
+        "name": f"Gift {time.time_ns()}", "points_required": points_required, "stock": stock,
+    })
+    assert r.status_code == 201, r.text
+    return r.json()["id"]
+
+
+def _stock_and_price(gift_id: str) -> tuple:
+    with SessionLocal() as db:
+        gift = db.get(models.Gift, gift_id)
+        return gift.stock, gift.points_required
+
+
+@pytest.fixture
+def racing(monkeypatch):
+    """Hold every redemption after it has read the gift until all of them have, so all see the same stock."""
+    barrier = threading.Barrier(RACERS, timeout=10)
+    guarded_update = redemption.update
+
+    def update_together(table):
+        if table is redemption.customers:
+            barrier.wait()
+        return guarded_update(table)
+
+    monkeypatch.setattr(redemption, "update", update_together)
+
+
+def _redeem_all(client, headers, pairs):
+    def submit(pair):
+        customer_id, gift_id = pair
+        return client.post("/redeem", headers=headers, json={"customer_id": customer_id, "gift_id": gift_id})
+
+    with ThreadPoolExecutor(RACERS) as pool:
+        return list(pool.map(submit, pairs))
+
+
+def test_concurrent_redemptions_never_oversell(client, admin_headers, make_customer, racing):
+    gift_id = _gift(client, admin_headers, points_required=10, stock=3)
+    customer_ids = [make_customer(points=100)["id"] for _ in range(RACERS)]
+
+    responses = _redeem_all(client, admin_headers, [(c, gift_id) for c in customer_ids])
+
+    codes = [r.status_code for r in responses]
+    assert codes.count(201) == 3, [r.text for r in responses]
+    assert set(codes) <= {201, 400, 409}, [r.text for r in responses]
+    assert _stock_and_price(gift_id) == (0, 10)
+    balances = [client.get(f"/customers/{c}", headers=admin_headers).json()["total_points"] for c in customer_ids]
+    # Losers of the stock race were not charged
+    assert sorted(balances) == [90] * 3 + [100] * (RACERS - 3)
+
+
+def test_concurrent_redemptions_never_overdraw(client, admin_headers, make_customer, racing):
+    gift_id = _gift(client, admin_headers, points_required=100, stock=RACERS)
+    customer_id = make_customer(points=250)["id"]
+
+    responses = _redeem_all(client, admin_headers, [(customer_id, gift_id)] * RACERS)
+
+    codes = [r.status_code for r in responses]
+    assert codes.count(201) == 2, [r.text for r in responses]
+    assert codes.count(400) == RACERS - 2, [r.text for r in responses]
+    assert client.get(f"/customers/{customer_id}", headers=admin_headers).json()["total_points"] == 50
+    assert _stock_and_price(gift_id) == (RACERS - 2, 100)
+
+
+def test_price_change_mid_flight_is_rejected(client, admin_headers, make_customer, monkeypatch):
+    gift_id = _gift(client, admin_headers, points_required=100, stock=5)
+    customer_id = make_customer(points=500)["id"]
+    guarded_update = redemption.update
+
+    def update_after_repricing(table):
+        if table is redemption.customers:
+            with SessionLocal() as db:
+                db.execute(update(models.Gift).where(models.Gift.id == gift_id).values(points_required=300))
+                db.commit()
+        return guarded_update(table)
+
+    monkeypatch.setattr(redemption, "update", update_after_repricing)
+    r = client.post("/redeem", headers=admin_headers, json={"customer_id": customer_id, "gift_id": gift_id})
+
+    assert r.status_code == 409, r.text
+    assert client.get(f"/customers/{customer_id}", headers=admin_headers).json()["total_points"] == 500
+    assert _stock_and_price(gift_id) == (5, 300)
@@ -0,0 +1,47 @@
+"""A successful write pins its client to the primary, on any worker, for READ_YOUR_WRITES_SECONDS."""
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app import replicas
+
+
+def _request(headers: dict) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                    "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]})
+
+
+def test_write_returns_the_pin_for_the_client_to_echo():
+    app = FastAPI()
+    app.add_middleware(replicas.ReadYourWritesMiddleware)
+    app.get("/thing")(lambda: {})
+    app.post("/thing")(lambda: {})
+    client = TestClient(app)
+
+    assert replicas.PRIMARY_PIN_HEADER not in client.get("/thing").headers
+    r = client.post("/thing")
+    until = float(r.headers[replicas.PRIMARY_PIN_HEADER])
+    assert time.time() < until <= time.time() + replicas.READ_YOUR_WRITES_SECONDS
+
+
+def test_cross_origin_clients_can_read_the_pin(client):
+    r = client.get("/health", headers={"Origin": "http://localhost:5173"})
+    assert replicas.PRIMARY_PIN_HEADER in r.headers["access-control-expose-headers"]
+
+
+def test_echoed_pin_routes_reads_to_the_primary_until_it_expires():
+    now = time.time()
+    assert replicas.pinned_to_primary(_request({replicas.PRIMARY_PIN_HEADER: f"{now + 2:.3f}"}))
+    assert not replicas.pinned_to_primary(_request({replicas.PRIMARY_PIN_HEADER: f"{now - 1:.3f}"}))
+    assert not replicas.pinned_to_primary(_request({replicas.PRIMARY_PIN_HEADER: "soon"}))
+    assert not replicas.pinned_to_primary(_request({}))
+
+
+def test_pin_further_out_than_we_issue_is_ignored():
+    now = time.time()
+    for forged in ("9e18", "inf", "nan", f"{now + replicas.READ_YOUR_WRITES_SECONDS + 60:.3f}"):
+        assert not replicas.pinned_to_primary(_request({replicas.PRIMARY_PIN_HEADER: forged}))
+        assert not replicas.pinned_to_primary(_request({"cookie": f"{replicas.PRIMARY_PIN_COOKIE}={forged}"}))
+    assert not replicas.pinned_to_primary(_request({}))
@@ -0,0 +1,149 @@
+"""Refreshing folds each ledger row into the rollups of its UTC day exactly once, and reads fill the gaps."""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models, rollups
+from app.database import Base
+
+# 2024-03-10 is a Sunday: it ends the week of 03-04
+HISTORY = [
+    # (created_at, customer, type, amount)
+    (datetime(2024, 3, 10, 23, 30), "ann", "earn", 100),
+    (datetime(2024, 3, 11, 0, 15), "bob", "earn", 50),
+    (datetime(2024, 3, 11, 10, 0), "ann", "redeem", -30),
+    (datetime(2024, 3, 12, 9, 0), "cy", "earn", 70),
+    (datetime(2024, 3, 20, 18, 0), "bob", "earn", 5),
+]
+
+
+@pytest.fixture
+def history(tmp_path):
+    """A session factory on a database of its own (the watermark is global) holding ``HISTORY``."""
+    engine = create_engine(f"sqlite:///{tmp_path}/rollups.db")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        staff = models.Staff(username="till", password_hash="-", role="staff")
+        gift = models.Gift(name="Mug", points_required=30, stock=5)
+        people = {
+            name: models.Customer(full_name=name, phone_number=f"09{n:08d}") for n, name in enumerate(("ann", "bob", "cy"))
+        }
+        db.add_all([staff, gift, *people.values()])
+        db.flush()
+        for created_at, name, type_, amount in HISTORY:
+            db.add(models.PointTransaction(
+                customer_id=people[name].id, staff_id=staff.id, type=type_, amount=amount,
+                description="history", created_at=created_at,
+            ))
+            if type_ == "redeem":
+                db.add(models.Redemption(
+                    customer_id=people[name].id, gift_id=gift.id, staff_id=staff.id, points_used=-amount,
+                    created_at=created_at,
+                ))
+        db.commit()
+    yield factory
+    engine.dispose()
+
+
+def _days(db, start: date, end: date, interval: str = "day") -> dict:
+    series = rollups.timeseries(db, "points", interval, start, end)
+    return {b["period"]: (b["values"]["earned"], b["values"]["redeemed"]) for b in series["buckets"]}
+
+
+def _contents(db) -> list:
+    return [
+        sorted(tuple(row) for row in db.execute(select(table)).all())
+        for table in (rollups.points_rollup, rollups.redemption_rollup, rollups.customer_rollup)
+    ]
+
+
+def test_refresh_splits_rows_at_the_day_boundary(history):
+    report = rollups.refresh_rollups(datetime(2024, 3, 11, 12, 0), session_factory=history)
+
+    assert report == {
+        "from": datetime(2024, 3, 10), "through": datetime(2024, 3, 11, 12, 0), "steps": 2,
+    }
+    with history() as db:
+        assert _days(db, date(2024, 3, 10), date(2024, 3, 12)) == {
+            date(2024, 3, 10): (100, 0),
+            date(2024, 3, 11): (50, 30),
+            # Past the watermark: not folded yet
+            date(2024, 3, 12): (0, 0),
+        }
+        redeemed = rollups.timeseries(db, "redemptions", "day", date(2024, 3, 11), date(2024, 3, 11))
+        assert redeemed["buckets"][0]["values"] == {"redemptions": 1, "points_used": 30}
+
+
+def test_rerunning_refresh_changes_nothing(history):
+    upto = datetime(2024, 3, 31)
+    rollups.refresh_rollups(upto, session_factory=history)
+    with history() as db:
+        before = _contents(db)
+
+    report = rollups.refresh_rollups(upto, session_factory=history)
+
+    assert (report["steps"], report["through"]) == (0, upto)
+    with history() as db:
+        assert _contents(db) == before
+
+
+def test_interrupted_refresh_resumes_from_the_watermark(history, monkeypatch):
+    fold = rollups._fold
+    folded = []
+
+    def fold_then_crash(db, start, end):
+        if len(folded) == 2:
+            raise RuntimeError("refresh killed")
+        folded.append(start)
+        fold(db, start, end)
+
+    monkeypatch.setattr(rollups, "_fold", fold_then_crash)
+    with pytest.raises(RuntimeError):
+        rollups.refresh_rollups(datetime(2024, 3, 31), session_factory=history)
+    with history() as db:
+        assert rollups.rollups_through(db) == datetime(2024, 3, 12)
+    monkeypatch.setattr(rollups, "_fold", fold)
+
+    report = rollups.refresh_rollups(datetime(2024, 3, 31), session_factory=history)
+
+    assert report["from"] == datetime(2024, 3, 12)
+    with history() as db:
+        resumed = _contents(db)
+    rollups.rebuild_rollups(datetime(2024, 3, 31), session_factory=history)
+    with history() as db:
+        assert _contents(db) == resumed
+
+
+def test_deleted_customer_leaves_the_leaderboard_but_not_the_totals(history):
+    rollups.refresh_rollups(datetime(2024, 3, 31), session_factory=history)
+    span = (date(2024, 3, 1), date(2024, 3, 31))
+    with history() as db:
+        board = rollups.leaderboard(db, "earned", *span)["entries"]
+        assert [(e["full_name"], e["points"]) for e in board] == [("ann", 100), ("cy", 70), ("bob", 55)]
+
+        db.delete(db.query(models.Customer).filter(models.Customer.full_name == "cy").one())
+        db.commit()
+
+        board = rollups.leaderboard(db, "earned", *span)["entries"]
+        assert [(e["rank"], e["full_name"]) for e in board] == [(1, "ann"), (2, "bob")]
+        assert _days(db, *span, interval="month") == {date(2024, 3, 1): (225, 30)}
+
+
+def test_week_and_month_buckets_are_zero_filled(history):
+    rollups.refresh_rollups(datetime(2024, 3, 31), session_factory=history)
+    with history() as db:
+        assert _days(db, date(2024, 3, 4), date(2024, 3, 31), interval="week") == {
+            date(2024, 3, 4): (100, 0),
+            date(2024, 3, 11): (120, 30),
+            date(2024, 3, 18): (5, 0),
+            date(2024, 3, 25): (0, 0),
+        }
+        assert _days(db, date(2024, 1, 15), date(2024, 4, 30), interval="month") == {
+            date(2024, 1, 1): (0, 0),
+            date(2024, 2, 1): (0, 0),
+            date(2024, 3, 1): (225, 30),
+            date(2024, 4, 1): (0, 0),
+        }
@@ -0,0 +1,21 @@
+"""Staff activity must be read from the staff_id/created_at indexes, not by scanning the ledger."""
+import pytest
+
+from app.database import engine
+from benchmarks.bench_staff_activity import plan_cases, populate, query_plan
+
+
+@pytest.fixture(scope="module")
+def activity():
+    staff_ids, _, last = populate(transactions=20_000, redemptions=2_000, customers=200, staff=10)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return plan_cases(staff_ids[0], last)
+
+
+@pytest.mark.parametrize("case", ["all activity", "last 30 days, deductions"])
+def test_activity_plan_uses_staff_indexes(activity, case):
+    stmt, indexes = activity[case]
+    plan = query_plan(stmt)
+    for index in indexes:
+        assert index in plan, plan
@@ -0,0 +1,71 @@
+"""The dashboard counters must agree with a full recount of the base tables."""
+import time
+from datetime import datetime
+
+import pytest
+
+from app import models, stats
+from app.database import SessionLocal
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
+
+
+def _assert_counters_match_recount(client, headers) -> dict:
+    counters = client.get("/dashboard/stats", headers=headers).json()
+    with SessionLocal() as db:
+        assert counters == stats.compute_stats(db)
+    return counters
+
+
+def test_recount_keeps_points_earned_in_archived_months(db):
+    before = stats.compute_stats(db)["total_points_issued"]
+    archive = models.PointTransactionArchive(
+        partition="point_transactions_p200001", range_from=datetime(2000, 1, 1), range_to=datetime(2000, 2, 1),
+        rows=3, points_issued=500, path="archive/point_transactions_p200001.csv.gz",
+    )
+    db.add(archive)
+    db.commit()
+    try:
+        assert stats.compute_stats(db)["total_points_issued"] == before + 500
+    finally:
+        db.delete(archive)
+        db.commit()
+
+
+def test_counters_follow_every_write_path(client, admin_headers, db, make_customer):
+    # Start from a recount: earlier tests write through Core paths that only a recount sees
+    stats.reconcile(db)
+    start = _assert_counters_match_recount(client, admin_headers)
+
+    customer_id = make_customer(points=120)["id"]
+    client.post(f"/customers/{customer_id}/deduct-points", headers=admin_headers,
+                json={"amount": 20, "description": "correction"})
+    _assert_counters_match_recount(client, admin_headers)
+
+    gift_id = client.post("/gifts", headers=admin_headers, json={
+        "name": f"Counted {time.time_ns()}", "points_required": 50, "stock": 1,
+    }).json()["id"]
+    spare_id = client.post("/gifts", headers=admin_headers, json={
+        "name": f"Spare {time.time_ns()}", "points_required": 10, "stock": 0,
+    }).json()["id"]
+    _assert_counters_match_recount(client, admin_headers)
+
+    # The last one in stock: the gift stops being active
+    r = client.post("/redeem", headers=admin_headers, json={"customer_id": customer_id, "gift_id": gift_id})
+    assert r.status_code == 201, r.text
+    _assert_counters_match_recount(client, admin_headers)
+
+    for gift, stock in ((gift_id, 4), (spare_id, 2), (gift_id, 6), (spare_id, 0)):
+        r = client.put(f"/gifts/{gift}", headers=admin_headers, json={"stock": stock})
+        assert r.status_code == 200, r.text
+        _assert_counters_match_recount(client, admin_headers)
+    assert client.delete(f"/gifts/{spare_id}", headers=admin_headers).status_code == 204
+
+    end = _assert_counters_match_recount(client, admin_headers)
+    assert {name: end[name] - start[name] for name in end} == {
+        "total_customers": 1, "total_points_issued": 120, "total_redemptions": 1, "active_gifts": 1,
+    }
@@ -5,16 +5,25 @@ const api = axios.create({
     headers: { 'Content-Type': 'application/json' },
 });
 
+// After a write the API pins us to the primary database for a few seconds
+// (X-Primary-Until); echo it back so a read on another worker skips lagging replicas.
+// The API ignores it once expired.
+let primaryUntil = null;
+
 // Attach JWT on every request
 api.interceptors.request.use((config) => {
     const token = localStorage.getItem('token');
     if (token) config.headers.Authorization = `Bearer ${token}`;
+    if (primaryUntil) config.headers['X-Primary-Until'] = primaryUntil;
     return config;
 });
 
 // Redirect to login on 401
 api.interceptors.response.use(
-    (res) => res,
+    (res) => {
+        if (res.headers['x-primary-until']) primaryUntil = res.headers['x-primary-until'];
+        return res;
+    },
     (err) => {
         if (err.response?.status === 401) {
             localStorage.removeItem('token');
@@ -25,4 +34,23 @@ api.interceptors.response.use(
     }
 );
 
+// A point-mutating POST tagged with the caller's Idempotency-Key. Requests that
+// never got a response (dropped store Wi-Fi) are sent again with the same key,
+// so the API applies the action once however many copies reach it.
+const WRITE_RETRIES = 2;
+
+export const postIdempotent = async (url, data, idempotencyKey) => {
+    const config = { headers: { 'Idempotency-Key': idempotencyKey } };
+    for (let attempt = 0; ; attempt++) {
+        try {
+            return await api.post(url, data, config);
+        } catch (err) {
+            if (err.response || attempt >= WRITE_RETRIES) throw err;
+        }
+    }
+};
+
+// Cursor for the next page of a paginated list (X-Next-Cursor), or null on the last page
+export const nextCursor = (res) => res.headers['x-next-cursor'] || null;
+
 export default api;
@@ -1,4 +1,4 @@
-import api from './client';
+import api, { postIdempotent } from './client';
 
-export const redeemGift = (data) => api.post('/redeem', data);
+export const redeemGift = (data, idempotencyKey) => postIdempotent('/redeem', data, idempotencyKey);
 export const getRedemptions = () => api.get('/redemptions');
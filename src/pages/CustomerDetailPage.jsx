@@ -1,23 +1,32 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { ArrowLeft, Plus, Minus, Phone, Mail, Star, Clock } from 'lucide-react';
 import AppLayout from '../components/layout/AppLayout';
 import TopBar from '../components/layout/TopBar';
 import { getCustomer, addPoints, deductPoints, getTransactions } from '../api/customers';
+import { nextCursor } from '../api/client';
 import toast from 'react-hot-toast';
 
 function PointsModal({ type, customerId, onClose, onDone }) {
     const [amount, setAmount] = useState('');
     const [description, setDescription] = useState('');
     const [loading, setLoading] = useState(false);
+    // One key per action: submitting again after a failure resends it, editing the form starts a new one
+    const idempotencyKey = useRef(null);
     const isAdd = type === 'add';
 
+    const edit = (setter) => (e) => {
+        idempotencyKey.current = null;
+        setter(e.target.value);
+    };
+
     const handleSubmit = async (e) => {
         e.preventDefault();
         setLoading(true);
         try {
             const fn = isAdd ? addPoints : deductPoints;
-            await fn(customerId, { amount: parseInt(amount), description });
+            idempotencyKey.current ??= crypto.randomUUID();
+            await fn(customerId, { amount: parseInt(amount), description }, idempotencyKey.current);
             toast.success(isAdd ? `+${amount} points added!` : `-${amount} points deducted!`);
             onDone();
             onClose();
@@ -37,11 +46,11 @@ function PointsModal({ type, customerId, onClose, onDone }) {
                 <form onSubmit={handleSubmit} className="space-y-4">
                     <div>
                         <label className="label">Amount *</label>
-                        <input className="input" type="number" min="1" value={amount} onChange={e => setAmount(e.target.value)} required placeholder="e.g. 100" />
+                        <input className="input" type="number" min="1" value={amount} onChange={edit(setAmount)} required placeholder="e.g. 100" />
                     </div>
                     <div>
                         <label className="label">Description *</label>
-                        <input className="input" value={description} onChange={e => setDescription(e.target.value)} required placeholder={isAdd ? 'e.g. Purchase RM200' : 'e.g. Manual adjustment'} />
+                        <input className="input" value={description} onChange={edit(setDescription)} required placeholder={isAdd ? 'e.g. Purchase RM200' : 'e.g. Manual adjustment'} />
                     </div>
                     <div className="flex gap-3 pt-2">
                         <button type="button" onClick={onClose} className="btn-secondary flex-1 justify-center">Cancel</button>
@@ -66,6 +75,8 @@ export default function CustomerDetailPage() {
     const navigate = useNavigate();
     const [customer, setCustomer] = useState(null);
     const [transactions, setTransactions] = useState([]);
+    const [cursor, setCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [modal, setModal] = useState(null); // 'add' | 'deduct' | null
 
     const load = async () => {
@@ -73,12 +84,26 @@ export default function CustomerDetailPage() {
             const [cRes, tRes] = await Promise.all([getCustomer(id), getTransactions(id)]);
             setCustomer(cRes.data);
             setTransactions(tRes.data);
+            setCursor(nextCursor(tRes));
         } catch {
             toast.error('Failed to load customer');
             navigate('/customers');
         }
     };
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const res = await getTransactions(id, { cursor });
+            setTransactions(prev => [...prev, ...res.data]);
+            setCursor(nextCursor(res));
+        } catch {
+            toast.error('Failed to load transactions');
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     useEffect(() => { load(); }, [id]);
 
     if (!customer) {
@@ -169,6 +194,14 @@ export default function CustomerDetailPage() {
                             </tbody>
                         </table>
                     </div>
+                    {cursor && (
+                        <div className="flex justify-center mt-4">
+                            <button onClick={loadMore} disabled={loadingMore} className="btn-secondary">
+                                {loadingMore ? <span className="w-4 h-4 border-2 border-white/30 border-t-white rounded-full animate-spin" /> : null}
+                                Load more
+                            </button>
+                        </div>
+                    )}
                 </div>
             </main>
         </AppLayout>
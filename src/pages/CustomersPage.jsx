@@ -4,6 +4,7 @@ import { Plus, Search, Phone, User, Trash2, Eye } from 'lucide-react';
 import AppLayout from '../components/layout/AppLayout';
 import TopBar from '../components/layout/TopBar';
 import { getCustomers, createCustomer, deleteCustomer } from '../api/customers';
+import { nextCursor } from '../api/client';
 import toast from 'react-hot-toast';
 
 function AddCustomerModal({ onClose, onCreated }) {
@@ -60,12 +61,15 @@ export default function CustomersPage() {
     const [search, setSearch] = useState('');
     const [showModal, setShowModal] = useState(false);
     const [loading, setLoading] = useState(true);
+    const [cursor, setCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const navigate = useNavigate();
 
     const fetchCustomers = useCallback(async () => {
         try {
             const res = await getCustomers(search ? { search } : {});
             setCustomers(res.data);
+            setCursor(nextCursor(res));
         } catch {
             toast.error('Failed to load customers');
         } finally {
@@ -73,6 +77,19 @@ export default function CustomersPage() {
         }
     }, [search]);
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const res = await getCustomers(search ? { search, cursor } : { cursor });
+            setCustomers(prev => [...prev, ...res.data]);
+            setCursor(nextCursor(res));
+        } catch {
+            toast.error('Failed to load customers');
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     useEffect(() => {
         const t = setTimeout(fetchCustomers, 300);
         return () => clearTimeout(t);
@@ -164,6 +181,14 @@ export default function CustomersPage() {
                         </tbody>
                     </table>
                 </div>
+                {cursor && !loading && (
+                    <div className="flex justify-center mt-4">
+                        <button onClick={loadMore} disabled={loadingMore} className="btn-secondary">
+                            {loadingMore ? <span className="w-4 h-4 border-2 border-white/30 border-t-white rounded-full animate-spin" /> : null}
+                            Load more
+                        </button>
+                    </div>
+                )}
             </main>
         </AppLayout>
     );
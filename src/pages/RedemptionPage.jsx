@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Search, Star, Gift, CheckCircle, X } from 'lucide-react';
 import AppLayout from '../components/layout/AppLayout';
 import TopBar from '../components/layout/TopBar';
@@ -15,17 +15,23 @@ export default function RedemptionPage() {
     const [selectedGift, setSelectedGift] = useState(null);
     const [loading, setLoading] = useState(false);
     const [success, setSuccess] = useState(false);
+    // One key per customer and gift pair until it is redeemed, so pressing Redeem again after a failure cannot redeem twice
+    const pending = useRef(null);
+
+    // The list is paginated: search on the server instead of filtering the first page
+    const searchCustomers = () => getCustomers(search ? { search } : {});
+
+    useEffect(() => {
+        const t = setTimeout(() => {
+            searchCustomers().then(r => setCustomers(r.data)).catch(() => { });
+        }, 300);
+        return () => clearTimeout(t);
+    }, [search]);
 
     useEffect(() => {
-        getCustomers().then(r => setCustomers(r.data)).catch(() => { });
         getGifts().then(r => setGifts(r.data)).catch(() => { });
     }, []);
 
-    const filtered = customers.filter(c =>
-        c.full_name.toLowerCase().includes(search.toLowerCase()) ||
-        c.phone_number.includes(search)
-    );
-
     const canRedeem = selectedCustomer && selectedGift &&
         selectedCustomer.total_points >= selectedGift.points_required &&
         selectedGift.stock > 0;
@@ -33,11 +39,14 @@ export default function RedemptionPage() {
     const handleRedeem = async () => {
         if (!canRedeem) return;
         setLoading(true);
+        const action = `${selectedCustomer.id}:${selectedGift.id}`;
+        if (pending.current?.action !== action) pending.current = { action, key: crypto.randomUUID() };
         try {
-            await redeemGift({ customer_id: selectedCustomer.id, gift_id: selectedGift.id });
+            await redeemGift({ customer_id: selectedCustomer.id, gift_id: selectedGift.id }, pending.current.key);
+            pending.current = null;
             setSuccess(true);
             // Refresh data
-            const [cRes, gRes] = await Promise.all([getCustomers(), getGifts()]);
+            const [cRes, gRes] = await Promise.all([searchCustomers(), getGifts()]);
             setCustomers(cRes.data);
             setGifts(gRes.data);
             // Update selected customer points
@@ -90,7 +99,7 @@ export default function RedemptionPage() {
                                 <input className="input pl-9 text-sm" placeholder="Search name or phone…" value={search} onChange={e => setSearch(e.target.value)} />
                             </div>
                             <div className="space-y-1.5 max-h-72 overflow-y-auto pr-1">
-                                {filtered.map(c => (
+                                {customers.map(c => (
                                     <button
                                         key={c.id}
                                         onClick={() => { setSelectedCustomer(c); setSelectedGift(null); setSuccess(false); }}